@@ -0,0 +1,28 @@
+"""Add max_stops to flight preferences
+
+Revision ID: 1d7f4c9b2e86
+Revises: f8d3b6a2c571
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d7f4c9b2e86'
+down_revision: Union[str, Sequence[str], None] = 'f8d3b6a2c571'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('flight_preferences', sa.Column('max_stops', sa.SmallInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('flight_preferences', 'max_stops')
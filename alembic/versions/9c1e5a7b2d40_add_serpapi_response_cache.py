@@ -0,0 +1,38 @@
+"""Add SerpAPI response cache table
+
+Revision ID: 9c1e5a7b2d40
+Revises: 4186d8fc8d32
+Create Date: 2026-10-18 16:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e5a7b2d40'
+down_revision: Union[str, Sequence[str], None] = '4186d8fc8d32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('serpapi_response_cache',
+    sa.Column('search_key', sa.String(length=64), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=False),
+    sa.Column('response', sa.JSON(), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('stale_until', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('search_key')
+    )
+    op.create_index(op.f('ix_serpapi_response_cache_stale_until'), 'serpapi_response_cache', ['stale_until'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_serpapi_response_cache_stale_until'), table_name='serpapi_response_cache')
+    op.drop_table('serpapi_response_cache')
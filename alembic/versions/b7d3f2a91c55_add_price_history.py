@@ -0,0 +1,55 @@
+"""Add price history and price baselines tables
+
+Revision ID: b7d3f2a91c55
+Revises: 9c1e5a7b2d40
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3f2a91c55'
+down_revision: Union[str, Sequence[str], None] = '9c1e5a7b2d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('price_history',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('preference_id', sa.Integer(), nullable=False),
+    sa.Column('route', sa.String(length=9), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.Column('min_price', sa.Float(), nullable=True),
+    sa.Column('observed_price', sa.Float(), nullable=True),
+    sa.Column('matched_price', sa.Float(), nullable=True),
+    sa.Column('airline', sa.String(length=100), nullable=True),
+    sa.Column('stops', sa.SmallInteger(), nullable=True),
+    sa.Column('options', sa.SmallInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_price_history_preference_checked', 'price_history', ['preference_id', 'checked_at'], unique=False)
+    op.create_index('ix_price_history_route_checked', 'price_history', ['route', 'checked_at'], unique=False)
+    op.create_table('price_baselines',
+    sa.Column('preference_id', sa.Integer(), nullable=False),
+    sa.Column('mean', sa.Float(), nullable=False),
+    sa.Column('variance', sa.Float(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('last_alert_price', sa.Float(), nullable=True),
+    sa.Column('last_alert_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('preference_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('price_baselines')
+    op.drop_index('ix_price_history_route_checked', table_name='price_history')
+    op.drop_index('ix_price_history_preference_checked', table_name='price_history')
+    op.drop_table('price_history')
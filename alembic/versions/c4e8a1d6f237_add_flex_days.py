@@ -0,0 +1,29 @@
+"""Add flex_days to flight preferences
+
+Revision ID: c4e8a1d6f237
+Revises: b7d3f2a91c55
+Create Date: 2026-10-18 19:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d6f237'
+down_revision: Union[str, Sequence[str], None] = 'b7d3f2a91c55'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('flight_preferences',
+                  sa.Column('flex_days', sa.SmallInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('flight_preferences', 'flex_days')
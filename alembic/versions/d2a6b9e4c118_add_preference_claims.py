@@ -0,0 +1,32 @@
+"""Add worker claim lease columns to flight preferences
+
+Revision ID: d2a6b9e4c118
+Revises: c4e8a1d6f237
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a6b9e4c118'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1d6f237'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('flight_preferences', sa.Column('claimed_by', sa.String(length=64), nullable=True))
+    op.add_column('flight_preferences', sa.Column('claimed_until', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_flight_preferences_claimed_until'), 'flight_preferences', ['claimed_until'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_flight_preferences_claimed_until'), table_name='flight_preferences')
+    op.drop_column('flight_preferences', 'claimed_until')
+    op.drop_column('flight_preferences', 'claimed_by')
@@ -0,0 +1,40 @@
+"""Add per-preference check schedule columns
+
+Revision ID: e5f1c3a8d907
+Revises: d2a6b9e4c118
+Create Date: 2026-10-18 22:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f1c3a8d907'
+down_revision: Union[str, Sequence[str], None] = 'd2a6b9e4c118'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('flight_preferences', sa.Column('next_check_at', sa.DateTime(), nullable=True))
+    op.add_column('flight_preferences', sa.Column('last_checked_at', sa.DateTime(), nullable=True))
+    op.add_column('flight_preferences',
+                  sa.Column('check_failures', sa.SmallInteger(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_flight_preferences_next_check_at'), 'flight_preferences', ['next_check_at'], unique=False)
+
+    # Istniejące preferencje rozłożone losowo na najbliższą dobę zamiast jednego szczytu po wdrożeniu
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE flight_preferences "
+                   "SET next_check_at = (now() AT TIME ZONE 'utc') + random() * interval '1 day'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_flight_preferences_next_check_at'), table_name='flight_preferences')
+    op.drop_column('flight_preferences', 'check_failures')
+    op.drop_column('flight_preferences', 'last_checked_at')
+    op.drop_column('flight_preferences', 'next_check_at')
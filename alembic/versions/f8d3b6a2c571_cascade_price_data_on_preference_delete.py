@@ -0,0 +1,39 @@
+"""Cascade price history and baselines on preference delete
+
+Revision ID: f8d3b6a2c571
+Revises: a7c2e9f4b613
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8d3b6a2c571'
+down_revision: Union[str, Sequence[str], None] = 'a7c2e9f4b613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Dane cenowe preferencji usuniętych przed dodaniem kluczy obcych - inaczej ograniczenie nie powstanie
+    for table in ('price_history', 'price_baselines'):
+        op.execute(f"DELETE FROM {table} WHERE preference_id NOT IN (SELECT preference_id FROM flight_preferences)")
+
+    with op.batch_alter_table('price_history') as batch_op:
+        batch_op.create_foreign_key('fk_price_history_preference_id', 'flight_preferences',
+                                    ['preference_id'], ['preference_id'], ondelete='CASCADE')
+    with op.batch_alter_table('price_baselines') as batch_op:
+        batch_op.create_foreign_key('fk_price_baselines_preference_id', 'flight_preferences',
+                                    ['preference_id'], ['preference_id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('price_baselines') as batch_op:
+        batch_op.drop_constraint('fk_price_baselines_preference_id', type_='foreignkey')
+    with op.batch_alter_table('price_history') as batch_op:
+        batch_op.drop_constraint('fk_price_history_preference_id', type_='foreignkey')
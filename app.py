@@ -2,16 +2,29 @@ from flask import Flask, render_template, request, jsonify
 from logic.data_grabber import DataGrabber
 from services.database import Database
 from logic.airport_search import AirportSearch
+from logic.airport_index import get_airport_index
 from services.schemas import FlightSearchParams, FlightPreferences, SeatClassEnum
 from config.config import DevelopmentConfig
 from services.db_instance import db
+from logic.airport_aliases import fold_text
+from services.cache import cache_stats
+from services.instrumentation import airport_search_timings, get_logger
 from typing import Tuple, Optional
+import hashlib
 
 app = Flask(__name__)
+logger = get_logger(__name__)
 
 app.config.from_object(DevelopmentConfig)
 db.init_app(app)
 
+AIRPORT_RESPONSE_MAX_AGE = 3600  # Dane lotnisk zmieniają się tylko razem z wersją snapshotu
+MAX_BATCH_AIRPORT_CODES = 1000
+
+# Indeks lotnisk budowany raz przy starcie procesu i współdzielony przez wszystkie żądania
+get_airport_index()
+airport_search = AirportSearch()
+
 def validate_flight_params(form_data: dict) -> Tuple[Optional[FlightSearchParams], Optional[str]]:
     """
     Waliduje parametry lotu używając Pydantic
@@ -121,7 +134,9 @@ def save_flight_preferences(database: Database, user_id: int,
             currency=flight_preferences.currency,
             seat_class=SeatClassEnum.from_form(flight_preferences.seat_class),
             max_price=None,
-            preferred_airline=None
+            preferred_airline=None,
+            max_stops=flight_preferences.max_stops,
+            flex_days=flight_preferences.flex_days
         )
 
         flight_prefs_saved = database.flight_preferences(user_id, flight_prefs)
@@ -135,11 +150,28 @@ def save_flight_preferences(database: Database, user_id: int,
         print(f"Błąd podczas zapisywania preferencji lotu: {e}")
         return f"Błąd podczas zapisywania preferencji lotu: {str(e)}"
 
+
+def airport_search_etag(query: str) -> str:
+    """
+    Buduje ETag odpowiedzi wyszukiwania lotnisk na podstawie wersji danych i zapytania
+    """
+    key = f"{airport_search.dataset_version}|{fold_text(query)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def with_airport_cache_headers(response, etag: str):
+    """
+    Dodaje nagłówki cache'owania HTTP do odpowiedzi z danymi lotnisk
+    """
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={AIRPORT_RESPONSE_MAX_AGE}"
+    return response
+
+
 @app.route("/api/airport/<iata_code>", methods=["GET"])
 def get_airport_info(iata_code):
     """Endpoint do pobierania szczegółowych informacji o lotnisku"""
     try:
-        airport_search = AirportSearch()
         airport_info = airport_search.get_airport_info(iata_code)
 
         if airport_info:
@@ -147,8 +179,37 @@ def get_airport_info(iata_code):
         else:
             return jsonify({"error": "Lotnisko nie znalezione"}), 404
 
-    except Exception as e:
-        print(f"Błąd w endpoint informacji o lotnisku: {e}")
+    except Exception:
+        logger.exception("Błąd w endpoint informacji o lotnisku")
+        return jsonify({"error": "Błąd serwera"}), 500
+
+
+@app.route("/api/airports/batch", methods=["GET", "POST"])
+def get_airports_batch():
+    """
+    Endpoint do pobierania wielu lotnisk naraz.
+    GET: /api/airports/batch?codes=WAW,KRK  POST: {"codes": ["WAW", "KRK"]}
+    """
+    if request.method == "POST":
+        payload = request.get_json(silent=True) or {}
+        codes = payload.get("codes")
+    else:
+        codes = [code for code in request.args.get("codes", "").split(",") if code.strip()]
+
+    if not isinstance(codes, list) or not codes:
+        return jsonify({"error": "Podaj listę kodów IATA w polu 'codes'"}), 400
+
+    # Liczby, obiekty czy null w JSON-ie to błąd żądania, a nie "niepoprawny kod" do odesłania w 'invalid'
+    if not all(isinstance(code, str) for code in codes):
+        return jsonify({"error": "Kody IATA w polu 'codes' muszą być napisami"}), 400
+
+    if len(codes) > MAX_BATCH_AIRPORT_CODES:
+        return jsonify({"error": f"Maksymalnie {MAX_BATCH_AIRPORT_CODES} kodów w jednym zapytaniu"}), 400
+
+    try:
+        return jsonify(airport_search.get_airports_by_codes(codes))
+    except Exception:
+        logger.exception("Błąd w endpoint wsadowego pobierania lotnisk")
         return jsonify({"error": "Błąd serwera"}), 500
 
 
@@ -157,27 +218,35 @@ async def search_airports():
     """Endpoint do wyszukiwania lotnisk używający airports-py"""
     query = request.args.get("q", "").strip()
 
-    print(f"🌐 API call /api/airports?q={query}")
-
     # Zmień minimalną długość z 2 na 1 znak
     if not query or len(query) < 1:
-        print("❌ Query za krótkie lub puste")
         return jsonify([])
 
+    # ETag zależy tylko od wersji danych lotnisk i znormalizowanego zapytania,
+    # więc przeglądarka/proxy mogą ponownie użyć odpowiedzi bez liczenia wyników
+    etag = airport_search_etag(query)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        return with_airport_cache_headers(response, etag)
+
     try:
-        airport_search = AirportSearch()
         results = await airport_search.search_airports(query, limit=10)
+        return with_airport_cache_headers(jsonify(results), etag)
+    except Exception:
+        logger.exception("Błąd w endpoint wyszukiwania lotnisk")
+        # Błędu nie wolno cache'ować pod ETagiem wyników - bez ETaga i z no-store
+        response = jsonify({"error": "Błąd serwera"})
+        response.headers["Cache-Control"] = "no-store"
+        return response, 500
 
-        print(f"📡 Zwracam {len(results)} wyników przez API")
-        print(f"📄 Dane: {results}")
-
-        return jsonify(results)
-    except Exception as e:
-        print(f"❌ Błąd w endpoint wyszukiwania lotnisk: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify([]), 500
 
+@app.route("/api/metrics/airport-search", methods=["GET"])
+def airport_search_metrics():
+    """Endpoint eksportujący czasy etapów wyszukiwania lotnisk i statystyki cache'y"""
+    return jsonify({
+        "timings": airport_search_timings.export(),
+        "caches": cache_stats(),
+    })
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -195,7 +264,9 @@ def index():
             "departure_airport": request.form.get("departure_airport", "").strip().upper(),
             "arrival_airport": request.form.get("arrival_airport", "").strip().upper(),
             "currency": request.form.get("currency", ""),
-            "seat_class": request.form.get("seat_class", "")
+            "seat_class": request.form.get("seat_class", ""),
+            "flex_days": request.form.get("flex_days", "0") or "0",
+            "max_stops": request.form.get("max_stops") or None
         }
 
         # 2. Waliduj parametry lotu
@@ -6,6 +6,19 @@ load_dotenv()
 class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Cache odpowiedzi SerpAPI współdzielony przez aplikację i workera (tabela serpapi_response_cache)
+    SERPAPI_CACHE_ENABLED = os.getenv('SERPAPI_CACHE_ENABLED', '1') == '1'
+    # (maks. liczba dni do wylotu, TTL w sekundach) - im bliżej wylotu, tym szybciej odpowiedź się starzeje
+    SERPAPI_CACHE_TTL_BUCKETS = [
+        (3, 30 * 60),
+        (14, 2 * 3600),
+        (60, 6 * 3600),
+        (None, 24 * 3600),
+    ]
+    # Jak długo po wygaśnięciu TTL (jako wielokrotność TTL) można zwrócić nieaktualną odpowiedź
+    # i odświeżyć ją w tle (stale-while-revalidate)
+    SERPAPI_CACHE_STALE_FACTOR = float(os.getenv('SERPAPI_CACHE_STALE_FACTOR', '1.0'))
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -0,0 +1,150 @@
+from typing import Dict, List, Tuple
+import unicodedata
+
+# Znaki, których NFKD nie rozkłada na literę bazową + znak diakrytyczny
+_SPECIAL_FOLDS = str.maketrans({
+    'ł': 'l', 'Ł': 'l',
+    'ø': 'o', 'Ø': 'o',
+    'đ': 'd', 'Đ': 'd',
+    'ß': 'ss',
+    'æ': 'ae', 'Æ': 'ae',
+    'œ': 'oe', 'Œ': 'oe',
+    'ı': 'i',
+})
+
+
+def fold_text(text: str) -> str:
+    """
+    Normalizuje tekst do porównań: małe litery, bez polskich i innych znaków diakrytycznych
+    ("Kraków" -> "krakow", "Wrocław" -> "wroclaw")
+    """
+    if not text:
+        return ''
+    text = text.translate(_SPECIAL_FOLDS)
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.lower().split())
+
+
+# Lokalne nazwy miast (polskie egzonimy oraz nazwy w językach lokalnych)
+# -> (angielska nazwa miasta, kody IATA obsługujących lotnisk)
+CITY_ALIASES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    # Polska
+    'Warszawa': ('Warsaw', ('WAW', 'WMI')),
+    'Kraków': ('Krakow', ('KRK',)),
+    'Wrocław': ('Wroclaw', ('WRO',)),
+    'Gdańsk': ('Gdansk', ('GDN',)),
+    'Trójmiasto': ('Gdansk', ('GDN',)),
+    'Poznań': ('Poznan', ('POZ',)),
+    'Katowice': ('Katowice', ('KTW',)),
+    'Łódź': ('Lodz', ('LCJ',)),
+    'Rzeszów': ('Rzeszow', ('RZE',)),
+    'Szczecin': ('Szczecin', ('SZZ',)),
+    'Bydgoszcz': ('Bydgoszcz', ('BZG',)),
+    'Lublin': ('Lublin', ('LUZ',)),
+    'Olsztyn': ('Olsztyn', ('SZY',)),
+    'Zielona Góra': ('Zielona Gora', ('IEG',)),
+    'Koszalin': ('Koszalin', ('OSZ',)),
+    'Radom': ('Radom', ('RDO',)),
+    # Europa
+    'Londyn': ('London', ('LHR', 'LGW', 'STN', 'LTN', 'LCY', 'SEN')),
+    'Paryż': ('Paris', ('CDG', 'ORY', 'BVA')),
+    'Rzym': ('Rome', ('FCO', 'CIA')),
+    'Roma': ('Rome', ('FCO', 'CIA')),
+    'Mediolan': ('Milan', ('MXP', 'LIN', 'BGY')),
+    'Milano': ('Milan', ('MXP', 'LIN', 'BGY')),
+    'Wenecja': ('Venice', ('VCE', 'TSF')),
+    'Venezia': ('Venice', ('VCE', 'TSF')),
+    'Neapol': ('Naples', ('NAP',)),
+    'Napoli': ('Naples', ('NAP',)),
+    'Florencja': ('Florence', ('FLR',)),
+    'Firenze': ('Florence', ('FLR',)),
+    'Turyn': ('Turin', ('TRN',)),
+    'Praga': ('Prague', ('PRG',)),
+    'Praha': ('Prague', ('PRG',)),
+    'Wiedeń': ('Vienna', ('VIE',)),
+    'Wien': ('Vienna', ('VIE',)),
+    'Monachium': ('Munich', ('MUC',)),
+    'München': ('Munich', ('MUC',)),
+    'Kolonia': ('Cologne', ('CGN',)),
+    'Köln': ('Cologne', ('CGN',)),
+    'Norymberga': ('Nuremberg', ('NUE',)),
+    'Nürnberg': ('Nuremberg', ('NUE',)),
+    'Berlin': ('Berlin', ('BER',)),
+    'Drezno': ('Dresden', ('DRS',)),
+    'Lipsk': ('Leipzig', ('LEJ',)),
+    'Kopenhaga': ('Copenhagen', ('CPH',)),
+    'København': ('Copenhagen', ('CPH',)),
+    'Sztokholm': ('Stockholm', ('ARN', 'BMA', 'NYO')),
+    'Göteborg': ('Gothenburg', ('GOT',)),
+    'Helsinki': ('Helsinki', ('HEL',)),
+    'Wilno': ('Vilnius', ('VNO',)),
+    'Ryga': ('Riga', ('RIX',)),
+    'Tallin': ('Tallinn', ('TLL',)),
+    'Moskwa': ('Moscow', ('SVO', 'DME', 'VKO')),
+    'Kijów': ('Kyiv', ('KBP', 'IEV')),
+    'Kyiv': ('Kyiv', ('KBP', 'IEV')),
+    'Lwów': ('Lviv', ('LWO',)),
+    'Mińsk': ('Minsk', ('MSQ',)),
+    'Budapeszt': ('Budapest', ('BUD',)),
+    'Bukareszt': ('Bucharest', ('OTP',)),
+    'București': ('Bucharest', ('OTP',)),
+    'Belgrad': ('Belgrade', ('BEG',)),
+    'Beograd': ('Belgrade', ('BEG',)),
+    'Ateny': ('Athens', ('ATH',)),
+    'Saloniki': ('Thessaloniki', ('SKG',)),
+    'Lizbona': ('Lisbon', ('LIS',)),
+    'Lisboa': ('Lisbon', ('LIS',)),
+    'Madryt': ('Madrid', ('MAD',)),
+    'Sewilla': ('Seville', ('SVQ',)),
+    'Sevilla': ('Seville', ('SVQ',)),
+    'Walencja': ('Valencia', ('VLC',)),
+    'Bruksela': ('Brussels', ('BRU', 'CRL')),
+    'Bruxelles': ('Brussels', ('BRU', 'CRL')),
+    'Genewa': ('Geneva', ('GVA',)),
+    'Genève': ('Geneva', ('GVA',)),
+    'Zurych': ('Zurich', ('ZRH',)),
+    'Zürich': ('Zurich', ('ZRH',)),
+    'Edynburg': ('Edinburgh', ('EDI',)),
+    'Stambuł': ('Istanbul', ('IST', 'SAW')),
+    'Teneryfa': ('Tenerife', ('TFS', 'TFN')),
+    'Majorka': ('Palma de Mallorca', ('PMI',)),
+    'Kreta': ('Heraklion', ('HER', 'CHQ')),
+    'Rodos': ('Rhodes', ('RHO',)),
+    'Korfu': ('Corfu', ('CFU',)),
+    'Cypr': ('Larnaca', ('LCA', 'PFO')),
+    # Świat
+    'Nowy Jork': ('New York', ('JFK', 'LGA', 'EWR')),
+    'Pekin': ('Beijing', ('PEK', 'PKX')),
+    'Tokio': ('Tokyo', ('HND', 'NRT')),
+    'Tel Awiw': ('Tel Aviv', ('TLV',)),
+    'Kair': ('Cairo', ('CAI',)),
+    'Dubaj': ('Dubai', ('DXB',)),
+}
+
+
+def build_alias_lookup() -> Dict[str, List[str]]:
+    """
+    Buduje słownik: znormalizowana nazwa lokalna -> lista angielskich nazw miast
+    """
+    lookup: Dict[str, List[str]] = {}
+    for local_name, (english_name, _) in CITY_ALIASES.items():
+        names = lookup.setdefault(fold_text(local_name), [])
+        if english_name not in names:
+            names.append(english_name)
+    return lookup
+
+
+def build_airport_aliases() -> Dict[str, List[str]]:
+    """
+    Buduje słownik: kod IATA -> lista dodatkowych nazw (lokalnych i angielskich),
+    pod którymi lotnisko powinno być wyszukiwalne
+    """
+    aliases: Dict[str, List[str]] = {}
+    for local_name, (english_name, codes) in CITY_ALIASES.items():
+        for code in codes:
+            names = aliases.setdefault(code, [])
+            for name in (local_name, english_name):
+                if name not in names:
+                    names.append(name)
+    return aliases
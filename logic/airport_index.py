@@ -0,0 +1,562 @@
+from typing import List, Dict, Optional, Tuple, Iterable
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from logic.airport_aliases import build_airport_aliases, fold_text
+from logic.airport_snapshot import FIELD_KINDS
+
+NGRAM_SIZE = 3
+
+# Wagi pól przy rankingu wyników wyszukiwania
+FIELD_WEIGHTS = {
+    'code': 1.0,
+    'city': 0.95,
+    'alias': 0.95,
+    'name': 0.8,
+    'word': 0.75,
+    'country': 0.5,
+}
+IMPORTANCE_WEIGHT = 0.15       # Udział "ważności" lotniska (liczba połączeń) w wyniku
+MIN_FUZZY_SIMILARITY = 0.4     # Minimalne podobieństwo trigramów dla dopasowań z literówką
+MAX_FUZZY_CANDIDATES = 200     # Ile kandydatów z indeksu trigramów oceniamy dokładnie
+MAX_POSTING_LENGTH = 400       # Trigramy występujące częściej (np. "air", "por") pomijamy przy generowaniu kandydatów
+# Pola, w których szukamy podciągów (i z których pochodzą trigramy indeksu)
+_SEARCH_TEXT_KINDS = ('city', 'name', 'alias')
+# Waga pola klucza prefiksu wg rangi: 0 - kod IATA, 1 - miasto lub alias, 2 - nazwa, 3 - słowo nazwy, 4 - kraj
+_RANK_WEIGHTS = np.array([FIELD_WEIGHTS[field] for field in ('code', 'city', 'name', 'word', 'country')])
+_WORD_RANK = 3
+# Waga pola wg rodzaju przy literówce i podciągu - kod IATA dopasowujemy tylko po prefiksie
+_KIND_WEIGHTS = np.array([0.0 if kind == 'code' else FIELD_WEIGHTS[kind] for kind in FIELD_KINDS])
+# Najlepsze dopasowanie pola, które nie zaczyna się od zapytania (podciąg 0.7, literówka do 0.65)
+_NON_PREFIX_MAX = 0.7 * _KIND_WEIGHTS.max()
+_VERIFY_CHUNK = 32  # Ile pól sprawdzać na tekście naraz przed ponownym wyznaczeniem progu top-k
+
+
+def format_airport_record(airport_info: Dict) -> Optional[Dict]:
+    """
+    Formatuje surowe dane lotniska do standardowego formatu API
+    (code, name, city, country). Zwraca None dla niepełnych rekordów.
+    """
+    if not airport_info or not isinstance(airport_info, dict):
+        return None
+
+    iata_code = airport_info.get('code')
+    if not iata_code or len(iata_code) != 3:
+        return None
+
+    airport_name = airport_info.get('name', '')
+    city = airport_info.get('city', '')
+    country = airport_info.get('country', '')
+
+    # Jeśli brakuje miasta, spróbuj wyciągnąć je z nazwy lotniska
+    if not city and airport_name:
+        city_from_name = airport_name.split(' ')[0]
+        if city_from_name.lower() not in ['international', 'airport']:
+            city = city_from_name
+
+    if not airport_name or not city:
+        return None
+
+    return {
+        'code': iata_code.upper(),
+        'name': airport_name,
+        'city': city,
+        'country': country
+    }
+
+
+def _ngrams(text: str) -> set:
+    """
+    Zwraca zbiór n-gramów (domyślnie trigramów) dla podanego tekstu
+    """
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _padded_ngrams(text: str) -> frozenset:
+    """
+    Trigramy z dopełnieniem spacjami - początek i koniec słowa mają większe znaczenie przy podobieństwie
+    """
+    return frozenset(_ngrams(f"  {text} "))
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Połączone zakresy [start, start + długość) jako jedna tablica indeksów
+    """
+    lengths = lengths.astype(np.int64)
+    return np.arange(lengths.sum()) + np.repeat(starts.astype(np.int64) - (np.cumsum(lengths) - lengths), lengths)
+
+
+def _importance(airport_info: Dict) -> float:
+    """
+    Surowa miara ważności lotniska na podstawie liczby bezpośrednich połączeń i przewoźników
+    """
+    if 'importance' in airport_info:
+        return float(airport_info['importance'])
+
+    def as_number(value) -> float:
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    return math.log1p(as_number(airport_info.get('direct_flights'))) + \
+        0.5 * math.log1p(as_number(airport_info.get('carriers')))
+
+
+def build_search_tables(airports: Iterable[Dict],
+                        airport_aliases: Optional[Dict[str, List[str]]] = None) -> Dict[str, list]:
+    """
+    Struktury wyszukiwania liczone raz, przy budowaniu snapshotu (logic/airport_snapshot.py):
+    - records: sformatowane lotniska (posortowane po kodzie IATA) z ważnością znormalizowaną do 0.0 - 1.0
+    - fields: pola rankingu każdego rekordu (rodzaj pola, znormalizowany tekst, rosnące numery trigramów
+      z dopełnieniem w słowniku padded_grams)
+    - padded_grams: posortowany słownik trigramów z dopełnieniem wszystkich pól (do podobieństwa przy literówkach)
+    - prefixes: posortowane klucze (tekst, ranga pola, rekord) do wyszukiwania po prefiksie
+    - ngrams: posortowane (trigram, rosnące numery rekordów) z miasta, nazwy i aliasów
+
+    Wszystkie teksty są znormalizowane przez fold_text, więc "Kraków" i "krakow" trafiają w ten sam wpis.
+    """
+    if airport_aliases is None:
+        airport_aliases = build_airport_aliases()
+
+    records: List[Dict] = []
+    fields_by_record: List[List[Tuple[str, str]]] = []
+    prefix_entries = []
+    ngram_postings: Dict[str, List[int]] = {}
+    seen = set()
+
+    for airport_info in sorted(airports, key=lambda item: (item.get('code') or '').upper()):
+        record = format_airport_record(airport_info)
+        if not record or record['code'] in seen:
+            continue
+        seen.add(record['code'])
+        record_id = len(records)
+        record['importance'] = _importance(airport_info)
+        records.append(record)
+
+        city = fold_text(record['city'])
+        name = fold_text(record['name'])
+        aliases = [fold_text(alias) for alias in airport_aliases.get(record['code'], [])]
+        country = fold_text(record['country'])
+
+        fields = [('code', record['code'].lower()), ('city', city), ('name', name), ('country', country)]
+        fields += [('alias', alias) for alias in aliases]
+        fields += [('word', word) for word in name.split()[1:] if len(word) >= NGRAM_SIZE]
+        fields_by_record.append([(field, text) for field, text in fields if text])
+
+        # Rangi pól: 0 - kod IATA, 1 - miasto lub alias miasta, 2 - pełna nazwa, 3 - słowo z nazwy, 4 - kraj
+        prefix_entries.append((record['code'].lower(), 0, record_id))
+        prefix_entries.append((city, 1, record_id))
+        prefix_entries.append((name, 2, record_id))
+        for word in name.split()[1:]:
+            prefix_entries.append((word, 3, record_id))
+        for alias in aliases:
+            prefix_entries.append((alias, 1, record_id))
+        if country:
+            prefix_entries.append((country, 4, record_id))
+
+        grams = set()
+        for text in (city, name, *aliases):
+            grams |= _ngrams(text)
+        for gram in grams:
+            ngram_postings.setdefault(gram, []).append(record_id)
+
+    padded_grams = sorted({gram for fields in fields_by_record for _, text in fields for gram in _padded_ngrams(text)})
+    gram_ids = {gram: gram_id for gram_id, gram in enumerate(padded_grams)}
+    fields_by_record = [
+        [(field, text, sorted(gram_ids[gram] for gram in _padded_ngrams(text))) for field, text in fields]
+        for fields in fields_by_record
+    ]
+
+    max_importance = max((record['importance'] for record in records), default=0.0) or 1.0
+    for record in records:
+        record['importance'] /= max_importance
+
+    return {
+        'records': records,
+        'fields': fields_by_record,
+        'padded_grams': padded_grams,
+        'prefixes': sorted(prefix_entries),
+        'ngrams': sorted(ngram_postings.items()),
+    }
+
+
+class AirportIndex:
+    """
+    Indeks lotnisk czytany bezpośrednio ze snapshotu mapowanego w pamięci:
+    - posortowane klucze (kod IATA, miasto, nazwa, słowa nazwy, aliasy) do wyszukiwania po prefiksie (bisect)
+    - odwrócony indeks trigramów do wyszukiwania podciągów
+
+    Rekordy, klucze i listy trigramów nie są kopiowane do pamięci procesu - wszystkie procesy
+    współdzielą strony tego samego pliku. Struktury buduje build_search_tables przy budowaniu snapshotu.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.dataset_version = snapshot.dataset_version or 'unversioned'
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+    def _record_id(self, iata_code: str) -> Optional[int]:
+        return self.snapshot.find_code(iata_code.strip().upper())
+
+    def get(self, iata_code: str) -> Optional[Dict]:
+        """
+        Zwraca sformatowane lotnisko po kodzie IATA (wyszukiwanie binarne w kolumnie kodów)
+        """
+        if not iata_code:
+            return None
+        record_id = self._record_id(iata_code)
+        if record_id is None:
+            return None
+        return self.snapshot.record(record_id)
+
+    def get_many(self, iata_codes: Iterable[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        """
+        Zwraca (kod -> sformatowane lotnisko, lista kodów nieznalezionych) dla wielu kodów naraz
+        """
+        found: Dict[str, Dict] = {}
+        missing: List[str] = []
+        for code in iata_codes:
+            code = code.strip().upper()
+            if code in found or code in missing:
+                continue
+            record_id = self._record_id(code)
+            if record_id is None:
+                missing.append(code)
+            else:
+                found[code] = self.snapshot.record(record_id)
+        return found, missing
+
+    def iata_prefix(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        Zwraca lotniska, których kod IATA zaczyna się od podanego prefiksu
+        """
+        prefix = fold_text(prefix)
+        ids = [record_id for record_id, rank in self.snapshot.prefix_range(prefix) if rank == 0]
+        return self._materialize(ids[:limit])
+
+    def search(self, term: str, limit: int = 10, exclude: Iterable[str] = ()) -> List[Dict]:
+        """
+        Wyszukuje lotniska po kodzie IATA, prefiksie miasta/nazwy oraz podciągu.
+        Kolejność: dokładny kod IATA, dopasowania prefiksowe, dopasowania podciągu.
+        """
+        term = fold_text(term)
+        if not term or limit <= 0:
+            return []
+
+        seen = {code.upper() for code in exclude}
+        ordered_ids: List[int] = []
+
+        def add(record_id: int) -> bool:
+            code = self.snapshot.code(record_id)
+            if code not in seen:
+                seen.add(code)
+                ordered_ids.append(record_id)
+            return len(ordered_ids) >= limit
+
+        exact_id = self.snapshot.find_code(term.upper()) if len(term) == 3 and term.isalpha() else None
+        if exact_id is not None and add(exact_id):
+            return self._materialize(ordered_ids)
+
+        prefix_matches = sorted(
+            (rank, record_id) for record_id, rank in self.snapshot.prefix_range(term) if 0 < rank < 4
+        )
+        for _, record_id in prefix_matches:
+            if add(record_id):
+                return self._materialize(ordered_ids)
+
+        for record_id in self._substring_ids(term):
+            if add(record_id):
+                break
+
+        return self._materialize(ordered_ids)
+
+    def ranked_search(self, term: str, limit: int = 10) -> List[Tuple[float, Dict]]:
+        """
+        Zwraca top-k lotnisk jako (wynik, lotnisko) posortowane malejąco po wyniku.
+
+        Kandydaci pochodzą z indeksu prefiksów i indeksu trigramów (bez przeglądania całej bazy),
+        a następnie są oceniani po polach (kod IATA, miasto/alias, nazwa, kraj) z tolerancją literówek
+        i premią za ważność lotniska.
+        """
+        results, _ = self.refine_search(term, limit)
+        return results
+
+    def refine_search(self, term: str, limit: int = 10,
+                      previous: Optional[Tuple[str, frozenset]] = None) -> Tuple[List[Tuple[float, Dict]], Optional[frozenset]]:
+        """
+        Jak ranked_search, ale pozwala wykorzystać zbiór trafień trigramów zapisany dla prefiksu zapytania.
+
+        Trigramy prefiksu są podzbiorem trigramów zapytania, więc zbiór rekordów z list trigramów
+        zapytania to zbiór prefiksu uzupełniony o listy samych nowych trigramów (np. tylko "rak"
+        dla "krak" po "kra"). Kandydaci, a więc i wyniki, są identyczne jak przy pełnym wyszukiwaniu;
+        gdy pełne wyszukiwanie musiałoby obciąć kandydatów, zawężanie nie jest stosowane.
+
+        Kandydaci są oceniani wektorowo na kolumnach snapshotu (NumPy): dopasowania prefiksowe z długości
+        kluczy, literówki z liczby wspólnych trigramów pól. Tekst pola jest dekodowany tylko wtedy,
+        gdy pole zawiera wszystkie trigramy zapytania (możliwy podciąg). Wyniki są takie same jak
+        przy ocenie rekord po rekordzie.
+
+        Args:
+            term: Zapytanie
+            limit: Liczba zwracanych wyników
+            previous: (prefiks zapytania, zbiór trafień trigramów zwrócony dla tego prefiksu)
+
+        Returns:
+            (top-k wyników, zbiór trafień trigramów zapytania lub None, gdy kandydaci zostali obcięci
+            i zbiór nie nadaje się do dalszego zawężania)
+        """
+        term = fold_text(term)
+        if not term or limit <= 0:
+            return [], None
+
+        prefix_ids, prefix_best = self._prefix_scores(term)
+        narrowed = self._narrowed_candidate_ids(term, prefix_ids, *previous) if previous is not None else None
+        candidates, shared = narrowed if narrowed is not None else self._candidate_ids(term, prefix_ids)
+
+        prefix_score = np.zeros(len(candidates))
+        prefix_score[np.searchsorted(candidates, prefix_ids)] = prefix_best
+        bonus = IMPORTANCE_WEIGHT * self.snapshot.array('importance')[candidates]
+        scores = prefix_score + bonus
+
+        # Dopasowanie prefiksowe lepsze niż każde inne daje wynik od razu; pozostałych kandydatów
+        # oceniamy po wszystkich polach - tylko tych, którzy mogą jeszcze wejść do top-k
+        final = prefix_score >= _NON_PREFIX_MAX
+        known = scores[final]
+        threshold = np.partition(known, len(known) - limit)[len(known) - limit] if len(known) >= limit else 0.0
+        scores[(prefix_score == 0) & ~final] = 0.0
+        rest = np.flatnonzero(~final & (_NON_PREFIX_MAX + bonus >= threshold))
+        if len(rest):
+            best = np.maximum(prefix_score[rest],
+                              self._field_scores(term, candidates[rest], bonus[rest], known, limit))
+            scores[rest] = np.where(best > 0, best + bonus[rest], 0.0)
+
+        # Top-k: malejąco po wyniku, przy remisie rosnąco po numerze rekordu
+        positive = np.flatnonzero(scores > 0)
+        if len(positive) > limit:
+            kth = np.partition(scores[positive], len(positive) - limit)[len(positive) - limit]
+            positive = positive[scores[positive] >= kth]
+        order = positive[np.lexsort((candidates[positive], -scores[positive]))][:limit]
+        results = [(round(float(scores[position]), 4), self.snapshot.record(int(candidates[position])))
+                   for position in order]
+        return results, shared
+
+    def _prefix_scores(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rekordy z kluczem prefiksu zaczynającym się od zapytania (rosnąco) i najlepsze dopasowanie
+        takiego pola (bez premii za ważność) - z samych kolumn kluczy, bez dekodowania
+        pól. Obejmuje dokładny kod IATA (klucz równy zapytaniu).
+        """
+        records, ranks, chars = self.snapshot.prefix_columns(term)
+        # Krótkie słowa nazwy są kluczami prefiksów, ale nie polami rankingu
+        valid = (ranks != _WORD_RANK) | (chars >= NGRAM_SIZE)
+        records, ranks, chars = records[valid].astype(np.int64), ranks[valid], chars[valid]
+        if not len(records):
+            return records, np.zeros(0)
+        term_length = len(term)
+        match = np.where(chars == term_length, 1.0, 0.85 + 0.1 * term_length / chars)
+        scores = match * _RANK_WEIGHTS[ranks]
+        order = np.lexsort((-scores, records))
+        records, scores = records[order], scores[order]
+        first = np.flatnonzero(np.concatenate(([True], records[1:] != records[:-1])))
+        return records[first], scores[first]
+
+    def _field_scores(self, term: str, record_ids: np.ndarray, bonus: np.ndarray,
+                      known: np.ndarray, limit: int) -> np.ndarray:
+        """
+        Najlepsze dopasowanie pola rekordów z literówką lub podciągiem (bez premii za ważność), liczone
+        wektorowo z numerów trigramów pól. Podciąg jest sprawdzany na tekście tylko w polach, które
+        zawierają wszystkie trigramy zapytania i mogą jeszcze wejść do top-k: dolnym ograniczeniem
+        k-tego wyniku są wyniki pozostałych kandydatów (known) i dopasowania z literówką. Rekordom
+        spoza top-k wynik może zostać zaniżony. Dopasowania prefiksowe są ocenione w _prefix_scores
+        (i zawsze wyższe niż podciąg czy literówka w tym samym polu).
+        """
+        snapshot = self.snapshot
+        field_start = snapshot.array('field_start')
+        field_counts = field_start[record_ids + 1].astype(np.int64) - field_start[record_ids]
+        positions = _ranges(field_start[record_ids], field_counts)
+        gram_start = snapshot.array('field_gram_start')
+        sizes = gram_start[positions + 1].astype(np.int64) - gram_start[positions]
+        grams = snapshot.array('field_grams')[_ranges(gram_start[positions], sizes)]
+        offsets = np.cumsum(sizes) - sizes
+        weights = _KIND_WEIGHTS[snapshot.array('field_kind')[positions]]
+
+        # Przynależność trigramów pól do zapytania jednym wyszukiwaniem binarnym w posortowanych numerach
+        # trigramów zapytania; trigramy wewnętrzne są podzbiorem trigramów z dopełnieniem
+        term_grams = _padded_ngrams(term)
+        inner = _ngrams(term)
+        term_gram_ids = np.array(sorted(snapshot.padded_gram_ids(term_grams)), dtype=np.int64)
+        inner_ids = snapshot.padded_gram_ids(inner)
+        found = np.minimum(np.searchsorted(term_gram_ids, grams), max(len(term_gram_ids) - 1, 0))
+        member = term_gram_ids[found] == grams if len(term_gram_ids) else np.zeros(len(grams), dtype=bool)
+        hits = np.add.reduceat(member.astype(np.int64), offsets)
+        similarity = 2 * hits / (len(term_grams) + sizes)
+        scores = np.where(similarity >= MIN_FUZZY_SIMILARITY, 0.65 * similarity * weights, 0.0)
+        record_starts = np.cumsum(field_counts) - field_counts
+
+        if len(inner_ids) == len(inner):
+            if inner:
+                is_inner = np.array([gram_id in inner_ids for gram_id in term_gram_ids.tolist()])
+                inner_hits = np.add.reduceat((member & is_inner[found]).astype(np.int64), offsets)
+            else:
+                inner_hits = np.zeros(len(positions), dtype=np.int64)
+            contains = np.flatnonzero((inner_hits == len(inner)) & (weights > 0))
+            # Zapytanie będące jednym trigramem bez spacji jest podciągiem dokładnie tych pól, które go zawierają
+            if len(term) != NGRAM_SIZE or ' ' in term:
+                fuzzy = np.maximum.reduceat(scores, record_starts)
+                lower = np.where(fuzzy > 0, fuzzy + bonus, 0.0)
+                upper = 0.7 * weights + np.repeat(bonus, field_counts)
+                owner = np.repeat(np.arange(len(record_ids)), field_counts)
+                # Pola sprawdzane malejąco po najlepszym możliwym wyniku, porcjami; każde potwierdzone
+                # podniesienie dolnego ograniczenia k-tego wyniku odcina kolejne pola
+                pending = contains[np.argsort(-upper[contains], kind='stable')]
+                confirmed = []
+                for start in range(0, len(pending), _VERIFY_CHUNK):
+                    bounds = np.concatenate((known, lower[lower > 0]))
+                    threshold = np.partition(bounds, len(bounds) - limit)[len(bounds) - limit] \
+                        if len(bounds) >= limit else 0.0
+                    chunk = pending[start:start + _VERIFY_CHUNK]
+                    chunk = chunk[upper[chunk] >= threshold]
+                    if not len(chunk):
+                        break
+                    chunk = chunk[[term in snapshot.field_text(position) for position in positions[chunk].tolist()]]
+                    np.maximum.at(lower, owner[chunk], upper[chunk])
+                    confirmed.append(chunk)
+                contains = np.concatenate(confirmed) if confirmed else pending[:0]
+            scores[contains] = np.maximum(scores[contains], 0.7 * weights[contains])
+
+        return np.maximum.reduceat(scores, record_starts)
+
+    def _candidate_ids(self, term: str, prefix_ids: np.ndarray) -> Tuple[np.ndarray, Optional[frozenset]]:
+        """
+        Zbiera kandydatów (rosnąco): dokładny kod IATA, dopasowania prefiksowe oraz rekordy
+        dzielące z zapytaniem najwięcej trigramów (dopasowania z literówką).
+        Zwraca też zbiór wszystkich rekordów z list trigramów zapytania lub None, gdy kandydaci
+        zostali obcięci (częsty trigram pominięty albo więcej niż MAX_FUZZY_CANDIDATES rekordów).
+        """
+        postings = [self.snapshot.postings(gram) for gram in sorted(_ngrams(term))]
+        selective = [ids for ids in postings if 0 < len(ids) <= MAX_POSTING_LENGTH]
+        complete = len(selective) == len([ids for ids in postings if ids])
+        if not selective:
+            selective = [ids for ids in postings if ids]
+
+        if not selective:
+            return np.union1d(prefix_ids, np.empty(0, dtype=np.int64)), frozenset() if complete else None
+        # Liczba wspólnych trigramów na rekord; remisy w kolejności pierwszego wystąpienia (jak Counter.most_common)
+        hits = np.concatenate([np.asarray(ids, dtype=np.int64) for ids in selective])
+        counts = np.bincount(hits)
+        shared = np.flatnonzero(counts)
+        if len(shared) > MAX_FUZZY_CANDIDATES:
+            complete = False
+        # Przy powtórzonych indeksach przypisanie zostawia ostatnią wartość - od końca, więc pierwsze wystąpienie
+        first = np.empty(len(counts), dtype=np.int64)
+        first[hits[::-1]] = np.arange(len(hits) - 1, -1, -1)
+        fuzzy = shared[np.lexsort((first[shared], -counts[shared]))[:MAX_FUZZY_CANDIDATES]]
+        return np.union1d(prefix_ids, fuzzy), frozenset(shared.tolist()) if complete else None
+
+    def _narrowed_candidate_ids(self, term: str, prefix_ids: np.ndarray, previous_term: str,
+                                previous_shared: frozenset) -> Optional[Tuple[np.ndarray, frozenset]]:
+        """
+        Kandydaci jak w _candidate_ids, liczeni ze zbioru trafień trigramów prefiksu i list nowych
+        trigramów. None, gdy previous_term nie jest prefiksem zapytania albo pełne wyszukiwanie
+        obcięłoby kandydatów - wtedy trzeba przeszukać indeks od nowa.
+        """
+        if not term.startswith(previous_term):
+            return None
+        shared = set(previous_shared)
+        for gram in sorted(_ngrams(term) - _ngrams(previous_term)):
+            ids = self.snapshot.postings(gram)
+            if len(ids) > MAX_POSTING_LENGTH:
+                return None
+            shared.update(ids)
+        if len(shared) > MAX_FUZZY_CANDIDATES:
+            return None
+        shared = frozenset(shared)
+        return np.union1d(prefix_ids, np.fromiter(shared, dtype=np.int64)), shared
+
+    def _substring_ids(self, term: str) -> List[int]:
+        """
+        Zwraca identyfikatory lotnisk, których miasto, nazwa lub alias zawiera podany tekst
+        """
+        if len(term) < NGRAM_SIZE:
+            return []
+
+        postings = []
+        for gram in _ngrams(term):
+            ids = self.snapshot.postings(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+
+        return [
+            record_id for record_id in sorted(candidates)
+            if any(term in text for kind, text, _ in self.snapshot.fields(record_id) if kind in _SEARCH_TEXT_KINDS)
+        ]
+
+    def _materialize(self, ids: List[int]) -> List[Dict]:
+        return [self.snapshot.record(record_id) for record_id in ids]
+
+
+SNAPSHOT_CHECK_INTERVAL = 60.0  # Co ile sekund sprawdzać, czy plik snapshotu się zmienił
+
+_index: Optional[AirportIndex] = None
+_index_file_id: Optional[tuple] = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _snapshot_file_id(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def get_airport_index() -> AirportIndex:
+    """
+    Zwraca indeks lotnisk współdzielony w obrębie procesu.
+
+    Indeks czyta rekordy, klucze prefiksów i listy trigramów bezpośrednio ze snapshotu danych lotnisk
+    (logic/airport_snapshot.py), mapowanego w pamięci i współdzielonego przez wszystkie procesy. Gdy plik snapshotu zostanie podmieniony (nowa wersja danych),
+    indeks jest przeładowywany przy najbliższym sprawdzeniu.
+    """
+    global _index, _index_file_id, _index_checked_at
+
+    if _index is not None and time.monotonic() - _index_checked_at < SNAPSHOT_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        if _index is not None and time.monotonic() - _index_checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return _index
+        _index_checked_at = time.monotonic()
+
+        from logic.airport_snapshot import AirportSnapshot, build_snapshot_bytes, default_snapshot_path, load_snapshot
+        path = default_snapshot_path()
+        if _index is not None and _snapshot_file_id(path) in (None, _index_file_id):
+            return _index
+
+        snapshot = load_snapshot(path)
+        if snapshot is not None:
+            if _index is None or snapshot.dataset_version != _index.dataset_version:
+                _index = AirportIndex(snapshot)
+            _index_file_id = snapshot.file_id
+        elif _index is None:
+            # Brak snapshotu (np. katalog tylko do odczytu) - ten sam format zbudowany w pamięci procesu
+            content, _ = build_snapshot_bytes()
+            _index = AirportIndex(AirportSnapshot.from_bytes(content))
+    return _index
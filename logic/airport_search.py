@@ -1,33 +1,98 @@
 from typing import List, Dict, Optional
-from airportfinder.airportfinder import Airports
-from deep_translator import GoogleTranslator
-import time
+from logic.airport_index import NGRAM_SIZE, AirportIndex, format_airport_record, get_airport_index
+from logic.airport_aliases import build_alias_lookup, fold_text
+from services.cache import MemoryCache, get_cache
+from services.instrumentation import airport_search_timings, get_sampled_logger
 import asyncio
+import os
+import time
+
+# Wyszukiwanie jest gorącą ścieżką (każde naciśnięcie klawisza) - komunikaty INFO/DEBUG są próbkowane
+logger = get_sampled_logger(__name__, env_var='SEARCH_LOG_SAMPLE_RATE')
+
+# Tablica aliasów budowana raz na proces - wyszukiwanie nie zależy od zewnętrznego API
+_ALIAS_LOOKUP = build_alias_lookup()
+
+TRANSLATION_CACHE_TTL = 7 * 24 * 3600
+SEARCH_CACHE_TTL = 24 * 3600
+NARROWING_CACHE_TTL = 600
 
 
 class AirportSearch:
     def __init__(self):
         """
-        Inicjalizuje serwis wyszukiwania lotnisk używając biblioteki airports-py
+        Inicjalizuje serwis wyszukiwania lotnisk używając współdzielonego indeksu lotnisk
         """
         self.airports_cache = None
-        self.translator = GoogleTranslator(source='auto', target='en')
-        self.translation_cache = {}  # Cache dla tłumaczeń
+        self.translator = None  # Tworzony leniwie, tylko gdy włączone jest tłumaczenie online
+        self.online_translation = os.getenv('AIRPORT_SEARCH_ONLINE_TRANSLATION', '0') == '1'
+        # Cache'e ograniczone (LRU + TTL), współdzielone w procesie lub między procesami (CACHE_BACKEND)
+        self.translation_cache = get_cache('airport-translations', max_entries=5000, ttl=TRANSLATION_CACHE_TTL)
+        self.search_cache = get_cache('airport-search', max_entries=20000, ttl=SEARCH_CACHE_TTL)
+        # Zbiory trafień trigramów dla ostatnich zapytań (tylko w procesie) - "krak" jest liczone ze zbioru dla "kra"
+        self.narrowing_cache = MemoryCache('airport-narrowing', max_entries=5000, ttl=NARROWING_CACHE_TTL)
         self._load_airports()
 
+    @property
+    def index(self) -> AirportIndex:
+        """
+        Aktualny indeks lotnisk procesu (przeładowywany po zmianie snapshotu danych)
+        """
+        return get_airport_index()
+
+    @property
+    def dataset_version(self) -> str:
+        return self.index.dataset_version
+
     def _load_airports(self):
         """
         Ładuje dane lotnisk do cache'u dla szybszego wyszukiwania
+        (indeks jest budowany raz na proces i współdzielony przez instancje)
         """
         try:
+            get_airport_index()
             self.airports_cache = True
-        except Exception as e:
-            print(f"Błąd podczas ładowania danych lotnisk: {e}")
+        except Exception:
+            logger.exception("Błąd podczas ładowania danych lotnisk")
             self.airports_cache = False
 
+    def _cache_get(self, cache, key: str):
+        """
+        Odczyt z cache'u odporny na awarię backendu (np. niedostępny Redis) - błąd traktowany jak chybienie
+        """
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.warning("Cache '%s' niedostępny przy odczycie: %s", cache.namespace, e)
+            return None
+
+    def _cache_set(self, cache, key: str, value) -> None:
+        """
+        Zapis do cache'u odporny na awarię backendu - wyszukiwanie działa dalej bez cache'u
+        """
+        try:
+            cache.set(key, value)
+        except Exception as e:
+            logger.warning("Cache '%s' niedostępny przy zapisie: %s", cache.namespace, e)
+
+    def _local_variants(self, text: str) -> List[str]:
+        """
+        Zwraca warianty zapytania na podstawie lokalnej tablicy aliasów (bez wywołań sieciowych)
+
+        Returns:
+            Lista wariantów (oryginał + angielskie nazwy miast dla znanych nazw lokalnych)
+        """
+        variants = [text]
+        for english_name in _ALIAS_LOOKUP.get(fold_text(text), []):
+            if english_name not in variants:
+                variants.append(english_name)
+        return variants
+
     async def _translate_to_english(self, text: str) -> List[str]:
         """
-        Tłumaczy tekst na angielski używając deep_translator
+        Tłumaczy tekst na angielski używając deep_translator.
+        Używane tylko jako opcjonalny fallback (AIRPORT_SEARCH_ONLINE_TRANSLATION=1),
+        gdy lokalny indeks i aliasy nie dały wyników.
 
         Returns:
             Lista wariantów (oryginał + przetłumaczone)
@@ -35,64 +100,68 @@ class AirportSearch:
         text_lower = text.lower().strip()
 
         # Sprawdź cache
-        if text_lower in self.translation_cache:
-            return self.translation_cache[text_lower]
+        cached = self._cache_get(self.translation_cache, text_lower)
+        if cached is not None:
+            return cached
 
         variants = [text]  # Zawsze dodaj oryginał
 
         try:
-            # Przywróć automatyczne tłumaczenie na angielski
-            print(f"🔄 Tłumaczę '{text}' na angielski...")
-            translated_text = self.translator.translate(text)
+            if self.translator is None:
+                from deep_translator import GoogleTranslator
+                self.translator = GoogleTranslator(source='auto', target='en')
 
-            if translated_text and translated_text.lower() != text_lower:
-                print(f"✅ Przetłumaczono '{text}' → '{translated_text}'")
-
-                # Dodaj warianty przetłumaczonego tekstu
-                variants.extend([
-                    translated_text,
-                    translated_text.capitalize(),
-                    translated_text.title(),
-                    translated_text.upper(),
-                    translated_text.lower()
-                ])
-            else:
-                print(f"ℹ️ Tekst '{text}' już jest w języku angielskim lub nie wymagał tłumaczenia")
+            translated_text = await asyncio.to_thread(self.translator.translate, text)
 
-            # Dodaj też warianty oryginalnego tekstu
-            variants.extend([
-                text.capitalize(),
-                text.title(),
-                text.upper(),
-                text.lower()
-            ])
+            if translated_text and translated_text.lower() != text_lower:
+                logger.info("Przetłumaczono '%s' -> '%s'", text, translated_text)
+                variants.append(translated_text)
 
         except Exception as e:
-            print(f"❌ Błąd tłumaczenia '{text}': {e}")
-            # W przypadku błędu, użyj tylko oryginalnego tekstu i jego wariantów
-            variants.extend([
-                text.capitalize(),
-                text.title(),
-                text.upper(),
-                text.lower()
-            ])
-
-        # Usuń duplikaty
-        unique_variants = []
-        seen = set()
-        for variant in variants:
-            variant_clean = variant.strip()
-            if variant_clean and variant_clean.lower() not in seen:
-                unique_variants.append(variant_clean)
-                seen.add(variant_clean.lower())
+            logger.warning("Błąd tłumaczenia '%s': %s", text, e)
 
         # Cache wynik
-        self.translation_cache[text_lower] = unique_variants
+        self._cache_set(self.translation_cache, text_lower, variants)
 
-        # Małe opóźnienie żeby nie przeciążyć API tłumaczenia
-        await asyncio.sleep(0.1)
+        return variants
 
-        return unique_variants
+    def _search_variants(self, query_variants: List[str], limit: int,
+                         scored_results: Dict[str, tuple]) -> None:
+        """
+        Uzupełnia scored_results (kod -> (wynik, lotnisko)) o ranking z indeksu dla kolejnych wariantów
+        zapytania. Dla lotniska znalezionego przez kilka wariantów zostaje najlepszy wynik.
+        """
+        index = self.index
+        # Indeks nie rozróżnia wielkości liter ani znaków diakrytycznych - wystarczy jeden wariant na tekst
+        searched = set()
+        for search_query in query_variants:
+            folded = fold_text(search_query)
+            if folded in searched:
+                continue
+            searched.add(folded)
+
+            previous = self._previous_matches(index.dataset_version, folded)
+            ranked, shared = index.refine_search(folded, limit, previous)
+            if shared is not None:
+                self.narrowing_cache.set(f"{index.dataset_version}|{folded}", shared)
+
+            for score, airport in ranked:
+                current = scored_results.get(airport['code'])
+                if current is None or score > current[0]:
+                    scored_results[airport['code']] = (score, airport)
+
+    def _previous_matches(self, dataset_version: str, folded_query: str) -> Optional[tuple]:
+        """
+        Szuka w cache'u zbioru trafień trigramów dla najdłuższego prefiksu zapytania (np. "kra" dla "krak").
+        Prefiks krótszy niż trigram ("kr" dla "kra") nie ma trigramów, więc jego zbiór jest pusty
+        i nie musi być zapamiętany.
+        """
+        for length in range(len(folded_query) - 1, NGRAM_SIZE - 1, -1):
+            prefix = folded_query[:length]
+            shared = self.narrowing_cache.get(f"{dataset_version}|{prefix}")
+            if shared is not None:
+                return prefix, shared
+        return folded_query[:NGRAM_SIZE - 1], frozenset()
 
     async def search_airports(self, query: str, limit: int = 10) -> List[Dict]:
             """
@@ -104,254 +173,116 @@ class AirportSearch:
 
             Returns:
                 Lista słowników z danymi lotnisk
-            """
-            print(f"🔍 Wyszukiwanie lotnisk dla: '{query}'")
-            airports = Airports()
 
+            Raises:
+                RuntimeError: Indeks lotnisk jest niedostępny. Pozostałe błędy wyszukiwania również są
+                    przekazywane dalej - pusta lista oznacza wyłącznie brak dopasowań.
+            """
             # Zmniejsz minimalną długość zapytania z 2 na 1 znak
             if not query or len(query.strip()) < 1:
-                print("❌ Query za krótkie")
                 return []
 
             if not self.airports_cache:
-                print("❌ Cache lotnisk niedostępny")
-                return []
+                # Błąd, a nie pusta lista - pusty wynik trafiłby do cache'y HTTP jak poprawna odpowiedź
+                raise RuntimeError("Indeks lotnisk niedostępny")
 
+            started = time.perf_counter()
             query = query.strip()
             results = []
-            seen_codes = set()
-
-            try:
-                # Dla bardzo krótkich zapytań (1-2 znaki) szukaj tylko po kodzie IATA i bez tłumaczenia
-                if len(query) <= 2:
-                    print(f"🔤 Krótkie zapytanie - wyszukiwanie tylko po kodzie IATA: {query.upper()}")
-
-                    # Wyszukaj po kodzie IATA
-                    if len(query) == 3 and query.isalpha():
-                        airport_info = airports.airports_iata.get(query.upper())
-                        if airport_info:
-                            airport_formatted = self._format_airport(airport_info)
-                            if airport_formatted:
-                                results.append(airport_formatted)
-                                seen_codes.add(airport_formatted['code'])
-                                print(f"✅ Znaleziono dokładny kod IATA: {airport_formatted['code']}")
-
-                    # Dla 1-2 znaków, szukaj kodów IATA zaczynających się od tych liter
-                    elif query.isalpha():
-                        query_upper = query.upper()
-                        print(f"🔍 Szukam kodów IATA zaczynających się od: {query_upper}")
-
-                        matching_codes = [code for code in airports.airports_iata.keys()
-                                        if code.startswith(query_upper)][:limit]
-
-                        for code in matching_codes:
-                            if len(results) >= limit:
-                                break
-                            airport_info = airports.airports_iata.get(code)
-                            if airport_info:
-                                airport_formatted = self._format_airport(airport_info)
-                                if airport_formatted and airport_formatted['code'] not in seen_codes:
-                                    results.append(airport_formatted)
-                                    seen_codes.add(airport_formatted['code'])
-                                    print(f"✅ Dodano lotnisko przez prefiks IATA: {airport_formatted['code']}")
-
-                    return results[:limit]
-
-                # Dla dłuższych zapytań użyj pełnej logiki z tłumaczeniem
-                # Pobierz warianty językowe zapytania tylko dla zapytań >= 3 znaki
-                query_variants = await self._translate_to_english(query)
-                print(f"🌐 Warianty wyszukiwania: {query_variants}")
-
-                for search_query in query_variants:
-                    if len(results) >= limit:
-                        break
-
-                    # 1. Wyszukaj po kodzie IATA (jeśli query wygląda jak kod i ma dokładnie 3 znaki)
-                    if len(search_query) == 3 and search_query.isalpha():
-                        print(f"🔤 Wyszukiwanie po kodzie IATA: {search_query.upper()}")
-                        airport_info = airports.airports_iata.get(search_query.upper())
-                        print(f"📍 Znaleziono przez IATA: {1 if airport_info else 0} wyników")
-
-                        if airport_info:
-                            airport_formatted = self._format_airport(airport_info)
-                            if airport_formatted and airport_formatted['code'] not in seen_codes:
-                                results.append(airport_formatted)
-                                seen_codes.add(airport_formatted['code'])
-                                print(f"✅ Dodano lotnisko: {airport_formatted['code']} - {airport_formatted['city']}")
-
-                    # 2. Wyszukuj po nazwach miast w kodach IATA (fallback dla długich zapytań)
-                    if len(results) < limit and len(search_query) >= 3:
-                        print(f"🏙️ Wyszukiwanie po nazwie miasta w bazie IATA: {search_query}")
-                        search_lower = search_query.lower()
-
-                        # Przeszukaj wszystkie lotniska w poszukiwaniu pasujących miast/nazw
-                        matched_codes = []
-                        for code, airport_data in airports.airports_iata.items():
-                            if not airport_data:
-                                continue
-
-                            city = airport_data.get('city', '').lower()
-                            name = airport_data.get('name', '').lower()
-                            country = airport_data.get('country', '').lower()
-
-                            # Sprawdź czy zapytanie pasuje do miasta, nazwy lotniska lub kraju
-                            if (search_lower in city or
-                                search_lower in name or
-                                city.startswith(search_lower) or
-                                name.startswith(search_lower)):
-                                matched_codes.append(code)
-                                if len(matched_codes) >= limit:
-                                    break
-
-                        print(f"📍 Znaleziono przez wyszukiwanie w bazie: {len(matched_codes)} kodów")
-
-                        for code in matched_codes:
-                            if len(results) >= limit:
-                                break
-                            if code not in seen_codes:
-                                airport_info = airports.airports_iata.get(code)
-                                if airport_info:
-                                    airport_formatted = self._format_airport(airport_info)
-                                    if airport_formatted:
-                                        results.append(airport_formatted)
-                                        seen_codes.add(airport_formatted['code'])
-                                        print(f"✅ Dodano lotnisko: {airport_formatted['code']} - {airport_formatted['city']}")
-
-                    # 3. Próba użycia airport_name() jako backup (może nie działać we wszystkich przypadkach)
-                    if len(results) < limit and len(search_query) >= 3:
-                        print(f"🔍 Próba użycia airport_name(): {search_query}")
-                        try:
-                            airports_by_name = airports.airport_name(search_query)
-
-                            # Sprawdź czy wynik to lista czy pojedynczy element
-                            if airports_by_name:
-                                if isinstance(airports_by_name, dict):
-                                    airports_by_name = [airports_by_name]
-                                elif not isinstance(airports_by_name, list):
-                                    airports_by_name = []
-
-                                print(f"📍 Znaleziono przez airport_name(): {len(airports_by_name) if airports_by_name else 0} wyników")
-
-                                if airports_by_name:
-                                    for airport_info in airports_by_name:
-                                        if len(results) >= limit:
-                                            break
-                                        airport_formatted = self._format_airport(airport_info)
-                                        if (airport_formatted and
-                                            airport_formatted['code'] not in seen_codes):
-                                            results.append(airport_formatted)
-                                            seen_codes.add(airport_formatted['code'])
-                                            print(f"✅ Dodano lotnisko przez airport_name: {airport_formatted['code']} - {airport_formatted['city']}")
-                        except Exception as e:
-                            print(f"❌ Błąd w airport_name() dla '{search_query}': {e}")
-                            continue
-
-                # 3. Sortuj wyniki - dokładne dopasowania najpierw
-                results = self._sort_results(results, query)
-                print(f"📊 Zwracam {len(results)} wyników")
-
-            except Exception as e:
-                print(f"❌ Błąd podczas wyszukiwania lotnisk: {e}")
-                import traceback
-                traceback.print_exc()
-                return []
-
-            return results[:limit]
+            scored_results = {}
+
+            with airport_search_timings.stage('cache'):
+                cache_key = f"{self.dataset_version}|{fold_text(query)}|{limit}"
+                cached_results = self._cache_get(self.search_cache, cache_key)
+            if cached_results is not None:
+                logger.debug("Wynik z cache dla '%s'", query)
+                return cached_results
+
+            # Dla bardzo krótkich zapytań (1-2 znaki) szukaj tylko po prefiksie kodu IATA i bez tłumaczenia;
+            # wynik przechodzi przez ten sam cache, pomiar 'total' i log podsumowania jak dłuższe zapytania
+            if len(query) <= 2:
+                query_variants = [query]
+                if query.isalpha():
+                    with airport_search_timings.stage('index_lookup'):
+                        results = self.index.iata_prefix(query, limit)
+            else:
+                # Dla dłuższych zapytań użyj lokalnych aliasów (Warszawa -> Warsaw itd.)
+                with airport_search_timings.stage('translate'):
+                    query_variants = self._local_variants(query)
+                with airport_search_timings.stage('index_lookup'):
+                    self._search_variants(query_variants, limit, scored_results)
+
+                # Tłumaczenie online tylko jako opcjonalny fallback, gdy lokalnie nic nie znaleziono
+                if not scored_results and self.online_translation:
+                    with airport_search_timings.stage('translate_online'):
+                        translated_variants = await self._translate_to_english(query)
+                    with airport_search_timings.stage('index_lookup'):
+                        self._search_variants(translated_variants, limit, scored_results)
+
+                # Sortuj wyniki malejąco po wyniku dopasowania (remisy - alfabetycznie po kodzie)
+                with airport_search_timings.stage('sort'):
+                    ranked = sorted(scored_results.values(), key=lambda item: (-item[0], item[1]['code']))
+                with airport_search_timings.stage('format'):
+                    results = [airport for _, airport in ranked[:limit]]
+
+            self._cache_set(self.search_cache, cache_key, results)
+
+            elapsed = time.perf_counter() - started
+            airport_search_timings.record('total', elapsed)
+            logger.info("Wyszukiwanie '%s': %d wyników w %.2f ms (warianty: %s)",
+                        query, len(results), elapsed * 1000, query_variants)
+            return results
 
     def _format_airport(self, airport_info: Dict) -> Optional[Dict]:
             """
             Formatuje dane lotniska z airports-py do standardowego formatu
             """
             try:
-                print(f"🛠️ Formatowanie lotniska: {airport_info}")
-
-                if not airport_info or not isinstance(airport_info, dict):
-                    print("❌ Brak danych lotniska lub nieprawidłowy format")
-                    return None
-
-                # Sprawdź czy ma kod IATA
-                iata_code = airport_info.get('code')
-                if not iata_code or len(iata_code) != 3:
-                    print(f"❌ Brak kodu IATA lub nieprawidłowy: {iata_code}")
-                    return None
-
-                # Wyciągnij potrzebne dane
-                airport_name = airport_info.get('name', '')
-                city = airport_info.get('city', '')
-                country = airport_info.get('country', '')
-
-                # Jeśli brakuje miasta, spróbuj wyciągnąć je z nazwy lotniska
-                if not city and airport_name:
-                    # Prosta heurystyka: weź pierwsze słowo z nazwy lotniska
-                    city_from_name = airport_name.split(' ')[0]
-                    # Sprawdź, czy to nie jest słowo typu "International"
-                    if city_from_name.lower() not in ['international', 'airport']:
-                        city = city_from_name
-                        print(f"ℹ️ Brak miasta, użyto z nazwy lotniska: '{city}'")
-
-                # Filtruj niepełne dane
-                if not airport_name or not city:
-                    print(f"❌ Niepełne dane - nazwa: '{airport_name}', miasto: '{city}'")
-                    return None
-
-                formatted = {
-                    'code': iata_code.upper(),
-                    'name': airport_name,
-                    'city': city,
-                    'country': country
-                }
-
-                print(f"✅ Sformatowano: {formatted}")
+                formatted = format_airport_record(airport_info)
+                if not formatted:
+                    logger.debug("Niepełne lub nieprawidłowe dane lotniska: %s", airport_info)
                 return formatted
 
-            except Exception as e:
-                print(f"❌ Błąd formatowania lotniska: {e}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                logger.exception("Błąd formatowania lotniska")
                 return None
 
-    def _sort_results(self, results: List[Dict], query: str) -> List[Dict]:
-        """
-        Sortuje wyniki - dokładne dopasowania miast/kodów na początku
-        """
-        query_lower = query.lower()
-
-        exact_matches = []
-        partial_matches = []
-
-        for airport in results:
-            city_lower = airport['city'].lower()
-            code_lower = airport['code'].lower()
-
-            if (city_lower == query_lower or
-                code_lower == query_lower or
-                city_lower.startswith(query_lower) or
-                code_lower.startswith(query_lower)):
-                exact_matches.append(airport)
-            else:
-                partial_matches.append(airport)
-
-        return exact_matches + partial_matches
-
     def get_airport_by_code(self, iata_code: str) -> Optional[Dict]:
         """
         Pobiera lotnisko po kodzie IATA
         """
-        airports = Airports()
         try:
-            if not iata_code or len(iata_code) != 3:
+            if not iata_code or len(iata_code) != 3 or not self.index:
                 return None
 
-            # airports_iata to słownik - używaj get() zamiast wywołania funkcji
-            airport_info = airports.airports_iata.get(iata_code.upper())
-            if airport_info:
-                return self._format_airport(airport_info)
-            return None
+            return self.index.get(iata_code)
 
         except Exception as e:
-            print(f"Błąd podczas pobierania lotniska {iata_code}: {e}")
+            logger.warning("Błąd podczas pobierania lotniska %s: %s", iata_code, e)
             return None
 
+    def get_airports_by_codes(self, iata_codes: List[str]) -> Dict[str, List]:
+        """
+        Pobiera wiele lotnisk naraz po kodach IATA
+
+        Returns:
+            Słownik z kluczami:
+            - airports: kod -> dane lotniska
+            - missing: poprawne kody, których nie ma w bazie
+            - invalid: napisy, które nie są kodami IATA
+        """
+        valid_codes = []
+        invalid = []
+        for code in iata_codes:
+            normalized = code.strip().upper()
+            if len(normalized) == 3 and normalized.isalpha():
+                valid_codes.append(normalized)
+            elif code not in invalid:
+                invalid.append(code)
+
+        airports, missing = self.index.get_many(valid_codes)
+        return {'airports': airports, 'missing': missing, 'invalid': invalid}
+
     def validate_iata_code(self, iata_code: str) -> bool:
         """
         Waliduje czy podany kod to właściwy kod IATA
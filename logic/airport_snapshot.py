@@ -0,0 +1,516 @@
+"""
+Kompaktowy, wersjonowany snapshot danych lotnisk i indeksu wyszukiwania w formacie binarnym.
+
+Układ pliku (little-endian):
+    nagłówek   - magic, wersja formatu, wersja zbioru danych, liczności tablic i rozmiar tablicy napisów
+    rekordy    - kody IATA (3 bajty, posortowane), referencje napisów (nazwa, miasto, kraj), ważność
+    pola       - pola rankingu każdego rekordu (rodzaj pola + znormalizowany tekst)
+    prefiksy   - posortowane klucze wyszukiwania po prefiksie (tekst, długość w znakach, ranga pola, rekord)
+    trigramy   - listy rekordów, w których występują trigramy indeksu (w kolejności kluczy)
+    kody       - posortowana lista wszystkich poprawnych kodów IATA (3 bajty każdy)
+    klucze     - posortowane trigramy słownika pól i indeksu jako klucze stałej długości (GRAM_KEY_SIZE bajtów)
+    napisy     - tablica napisów UTF-8, do której odwołują się pozostałe sekcje
+
+Wszystkie struktury wyszukiwania są liczone przy budowaniu snapshotu (logic/airport_index.py,
+build_search_tables), a plik jest mapowany w pamięci (mmap) i czytany bezpośrednio przez
+memoryview.cast - procesy (workery gunicorna, worker harmonogramu) współdzielą te same strony
+z cache'u systemu plików zamiast budować własne słowniki i listy indeksu.
+
+Budowanie: python -m logic.airport_snapshot build [--output ŚCIEŻKA]
+"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b'AIRS'
+SNAPSHOT_FORMAT_VERSION = 3
+
+# magic, wersja formatu, wersja danych (16 bajtów), liczby: rekordów, pól, trigramów pól, słownika trigramów
+# z dopełnieniem, kluczy prefiksów, trigramów, pozycji list trigramów, poprawnych kodów, rozmiar tablicy napisów
+_HEADER = struct.Struct('<4sH16s9I')
+_HEADER_SIZE = 64  # nagłówek wyrównany, żeby kolumny zaczynały się na granicy 8 bajtów
+_STRING_FIELDS = ('name', 'city', 'country')
+# Rodzaje pól rankingu (kolejność = wartość w kolumnie field_kind)
+FIELD_KINDS = ('code', 'city', 'name', 'country', 'alias', 'word')
+
+# Sekcje w kolejności zapisu (najpierw szersze typy - każda kolumna jest wyrównana do swojego rozmiaru):
+# nazwa, format elementu, liczność (nazwa licznika z nagłówka, dodatkowe elementy)
+_SECTIONS = (
+    ('importance', 'd', 'records', 0),
+    ('name_offset', 'I', 'records', 0),
+    ('city_offset', 'I', 'records', 0),
+    ('country_offset', 'I', 'records', 0),
+    ('field_start', 'I', 'records', 1),
+    ('field_offset', 'I', 'fields', 0),
+    ('field_gram_start', 'I', 'fields', 1),
+    ('field_grams', 'I', 'field_grams', 0),
+    ('prefix_offset', 'I', 'prefixes', 0),
+    ('prefix_record', 'I', 'prefixes', 0),
+    ('gram_start', 'I', 'grams', 1),
+    ('postings', 'I', 'postings', 0),
+    ('name_length', 'H', 'records', 0),
+    ('city_length', 'H', 'records', 0),
+    ('country_length', 'H', 'records', 0),
+    ('field_length', 'H', 'fields', 0),
+    ('prefix_length', 'H', 'prefixes', 0),
+    ('prefix_chars', 'H', 'prefixes', 0),
+    ('field_kind', 'B', 'fields', 0),
+    ('prefix_rank', 'B', 'prefixes', 0),
+)
+# Długość klucza trigramu w bajtach (trzy znaki UTF-8)
+GRAM_KEY_SIZE = 4 * 3
+# Typy NumPy odpowiadające formatom kolumn (little-endian, jak w pliku)
+_NUMPY_TYPES = {'d': '<f8', 'I': '<u4', 'H': '<u2', 'B': 'u1'}
+_COUNTS = ('records', 'fields', 'field_grams', 'padded_grams', 'prefixes', 'grams', 'postings', 'codes', 'strings')
+
+
+# Lotniska zamknięte, które airportfinder wciąż zwraca - pomijane w rekordach i na liście kodów
+CLOSED_AIRPORTS = frozenset({'TXL', 'SXF', 'THF'})
+
+# Lotniska otwarte po ostatniej aktualizacji airportfinder:
+# kod IATA -> (nazwa, miasto, kraj, liczba bezpośrednich połączeń, liczba przewoźników)
+MISSING_AIRPORTS: Dict[str, Tuple[str, str, str, int, int]] = {
+    'BER': ('Berlin Brandenburg Airport', 'Berlin', 'Germany', 150, 70),
+    'PKX': ('Beijing Daxing International Airport', 'Beijing', 'China', 100, 40),
+    'WMI': ('Warsaw Modlin Airport', 'Warsaw', 'Poland', 40, 2),
+    'RDO': ('Warsaw Radom Airport', 'Radom', 'Poland', 5, 2),
+}
+
+
+def _gram_key(gram: str) -> bytes:
+    """
+    Trigram jako klucz stałej długości (UTF-8 dopełniony bajtami zerowymi)
+    """
+    return gram.encode('utf-8').ljust(GRAM_KEY_SIZE, b'\0')
+
+
+def _find_keys(keys: np.ndarray, grams: Iterable[str]) -> np.ndarray:
+    """
+    Pozycje trigramów w posortowanej tablicy kluczy stałej długości (trigramy spoza tablicy są pomijane)
+    """
+    wanted = np.array([gram.encode('utf-8') for gram in grams], dtype=keys.dtype)
+    if not len(wanted) or not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    positions = np.searchsorted(keys, wanted)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == wanted[found]
+    return positions[found]
+
+
+def default_snapshot_path() -> str:
+    """
+    Ścieżka snapshotu: AIRPORT_SNAPSHOT_PATH lub DATA_DIR/airports.snapshot
+    """
+    return os.getenv(
+        'AIRPORT_SNAPSHOT_PATH',
+        os.path.join(os.getenv('DATA_DIR', './data'), 'airports.snapshot')
+    )
+
+
+def _load_source_data() -> Tuple[List[Dict], List[str]]:
+    """
+    Ładuje dane źródłowe: lotniska z airportfinder (bez zamkniętych, uzupełnione o MISSING_AIRPORTS)
+    oraz pełną listę kodów IATA (airportfinder + airports-py, jeśli dostępne)
+    """
+    from airportfinder.airportfinder import Airports
+    from logic.airport_index import _importance
+
+    sources = dict(Airports().airports_iata)
+    for code, (name, city, country, direct_flights, carriers) in MISSING_AIRPORTS.items():
+        sources.setdefault(code, {
+            'name': name, 'city': city, 'country': country,
+            'direct_flights': direct_flights, 'carriers': carriers,
+        })
+
+    airports = []
+    for code, info in sorted(sources.items()):
+        if not code or len(code) != 3 or code.upper() in CLOSED_AIRPORTS:
+            continue
+        airports.append({
+            'code': code.upper(),
+            'name': info.get('name', '') or '',
+            'city': info.get('city', '') or '',
+            'country': info.get('country', '') or '',
+            'importance': _importance(info),
+        })
+
+    codes = {airport['code'] for airport in airports}
+    try:
+        from airports import airport_data
+        codes.update(
+            airport['iata'].upper() for airport in airport_data.airports
+            if isinstance(airport.get('iata'), str) and len(airport['iata']) == 3 and airport['iata'].isalpha()
+        )
+    except ImportError:
+        print("Ostrzeżenie: airports-py nie jest dostępne, lista kodów IATA tylko z airportfinder")
+
+    return airports, sorted(codes - CLOSED_AIRPORTS)
+
+
+def _dataset_version(airports: List[Dict], codes: List[str], aliases: Dict[str, List[str]]) -> bytes:
+    """
+    Wersja zbioru danych - skrót z kanonicznej postaci danych źródłowych i aliasów miast
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(airports, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    digest.update(''.join(codes).encode('ascii'))
+    digest.update(json.dumps(aliases, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.digest()[:16]
+
+
+def build_snapshot_bytes() -> Tuple[bytes, str]:
+    """
+    Buduje zawartość snapshotu z danych źródłowych
+
+    Returns:
+        (zawartość pliku, wersja zbioru danych w hex)
+    """
+    from logic.airport_aliases import build_airport_aliases
+    from logic.airport_index import build_search_tables
+
+    airports, codes = _load_source_data()
+    aliases = build_airport_aliases()
+    version = _dataset_version(airports, codes, aliases)
+    tables = build_search_tables(airports, aliases)
+
+    strings = bytearray()
+    string_ids: Dict[str, Tuple[int, int]] = {}
+
+    def intern(text: str) -> Tuple[int, int]:
+        if text not in string_ids:
+            encoded = text.encode('utf-8')[:0xFFFF]
+            string_ids[text] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_ids[text]
+
+    columns: Dict[str, list] = {name: [] for name, *_ in _SECTIONS}
+    records = tables['records']
+    for record_id, record in enumerate(records):
+        columns['importance'].append(record['importance'])
+        for field in _STRING_FIELDS:
+            offset, length = intern(record[field])
+            columns[f'{field}_offset'].append(offset)
+            columns[f'{field}_length'].append(length)
+        columns['field_start'].append(len(columns['field_kind']))
+        for kind, text, gram_ids in tables['fields'][record_id]:
+            offset, length = intern(text)
+            columns['field_kind'].append(FIELD_KINDS.index(kind))
+            columns['field_offset'].append(offset)
+            columns['field_length'].append(length)
+            columns['field_gram_start'].append(len(columns['field_grams']))
+            columns['field_grams'].extend(gram_ids)
+    columns['field_start'].append(len(columns['field_kind']))
+    columns['field_gram_start'].append(len(columns['field_grams']))
+
+    for key, rank, record_id in tables['prefixes']:
+        offset, length = intern(key)
+        columns['prefix_offset'].append(offset)
+        columns['prefix_length'].append(length)
+        columns['prefix_chars'].append(min(len(key), 0xFFFF))
+        columns['prefix_rank'].append(rank)
+        columns['prefix_record'].append(record_id)
+
+    for gram, ids in tables['ngrams']:
+        columns['gram_start'].append(len(columns['postings']))
+        columns['postings'].extend(ids)
+    columns['gram_start'].append(len(columns['postings']))
+
+    counts = {
+        'records': len(records),
+        'fields': len(columns['field_kind']),
+        'field_grams': len(columns['field_grams']),
+        'padded_grams': len(tables['padded_grams']),
+        'prefixes': len(tables['prefixes']),
+        'grams': len(tables['ngrams']),
+        'postings': len(columns['postings']),
+        'codes': len(codes),
+        'strings': len(strings),
+    }
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, version, *(counts[name] for name in _COUNTS))
+    parts = [header.ljust(_HEADER_SIZE, b'\0')]
+    for name, item_format, _, _ in _SECTIONS:
+        parts.append(struct.pack(f'<{len(columns[name])}{item_format}', *columns[name]))
+    parts.append(b''.join(record['code'].encode('ascii') for record in records))
+    parts.append(b''.join(code.encode('ascii') for code in codes))
+    parts.append(b''.join(_gram_key(gram) for gram in tables['padded_grams']))
+    parts.append(b''.join(_gram_key(gram) for gram, _ in tables['ngrams']))
+    parts.append(bytes(strings))
+    return b''.join(parts), version.hex()
+
+
+def build_snapshot(output_path: Optional[str] = None) -> str:
+    """
+    Buduje snapshot i zapisuje go atomowo (plik tymczasowy + os.replace)
+
+    Returns:
+        Wersja zbioru danych (hex)
+    """
+    output_path = output_path or default_snapshot_path()
+    content, version = build_snapshot_bytes()
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, output_path)
+
+    return version
+
+
+class AirportSnapshot:
+    """
+    Snapshot danych lotnisk mapowany w pamięci (tylko do odczytu).
+    Kolumny są czytane bezpośrednio z mapowanych stron przez memoryview.cast - rekordy, pola rankingu,
+    klucze prefiksów i listy trigramów nie są kopiowane do pamięci procesu.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self.file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map(self._mmap)
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> 'AirportSnapshot':
+        """
+        Snapshot z zawartości w pamięci (gdy pliku nie da się zapisać)
+        """
+        snapshot = cls.__new__(cls)
+        snapshot.path = None
+        snapshot.file_id = None
+        snapshot._mmap = None
+        snapshot._map(content)
+        return snapshot
+
+    def _map(self, buffer) -> None:
+        magic, format_version, version, *counts = _HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Plik {self.path} nie jest snapshotem lotnisk")
+        if format_version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Nieobsługiwana wersja formatu snapshotu: {format_version}")
+
+        self.dataset_version = version.hex()
+        counts = dict(zip(_COUNTS, counts))
+        self._count = counts['records']
+        view = memoryview(buffer)
+
+        position = _HEADER_SIZE
+        self._columns = {}
+        for name, item_format, count_name, extra in _SECTIONS:
+            size = struct.calcsize(item_format) * (counts[count_name] + extra)
+            self._columns[name] = view[position:position + size].cast(item_format)
+            position += size
+        self._codes = view[position:position + 3 * self._count]
+        position += 3 * self._count
+        self._valid_codes = view[position:position + 3 * counts['codes']]
+        position += 3 * counts['codes']
+        # Trigramy jako posortowane klucze stałej długości - wyszukiwane przez np.searchsorted, bez kopiowania
+        self._padded_keys = np.frombuffer(view[position:position + GRAM_KEY_SIZE * counts['padded_grams']],
+                                          dtype=f'S{GRAM_KEY_SIZE}')
+        position += GRAM_KEY_SIZE * counts['padded_grams']
+        self._gram_keys = np.frombuffer(view[position:position + GRAM_KEY_SIZE * counts['grams']],
+                                        dtype=f'S{GRAM_KEY_SIZE}')
+        position += GRAM_KEY_SIZE * counts['grams']
+        # Napisy czytane wycinkami bezpośrednio z bufora (mmap zwraca bytes bez pośredniego memoryview)
+        self._buffer = buffer
+        self._strings_start = position
+        if position + counts['strings'] > len(view):
+            raise ValueError(f"Snapshot {self.path} jest niekompletny")
+
+        columns = self._columns
+        self._importance = columns['importance']
+        self._field_start = columns['field_start']
+        self._field_kind = columns['field_kind']
+        self._prefix_rank = columns['prefix_rank']
+        self._prefix_record = columns['prefix_record']
+        self._gram_start = columns['gram_start']
+        self._postings = columns['postings']
+        self._prefix_count = counts['prefixes']
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _bytes(self, offset: int, length: int) -> bytes:
+        start = self._strings_start + offset
+        return self._buffer[start:start + length]
+
+    def _string(self, field: str, record_id: int) -> str:
+        return self._bytes(self._columns[f'{field}_offset'][record_id],
+                           self._columns[f'{field}_length'][record_id]).decode('utf-8')
+
+    def code(self, record_id: int) -> str:
+        return bytes(self._codes[3 * record_id:3 * record_id + 3]).decode('ascii')
+
+    def find_code(self, code: str) -> Optional[int]:
+        """
+        Numer rekordu lotniska o podanym kodzie IATA (wyszukiwanie binarne w kolumnie kodów)
+        """
+        if len(code) != 3 or not code.isascii():
+            return None
+        encoded = code.encode('ascii')
+        position = bisect_left(range(self._count), encoded,
+                               key=lambda record_id: bytes(self._codes[3 * record_id:3 * record_id + 3]))
+        if position < self._count and self._codes[3 * position:3 * position + 3] == encoded:
+            return position
+        return None
+
+    def record(self, record_id: int) -> Dict:
+        """
+        Lotnisko w formacie API (code, name, city, country)
+        """
+        return {
+            'code': self.code(record_id),
+            'name': self._string('name', record_id),
+            'city': self._string('city', record_id),
+            'country': self._string('country', record_id),
+        }
+
+    def importance(self, record_id: int) -> float:
+        """
+        Ważność lotniska znormalizowana do 0.0 - 1.0
+        """
+        return self._importance[record_id]
+
+    def fields(self, record_id: int) -> Iterator[Tuple[str, str, Sequence[int]]]:
+        """
+        Pola rankingu rekordu jako (rodzaj pola, znormalizowany tekst, numery trigramów z dopełnieniem)
+        """
+        columns, buffer, base = self._columns, self._buffer, self._strings_start
+        offsets, lengths = columns['field_offset'], columns['field_length']
+        gram_start, grams, kinds = columns['field_gram_start'], columns['field_grams'], self._field_kind
+        for position in range(self._field_start[record_id], self._field_start[record_id + 1]):
+            start = base + offsets[position]
+            yield FIELD_KINDS[kinds[position]], buffer[start:start + lengths[position]].decode('utf-8'), \
+                grams[gram_start[position]:gram_start[position + 1]]
+
+    def padded_gram_ids(self, grams: Iterable[str]) -> frozenset:
+        """
+        Numery trigramów z dopełnieniem w słowniku snapshotu (trigramy spoza słownika są pomijane)
+        """
+        return frozenset(_find_keys(self._padded_keys, grams).tolist())
+
+    def _prefix_key(self, position: int) -> bytes:
+        return self._bytes(self._columns['prefix_offset'][position], self._columns['prefix_length'][position])
+
+    def _prefix_bounds(self, prefix: str) -> Tuple[int, int]:
+        """
+        Zakres pozycji kluczy zaczynających się od prefiksu. Klucze są posortowane bajtowo (UTF-8 zachowuje
+        kolejność znaków), więc oba końce wyznacza wyszukiwanie binarne.
+        """
+        encoded = prefix.encode('utf-8')
+        start = bisect_left(range(self._prefix_count), encoded, key=self._prefix_key)
+        end = bisect_right(range(self._prefix_count), encoded, lo=start,
+                           key=lambda position: self._prefix_key(position)[:len(encoded)])
+        return start, end
+
+    def prefix_range(self, prefix: str) -> List[Tuple[int, int]]:
+        """
+        (numer rekordu, ranga pola) dla wszystkich kluczy zaczynających się od prefiksu
+        """
+        start, end = self._prefix_bounds(prefix)
+        return list(zip(self._prefix_record[start:end], self._prefix_rank[start:end]))
+
+    def prefix_columns(self, prefix: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Jak prefix_range, ale jako tablice NumPy (widoki na mapowane kolumny, bez kopiowania):
+        numery rekordów, rangi pól i długości kluczy w znakach
+        """
+        start, end = self._prefix_bounds(prefix)
+        return self.array('prefix_record')[start:end], self.array('prefix_rank')[start:end], \
+            self.array('prefix_chars')[start:end]
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Kolumna snapshotu jako tablica NumPy - widok na mapowane strony (bez kopiowania)
+        """
+        arrays = self._arrays
+        if name not in arrays:
+            arrays[name] = np.frombuffer(self._columns[name], dtype=_NUMPY_TYPES[self._columns[name].format])
+        return arrays[name]
+
+    def field_text(self, position: int) -> str:
+        """
+        Znormalizowany tekst pola rankingu o podanej pozycji w kolumnach pól
+        """
+        return self._bytes(self._columns['field_offset'][position],
+                           self._columns['field_length'][position]).decode('utf-8')
+
+    def postings(self, gram: str) -> Sequence[int]:
+        """
+        Rosnące numery rekordów, w których tekstach wyszukiwania występuje trigram (widok na mapowaną tablicę)
+        """
+        found = _find_keys(self._gram_keys, (gram,))
+        if not len(found):
+            return ()
+        position = int(found[0])
+        return self._postings[self._gram_start[position]:self._gram_start[position + 1]]
+
+    def iter_valid_codes(self) -> Iterator[str]:
+        """
+        Iteruje po wszystkich poprawnych kodach IATA zapisanych w snapshocie (posortowanych)
+        """
+        raw = bytes(self._valid_codes).decode('ascii')
+        for position in range(0, len(raw), 3):
+            yield raw[position:position + 3]
+
+
+def load_snapshot(path: Optional[str] = None, build_if_missing: bool = True) -> Optional[AirportSnapshot]:
+    """
+    Otwiera snapshot; jeśli nie istnieje lub jest uszkodzony, próbuje go zbudować.
+    Zwraca None, gdy snapshotu nie da się ani otworzyć, ani zbudować.
+    """
+    path = path or default_snapshot_path()
+    try:
+        return AirportSnapshot(path)
+    except (FileNotFoundError, ValueError, struct.error) as e:
+        if not build_if_missing:
+            print(f"❌ Nie można otworzyć snapshotu lotnisk {path}: {e}")
+            return None
+
+    try:
+        version = build_snapshot(path)
+        print(f"✅ Zbudowano snapshot lotnisk {path} (wersja {version})")
+        return AirportSnapshot(path)
+    except Exception as e:
+        print(f"❌ Nie udało się zbudować snapshotu lotnisk {path}: {e}")
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Snapshot danych lotnisk")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Zbuduj snapshot z danych airportfinder/airports-py")
+    build_parser.add_argument('--output', default=None, help="Ścieżka pliku snapshotu")
+    info_parser = subparsers.add_parser('info', help="Pokaż informacje o snapshocie")
+    info_parser.add_argument('--path', default=None, help="Ścieżka pliku snapshotu")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        output = args.output or default_snapshot_path()
+        version = build_snapshot(output)
+        print(f"Zapisano snapshot {output} (wersja danych {version})")
+        return 0
+
+    snapshot = AirportSnapshot(args.path or default_snapshot_path())
+    print(f"Plik: {snapshot.path}")
+    print(f"Wersja danych: {snapshot.dataset_version}")
+    print(f"Lotniska: {len(snapshot)}")
+    print(f"Klucze prefiksów: {snapshot._prefix_count}, trigramy: {len(snapshot._gram_keys)}")
+    print(f"Poprawne kody IATA: {sum(1 for _ in snapshot.iter_valid_codes())}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,50 @@
 import os
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from dotenv import load_dotenv
-from serpapi import GoogleSearch
 from pathlib import Path
+from typing import Optional
 from services.schemas import FlightSearchParams
-PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-JSON_FILE_PATH = os.path.join(PROJECT_ROOT, 'flights_dates.json')
+from services.response_cache import FRESH, ResponseCache
+from logic.fetch_engine import SerpApiFetchEngine
+from logic.resilience import get_serpapi_web_policy
+from logic.response_archive import ResponseArchive
+from logic.serpapi_replay import ReplaySource
+from services.quota_ledger import QuotaLedger
+from logic.flight_extract import extract
 
 class DataGrabber:
+    # Jeden wątek zapisu na proces: archiwizacja nie blokuje pobierania, a zapisy nie nachodzą na siebie
+    _archive_executor = None
+    _archive_lock = threading.Lock()
+
     def __init__(self):
         load_dotenv()
+        # live - SerpAPI (lub SERPAPI_BASE_URL), replay - odpowiedzi generowane lokalnie, bez sieci
+        self.mode = os.getenv('SERPAPI_MODE', 'live').lower()
+        self.replay = ReplaySource.from_env() if self.mode == 'replay' else None
+        self.base_url = os.getenv('SERPAPI_BASE_URL')
         self.api_key = os.getenv("SERP_API")
-        if not self.api_key:
+        if not self.api_key and self.replay is None:
             raise ValueError("Brak klucza API SERP_API w zmiennych środowiskowych")
 
         data_dir = Path(os.getenv('DATA_DIR', './data'))
         data_dir.mkdir(parents=True, exist_ok=True)
-        self.json_file_path = data_dir / 'flights_dates.json'
+        self.archive_enabled = os.getenv('SERPAPI_ARCHIVE_RESPONSES', '0') == '1'
+        self.archive = ResponseArchive()
+        self.quota_ledger = QuotaLedger()
+        # Wygenerowane odpowiedzi nie mogą trafić do współdzielonego cache'u w bazie
+        self.response_cache = ResponseCache(enabled=False) if self.replay else ResponseCache()
+        self.fetch_engine = SerpApiFetchEngine(
+            base_url=self.base_url,
+            concurrency=int(os.getenv('SERPAPI_CONCURRENCY', '4')),
+            rate_per_minute=float(os.getenv('SERPAPI_RATE_PER_MINUTE', '60')),
+            # Limit liczony per faktycznie wysłane zapytanie: ponowienia się liczą, odrzucenia przez bezpiecznik nie
+            on_attempt=lambda: self.quota_ledger.record_calls(1),
+        )
 
-    def api_connector(self, flight_params: FlightSearchParams):
+    def build_params(self, flight_params: FlightSearchParams) -> dict:
         params = {
             "engine": "google_flights",
             "departure_id": flight_params.departure_airport,
@@ -30,20 +56,148 @@ class DataGrabber:
             "travel_class": flight_params.seat_class,
             "api_key": self.api_key,
         }
+        if flight_params.return_date is None:
+            # Lot w jedną stronę (type=2) - bez daty powrotu
+            del params["return_date"]
+            params["type"] = "2"
+        return params
+
+    def api_connector(self, flight_params: FlightSearchParams):
+        params = self.build_params(flight_params)
+
+        if self.replay:
+            return self.replay.respond(params)[1]
+
+        # Identyczne wyszukiwanie (trasa, daty, klasa, waluta) w okresie TTL nie zużywa limitu SerpAPI
+        return self.response_cache.get_or_fetch(params, lambda: self._search(params))
+
+    def _search(self, params: dict) -> dict:
+        """
+        Zapytanie synchroniczne z bezpiecznikiem wspólnym z silnikiem pobierania workera, ale z krótkim
+        limitem czasu i bez ponowień (get_serpapi_web_policy) - nie blokuje wątku żądania webowego
+        """
+        policy = get_serpapi_web_policy()
+        response = policy.call(
+            lambda: self._request(params, policy.timeout),
+            lambda: {"error": "SerpAPI chwilowo niedostępne (bezpiecznik otwarty), spróbuj ponownie później"},
+        )
+        self._archive_fetched(params, response)
+        return response
+
+    def _request(self, params: dict, timeout: float):
+        # SERPAPI_BASE_URL pozwala użyć adresu zgodnego z SerpAPI (np. python -m logic.serpapi_replay serve)
+        self.fetch_engine.record_attempt()
+        try:
+            response = requests.get(self.fetch_engine.base_url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            return None, {"error": f"Błąd połączenia z SerpAPI: {e!r}"}
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return response.status_code, {"error": f"Nieprawidłowa odpowiedź HTTP {response.status_code}"}
+        if response.status_code >= 400 and "error" not in data:
+            data["error"] = f"HTTP {response.status_code}"
+        return response.status_code, data
+
+    def fetch_many(self, search_requests, compact: bool = False):
+        """
+        Pobiera wyniki dla wielu wyszukiwań naraz.
+
+        Aktualne odpowiedzi są zwracane od razu z cache'u, pozostałe pobierane równolegle
+        przez SerpApiFetchEngine (pula połączeń, limit równoległości i częstotliwości).
+
+        Args:
+            search_requests: pary (znacznik, FlightSearchParams)
+            compact: zwracaj CompactFlightResponse (tylko pola potrzebne do sprawdzania lotów).
+                Pobrana odpowiedź jest parsowana strumieniowo, bez budowania pełnego słownika;
+                gdy ma trafić do cache'u lub archiwum, zapisywane są jej surowe bajty, od razu
+                potem zwalniane. Do archiwum trafiają tylko odpowiedzi faktycznie pobrane z API.
+
+        Yields:
+            (znacznik, odpowiedź) w kolejności ukończenia
+        """
+        if self.replay:
+            for tag, flight_params in search_requests:
+                params = self.build_params(flight_params)
+                response = self.replay.respond(params)[1]
+                yield tag, extract(response) if compact else response
+            return
+
+        to_fetch = []
+        for tag, flight_params in search_requests:
+            params = self.build_params(flight_params)
+            if self.response_cache.active:
+                try:
+                    response, state = self.response_cache.get(params)
+                except Exception as e:
+                    print(f"Błąd odczytu cache'u odpowiedzi SerpAPI: {e}")
+                    response, state = None, None
+                if state == FRESH:
+                    yield tag, extract(response) if compact else response
+                    continue
+            to_fetch.append(((tag, params), params))
+
+        keep_raw = compact and (self.response_cache.active or self.archive_enabled)
+        for (tag, params), response in self.fetch_engine.iter_fetch_many(to_fetch, compact=compact,
+                                                                         keep_raw=keep_raw):
+            if compact:
+                raw, response.raw = response.raw, None
+                if raw is not None and response.error is None:
+                    if self.response_cache.active:
+                        self.response_cache.store(params, raw)
+                    self._archive_fetched_raw(params, raw, response.min_price)
+                yield tag, response
+                continue
+            if self.response_cache.active:
+                self.response_cache.store(params, response)
+            self._archive_fetched(params, response)
+            yield tag, extract(response) if compact else response
 
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        return results
-    
     def pobierz_dane(self, response):
+        """
+        Sprawdza odpowiedź pod kątem błędu API i zwraca ją do dalszego przetwarzania w pamięci
+        """
         data = response
         if "error" in data:
             print("!!! Otrzymano błąd z API SerpApi !!!")
             print(data["error"])
+        return data
+
+    def _archive_fetched(self, params: dict, response: dict) -> None:
+        """
+        Dopisuje do archiwum (SERPAPI_ARCHIVE_RESPONSES=1) odpowiedź faktycznie pobraną z API,
+        asynchronicznie w tle. Trafienia w cache, odpowiedzi z błędem i odpowiedzi
+        generowane w trybie replay nie są archiwizowane.
+        """
+        if not self.archive_enabled or self.replay or "error" in response:
+            return
+        self._executor().submit(self._archive, params, response)
+
+    def _archive_fetched_raw(self, params: dict, raw: bytes, lowest_price: Optional[float]) -> None:
+        """
+        Jak _archive_fetched, dla surowych bajtów odpowiedzi bez błędu (tryb kompaktowy)
+        """
+        if not self.archive_enabled or self.replay:
+            return
+        self._executor().submit(self._archive_raw, params, raw, lowest_price)
+
+    @classmethod
+    def _executor(cls) -> ThreadPoolExecutor:
+        with cls._archive_lock:
+            if cls._archive_executor is None:
+                cls._archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serpapi-archive")
+            return cls._archive_executor
+
+    def _archive(self, params: dict, data: dict) -> None:
+        try:
+            self.archive.append(params, data)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"❌ Błąd zapisu archiwum odpowiedzi: {e}")
+
+    def _archive_raw(self, params: dict, raw: bytes, lowest_price: Optional[float]) -> None:
         try:
-            with open(self.json_file_path, "w", encoding="utf-8") as file:
-                json.dump(data, file, indent=4, ensure_ascii=False)
-            print(f"✅ Dane zapisane do '{self.json_file_path}'")
-        except PermissionError as e:
-            print(f"❌ Błąd uprawnień: {e}")
-            return data
\ No newline at end of file
+            self.archive.append_raw(params, raw, lowest_price)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"❌ Błąd zapisu archiwum odpowiedzi: {e}")
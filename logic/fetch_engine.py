@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from logic.flight_extract import CompactFlightResponse, extract, extract_async
+from logic.resilience import ResiliencePolicy, get_serpapi_policy
+
+DEFAULT_SERPAPI_URL = "https://serpapi.com/search.json"
+
+
+class TokenBucket:
+    """
+    Ogranicznik częstotliwości zapytań (token bucket): średnio `rate` zapytań na sekundę,
+    chwilowo do `capacity` zapytań naraz
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BlockingTokenBucket(TokenBucket):
+    """
+    TokenBucket dla zwykłych wątków: jeden kubełek współdzielony przez wszystkie wątki daje wspólny limit.
+    acquire() rezerwuje token pod blokadą (saldo może zejść poniżej zera) i czeka już poza nią,
+    więc wątki są obsługiwane w kolejności zgłoszeń
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate, capacity)
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class SerpApiFetchEngine:
+    """
+    Asynchroniczne pobieranie wielu wyników SerpAPI naraz:
+    - jedna sesja HTTP z pulą połączeń i keep-alive
+    - ograniczona liczba równoległych zapytań (concurrency)
+    - limit częstotliwości zgodny z planem SerpAPI (token bucket)
+    - limit czasu zapytania, ponowienia w ramach budżetu i bezpiecznik (ResiliencePolicy)
+
+    Adres API można zmienić (base_url / SERPAPI_BASE_URL), np. na lokalny serwer zastępczy w testach.
+    on_attempt jest wywoływane przed każdym faktycznie wysłanym zapytaniem HTTP (również ponowieniem,
+    ale nie przy otwartym bezpieczniku) - np. do liczenia zużycia limitu SerpAPI.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, concurrency: int = 4,
+                 rate_per_minute: float = 60.0, burst: Optional[int] = None, timeout: Optional[float] = None,
+                 policy: Optional[ResiliencePolicy] = None, on_attempt: Optional[Callable[[], None]] = None):
+        self.base_url = base_url or DEFAULT_SERPAPI_URL
+        self.concurrency = max(1, concurrency)
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst if burst is not None else self.concurrency
+        self.policy = policy or get_serpapi_policy()
+        self.timeout = timeout if timeout is not None else self.policy.timeout
+        self.on_attempt = on_attempt
+
+    def record_attempt(self) -> None:
+        if self.on_attempt is not None:
+            self.on_attempt()
+
+    def _session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    @staticmethod
+    def _error(message: str, compact: bool):
+        return CompactFlightResponse(error=message) if compact else {"error": message}
+
+    async def _request(self, session: aiohttp.ClientSession, params: Dict[str, Any],
+                       compact: bool, keep_raw: bool = False) -> Tuple[Optional[int], Any]:
+        """
+        Pojedyncza próba. Zwraca (status HTTP lub None przy błędzie połączenia, odpowiedź)
+        """
+        try:
+            async with session.get(self.base_url, params=params) as response:
+                if compact:
+                    try:
+                        if keep_raw:
+                            # Surowe bajty do zapisu w cache'u/archiwum; rekord i tak budowany strumieniowo
+                            body = await response.read()
+                            record = extract(body)
+                            record.raw = body
+                        else:
+                            record = await extract_async(response.content)
+                    except ValueError:
+                        return response.status, self._error(f"Nieprawidłowa odpowiedź HTTP {response.status}", True)
+                    if response.status >= 400 and record.error is None:
+                        record.error = f"HTTP {response.status}"
+                    return response.status, record
+
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    return response.status, self._error(f"Nieprawidłowa odpowiedź HTTP {response.status}", False)
+                if response.status >= 400 and "error" not in data:
+                    data["error"] = f"HTTP {response.status}"
+                return response.status, data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return None, self._error(f"Błąd połączenia z SerpAPI: {e!r}", compact)
+
+    async def fetch(self, session: aiohttp.ClientSession, params: Dict[str, Any], compact: bool = False,
+                    bucket: Optional[TokenBucket] = None, semaphore: Optional[asyncio.Semaphore] = None,
+                    keep_raw: bool = False):
+        """
+        Pobiera pojedynczy wynik. Błędy sieciowe i HTTP zwracane są jako {"error": ...},
+        tak jak błędy zgłaszane przez samo SerpAPI. Błędy przejściowe są ponawiane zgodnie z polityką;
+        przy otwartym bezpieczniku zapytanie nie jest wysyłane.
+
+        compact=True zwraca CompactFlightResponse budowany strumieniowo w trakcie pobierania,
+        bez tworzenia pełnego słownika odpowiedzi. keep_raw=True dołącza do rekordu surowe bajty
+        odpowiedzi (CompactFlightResponse.raw), np. do zapisu w cache'u bez ponownej serializacji.
+        """
+        async def attempt():
+            # Semafor jest zajmowany tylko na czas próby - oczekiwanie na ponowienie nie blokuje innych zapytań
+            if semaphore is None:
+                if bucket is not None:
+                    await bucket.acquire()
+                self.record_attempt()
+                return await self._request(session, params, compact, keep_raw)
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                self.record_attempt()
+                return await self._request(session, params, compact, keep_raw)
+
+        return await self.policy.call_async(
+            attempt,
+            lambda: self._error(
+                f"SerpAPI chwilowo niedostępne (bezpiecznik otwarty, ponowienie za "
+                f"{self.policy.breaker.retry_after():.0f} s)", compact),
+        )
+
+    async def fetch_many(self, requests: Iterable[Tuple[Any, Dict[str, Any]]],
+                         compact: bool = False, keep_raw: bool = False) -> AsyncIterator[Tuple[Any, Any]]:
+        """
+        Pobiera wyniki dla wielu zapytań i zwraca je w kolejności ukończenia.
+
+        Args:
+            requests: pary (znacznik, parametry zapytania) - znacznik jest zwracany razem z odpowiedzią
+            compact: zwracaj CompactFlightResponse zamiast pełnych słowników
+            keep_raw: dołączaj do rekordów kompaktowych surowe bajty odpowiedzi
+
+        Yields:
+            (znacznik, odpowiedź)
+        """
+        bucket = TokenBucket(self.rate_per_minute / 60.0, self.burst)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._session() as session:
+            async def run(tag, params):
+                return tag, await self.fetch(session, params, compact, bucket, semaphore, keep_raw)
+
+            tasks = [asyncio.ensure_future(run(tag, params)) for tag, params in requests]
+            try:
+                for completed in asyncio.as_completed(tasks):
+                    yield await completed
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    def iter_fetch_many(self, requests: Iterable[Tuple[Any, Dict[str, Any]]], compact: bool = False,
+                        keep_raw: bool = False):
+        """
+        Synchroniczna wersja fetch_many dla kodu bez pętli zdarzeń (np. worker harmonogramu)
+        """
+        loop = asyncio.new_event_loop()
+        iterator = self.fetch_many(list(requests), compact, keep_raw).__aiter__()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(iterator.aclose())
+            loop.close()
+
+    def fetch_all(self, requests: Iterable[Tuple[Any, Dict[str, Any]]], compact: bool = False) -> List[Tuple[Any, Any]]:
+        return list(self.iter_fetch_many(requests, compact))
@@ -0,0 +1,145 @@
+"""
+Elastyczne okna dat: preferencja z flex_days obejmuje wszystkie kombinacje dat wylotu i powrotu
+w zakresie ±flex_days wokół target_departure i return_date.
+
+Silnik google_flights w SerpAPI nie udostępnia siatki cen kalendarza, a price_insights dotyczy tylko
+wyszukiwanej pary dat - zapytanie w obie strony to ceny jednej kombinacji, czyli do 49 zapytań
+dla okna ±3 dni. Okno jest więc obsługiwane zapytaniami w jedną stronę: jednym na każdy dzień
+wylotu (tam) i każdy dzień powrotu (z powrotem), 2 * (2 * flex_days + 1) zapytań (14 zamiast 49).
+Zapytania o ten sam odcinek (trasa, dzień, waluta, klasa) są współdzielone przez wszystkie okna,
+a między slotami przez cache odpowiedzi.
+
+Cena kombinacji to suma najtańszych pasujących lotów obu kierunków. Macierz
+(preferencje x dni wylotu x dni powrotu) liczona jest jednym przebiegiem NumPy.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from logic.match_engine import FlightMatch, FlightTable, MatchCriteria
+
+MAX_FLEX_DAYS = 3
+
+
+class WindowLeg(NamedTuple):
+    """
+    Lot w jedną stronę na jeden dzień okna
+    """
+    departure_airport: str
+    arrival_airport: str
+    day: date
+    currency: str
+    seat_class: str
+
+
+class FlightWindow(NamedTuple):
+    outbound_days: List[date]
+    return_days: List[date]
+    legs: List[WindowLeg]
+
+    @property
+    def outbound_legs(self) -> List[WindowLeg]:
+        return self.legs[:len(self.outbound_days)]
+
+    @property
+    def inbound_legs(self) -> List[WindowLeg]:
+        return self.legs[len(self.outbound_days):]
+
+
+class WindowMatch(NamedTuple):
+    target_departure: date
+    return_date: date
+    price: float
+    outbound: FlightMatch
+    inbound: FlightMatch
+
+
+class WindowResult(NamedTuple):
+    prices: np.ndarray                       # preferencje x dni wylotu x dni powrotu (NaN - brak kombinacji)
+    matches: List[Optional[WindowMatch]]     # najtańsza kombinacja w granicy max_price
+    cheapest: List[Optional[WindowMatch]]    # najtańsza kombinacja bez limitu ceny
+
+
+def window_days(center: date, flex_days: int, earliest: Optional[date] = None) -> List[date]:
+    """
+    Dni okna ±flex_days wokół daty (bez dni wcześniejszych niż earliest)
+    """
+    flex_days = max(0, min(MAX_FLEX_DAYS, flex_days))
+    days = [center + timedelta(days=offset) for offset in range(-flex_days, flex_days + 1)]
+    return [day for day in days if earliest is None or day >= earliest]
+
+
+def flight_window(departure_airport: str, arrival_airport: str, target_departure: date, return_date: date,
+                  flex_days: int, currency: str, seat_class: str, today: Optional[date] = None) -> FlightWindow:
+    """
+    Dni okna i loty w jedną stronę potrzebne do wyceny wszystkich kombinacji
+    """
+    outbound_days = window_days(target_departure, flex_days, today or date.today())
+    return_days = [day for day in window_days(return_date, flex_days)
+                   if outbound_days and day >= outbound_days[0]]
+    legs = [WindowLeg(departure_airport, arrival_airport, day, currency, seat_class) for day in outbound_days]
+    legs += [WindowLeg(arrival_airport, departure_airport, day, currency, seat_class) for day in return_days]
+    return FlightWindow(outbound_days, return_days, legs)
+
+
+def _leg_prices(legs: Sequence[WindowLeg], tables: Dict[WindowLeg, FlightTable],
+                criteria: Sequence[MatchCriteria]):
+    """
+    Najtańszy pasujący lot (bez limitu ceny - ten dotyczy sumy) dla każdej preferencji i dnia
+    """
+    prices = np.full((len(criteria), len(legs)), np.nan)
+    matches: List[List[Optional[FlightMatch]]] = [[None] * len(legs) for _ in criteria]
+    for column, leg in enumerate(legs):
+        table = tables.get(leg)
+        if table is None:
+            continue
+        leg_criteria = [item._replace(target_departure=leg.day, max_price=None) for item in criteria]
+        for row, match in enumerate(table.best_matches(leg_criteria)):
+            if match is not None and match.price is not None:
+                prices[row, column] = match.price
+                matches[row][column] = match
+    return prices, matches
+
+
+def cheapest_combinations(window: FlightWindow, tables: Dict[WindowLeg, FlightTable],
+                          criteria: Sequence[MatchCriteria]) -> WindowResult:
+    """
+    Macierz cen wszystkich kombinacji okna i najtańsza kombinacja dla każdej preferencji
+
+    Args:
+        tables: tabele lotów w jedną stronę (brak odcinka - kombinacje z nim bez ceny)
+        criteria: kryteria preferencji (linia i przesiadki dotyczą obu kierunków, max_price - sumy)
+    """
+    outbound_prices, outbound_matches = _leg_prices(window.outbound_legs, tables, criteria)
+    inbound_prices, inbound_matches = _leg_prices(window.inbound_legs, tables, criteria)
+
+    outbound_day = np.array(window.outbound_days, dtype='datetime64[D]')
+    return_day = np.array(window.return_days, dtype='datetime64[D]')
+    valid = return_day[None, :] >= outbound_day[:, None]
+    prices = np.where(valid[None, :, :], outbound_prices[:, :, None] + inbound_prices[:, None, :], np.nan)
+
+    max_price = np.array([item.max_price if item.max_price is not None else np.inf for item in criteria],
+                         dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        within = np.where(prices <= max_price[:, None, None], prices, np.nan)
+
+    def pick(matrix: np.ndarray) -> List[Optional[WindowMatch]]:
+        if not matrix.size:
+            return [None] * len(criteria)
+        flat = np.where(np.isnan(matrix), np.inf, matrix).reshape(len(criteria), -1)
+        best = flat.argmin(axis=1)
+        found = np.isfinite(flat[np.arange(len(criteria)), best])
+        picked: List[Optional[WindowMatch]] = []
+        for row, (ok, index) in enumerate(zip(found.tolist(), best.tolist())):
+            if not ok:
+                picked.append(None)
+                continue
+            out_index, in_index = divmod(index, len(window.return_days))
+            picked.append(WindowMatch(
+                window.outbound_days[out_index], window.return_days[in_index], float(flat[row, index]),
+                outbound_matches[row][out_index], inbound_matches[row][in_index],
+            ))
+        return picked
+
+    return WindowResult(prices, pick(within), pick(prices))
@@ -1,45 +1,48 @@
-import json
-import os
+from typing import Iterable, List, Optional, Union
+
+from logic.flight_extract import CompactFlightResponse, extract
+from logic.match_engine import FlightMatch, FlightTable, MatchCriteria
 
-PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-JSON_FILE_PATH = os.path.join(PROJECT_ROOT, 'flights_dates.json')
 
 class FlightChecker:
-    
-    def sprawdzanie_lotow(self, target_departure: str) -> bool:
-        try:
-            with open(JSON_FILE_PATH, "r", encoding="utf-8") as file:
-                loty_data = json.load(file)
-        except FileNotFoundError:
-            print(f"Błąd: Plik {JSON_FILE_PATH} nie został znaleziony.")
+    """
+    Sprawdzanie wyników wyszukiwania lotów. Metody przyjmują kompaktowy rekord odpowiedzi
+    (CompactFlightResponse) lub słownik odpowiedzi SerpAPI, z którego odczytywane są tylko potrzebne pola.
+    """
+
+    def sprawdzanie_lotow(self, loty_data: Union[CompactFlightResponse, dict, None], target_departure: str) -> bool:
+        if not loty_data:
+            print("Błąd: Brak danych odpowiedzi API.")
             return False
-        except json.JSONDecodeError:
-            print(f"Błąd: Plik {JSON_FILE_PATH} jest pusty lub uszkodzony.")
+
+        loty = extract(loty_data)
+        if not loty.options:
+            print("Informacja: Brak sekcji 'best_flights' oraz 'other_flights' w odpowiedzi API.")
             return False
 
-        all_flights_groups = loty_data.get("best_flights", []) + loty_data.get("other_flights", [])
+        return FlightTable(loty).best_matches([MatchCriteria(target_departure)])[0] is not None
 
-        if not all_flights_groups:
+    def dopasuj_preferencje(self, loty_data: Union[FlightTable, CompactFlightResponse, dict, None],
+                            preferences: Iterable) -> List[Optional[FlightMatch]]:
+        """
+        Dopasowuje wszystkie preferencje do jednej odpowiedzi (data wylotu, max_price,
+        preferred_airline) i zwraca najtańszy pasujący lot dla każdej z nich
+        """
+        preferences = list(preferences)
+        if isinstance(loty_data, FlightTable):
+            return loty_data.best_matches([MatchCriteria.from_preference(preference) for preference in preferences])
+        if not loty_data:
+            return [None] * len(preferences)
+
+        loty = extract(loty_data)
+        if not loty.options:
             print("Informacja: Brak sekcji 'best_flights' oraz 'other_flights' w odpowiedzi API.")
-            return False
+            return [None] * len(preferences)
+
+        return FlightTable(loty).best_matches([MatchCriteria.from_preference(preference) for preference in preferences])
 
-        for flight_group in all_flights_groups:
-            for lot in flight_group.get("flights", []):
-                departure_time = lot.get("departure_airport", {}).get("time", "")
-                if departure_time:
-                    departure_date = departure_time.split(" ")[0]
-                    if departure_date == target_departure:
-                        return True
-
-        return False
-    
-    def info_extractor(self) -> str:
-        try:
-            with open(JSON_FILE_PATH, "r", encoding="utf-8") as file:
-                loty_data = json.load(file)
-        except FileNotFoundError:
-            print(f"Błąd: Plik {JSON_FILE_PATH} nie został znaleziony.")
+    def info_extractor(self, loty_data: Union[CompactFlightResponse, dict, None]) -> str:
+        if not loty_data:
             return ""
 
-        link = loty_data.get("search_metadata", []).get("google_flights_url", {})
-        return link
+        return extract(loty_data).google_flights_url
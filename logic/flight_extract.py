@@ -0,0 +1,252 @@
+"""
+Kompaktowa postać odpowiedzi SerpAPI (google_flights) - tylko pola potrzebne do sprawdzania lotów
+i powiadomień: odcinki lotów (lotniska, godziny, linia, numer lotu), cena, link do Google Flights.
+
+Z surowego JSON-a (bajty, tekst, strumień) rekord jest budowany strumieniowo przez ijson -
+pozostała część dokumentu (metadane, lotniska ze zdjęciami, emisje CO2, price_insights) jest
+pomijana bez tworzenia obiektów. Bez ijson dokument jest parsowany w całości przez json.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import json
+
+try:
+    import ijson
+    _JSON_ERRORS = (ValueError, ijson.JSONError)
+except ImportError:
+    ijson = None
+    _JSON_ERRORS = (ValueError,)
+
+_GROUPS = ('best_flights', 'other_flights')
+_PREFIXES = _GROUPS + ('search_metadata', 'error')
+_LEG_FIELDS = {
+    'departure_airport.id': 'departure_id',
+    'departure_airport.time': 'departure_time',
+    'arrival_airport.id': 'arrival_id',
+    'arrival_airport.time': 'arrival_time',
+    'airline': 'airline',
+    'flight_number': 'flight_number',
+    'duration': 'duration',
+}
+
+
+class FlightLeg(NamedTuple):
+    departure_id: str
+    departure_time: str
+    arrival_id: str
+    arrival_time: str
+    airline: str
+    flight_number: str
+    duration: Optional[int]
+
+    @property
+    def departure_date(self) -> str:
+        return self.departure_time.split(" ")[0]
+
+
+class FlightOption(NamedTuple):
+    price: Optional[float]
+    total_duration: Optional[int]
+    legs: Tuple[FlightLeg, ...]
+
+    @property
+    def airline(self) -> str:
+        return self.legs[0].airline if self.legs else ""
+
+    @property
+    def stops(self) -> int:
+        return max(0, len(self.legs) - 1)
+
+
+class CompactFlightResponse:
+    """
+    Wynik wyszukiwania ograniczony do pól używanych przez FlightChecker i szablon e-maila.
+    raw to surowa treść odpowiedzi, gdy pobierający ma ją zapisać (cache, archiwum) - po zapisie
+    jest zwalniana.
+    """
+    __slots__ = ('options', 'google_flights_url', 'status', 'error', 'raw')
+
+    def __init__(self, options: Tuple[FlightOption, ...] = (), google_flights_url: str = "",
+                 status: Optional[str] = None, error: Optional[str] = None, raw: Optional[bytes] = None):
+        self.options = options
+        self.google_flights_url = google_flights_url
+        self.status = status
+        self.error = error
+        self.raw = raw
+
+    @property
+    def answered(self) -> bool:
+        """
+        Czy SerpAPI obsłużyło wyszukiwanie (także z pustym wynikiem), a nie np. błąd połączenia
+        """
+        return self.status is not None
+
+    @property
+    def min_price(self) -> Optional[float]:
+        prices = [option.price for option in self.options if option.price is not None]
+        return min(prices) if prices else None
+
+    def has_departure_on(self, target_departure: str) -> bool:
+        return any(leg.departure_time and leg.departure_date == target_departure
+                   for option in self.options for leg in option.legs)
+
+    def __repr__(self) -> str:
+        return (f"CompactFlightResponse(options={len(self.options)}, min_price={self.min_price}, "
+                f"status={self.status!r}, error={self.error!r})")
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _leg(values: Dict[str, Any]) -> FlightLeg:
+    duration = _number(values.get('duration'))
+    return FlightLeg(
+        departure_id=values.get('departure_id') or "",
+        departure_time=values.get('departure_time') or "",
+        arrival_id=values.get('arrival_id') or "",
+        arrival_time=values.get('arrival_time') or "",
+        airline=values.get('airline') or "",
+        flight_number=values.get('flight_number') or "",
+        duration=int(duration) if duration is not None else None,
+    )
+
+
+def from_dict(response: Dict[str, Any]) -> CompactFlightResponse:
+    """
+    Kompaktowy rekord z już sparsowanej odpowiedzi (odczyt tylko potrzebnych kluczy)
+    """
+    options: List[FlightOption] = []
+    for group_name in _GROUPS:
+        for group in response.get(group_name) or []:
+            legs = tuple(
+                _leg({
+                    'departure_id': (flight.get('departure_airport') or {}).get('id'),
+                    'departure_time': (flight.get('departure_airport') or {}).get('time'),
+                    'arrival_id': (flight.get('arrival_airport') or {}).get('id'),
+                    'arrival_time': (flight.get('arrival_airport') or {}).get('time'),
+                    'airline': flight.get('airline'),
+                    'flight_number': flight.get('flight_number'),
+                    'duration': flight.get('duration'),
+                })
+                for flight in group.get('flights') or []
+            )
+            total_duration = _number(group.get('total_duration'))
+            options.append(FlightOption(_number(group.get('price')),
+                                        int(total_duration) if total_duration is not None else None, legs))
+
+    metadata = response.get('search_metadata') or {}
+    return CompactFlightResponse(
+        options=tuple(options),
+        google_flights_url=metadata.get('google_flights_url') or "",
+        status=(metadata.get('status') or "") if metadata else None,
+        error=response.get('error'),
+    )
+
+
+class _StreamBuilder:
+    """
+    Buduje rekord ze zdarzeń ijson.parse, ignorując wszystkie nieużywane gałęzie dokumentu
+    """
+
+    def __init__(self):
+        self.options: List[FlightOption] = []
+        self.google_flights_url = ""
+        self.status = None
+        self.error = None
+        self._option: Optional[Dict[str, Any]] = None
+        self._legs: List[FlightLeg] = []
+        self._leg: Optional[Dict[str, Any]] = None
+
+    def feed(self, prefix: str, event: str, value: Any) -> None:
+        # Szybkie odrzucenie zdarzeń z nieużywanych gałęzi (airports, price_insights, ...)
+        if not prefix.startswith(_PREFIXES):
+            return
+        if prefix == 'error' and event == 'string':
+            self.error = value
+            return
+        if prefix.startswith('search_metadata'):
+            if prefix == 'search_metadata' and event == 'start_map' and self.status is None:
+                self.status = ""
+            elif prefix == 'search_metadata.status':
+                self.status = value
+            elif prefix == 'search_metadata.google_flights_url':
+                self.google_flights_url = value or ""
+            return
+
+        group_name, _, rest = prefix.partition('.item')
+        if group_name not in _GROUPS:
+            return
+
+        if rest == '':
+            if event == 'start_map':
+                self._option, self._legs = {}, []
+            elif event == 'end_map' and self._option is not None:
+                total_duration = _number(self._option.get('total_duration'))
+                self.options.append(FlightOption(_number(self._option.get('price')),
+                                                 int(total_duration) if total_duration is not None else None,
+                                                 tuple(self._legs)))
+                self._option = None
+        elif rest in ('.price', '.total_duration') and self._option is not None:
+            self._option[rest[1:]] = value
+        elif rest == '.flights.item':
+            if event == 'start_map':
+                self._leg = {}
+            elif event == 'end_map' and self._leg is not None:
+                self._legs.append(_leg(self._leg))
+                self._leg = None
+        elif rest.startswith('.flights.item.') and self._leg is not None:
+            field = _LEG_FIELDS.get(rest[len('.flights.item.'):])
+            if field is not None and event in ('string', 'number', 'integer'):
+                self._leg[field] = value
+
+    def build(self) -> CompactFlightResponse:
+        return CompactFlightResponse(tuple(self.options), self.google_flights_url, self.status, self.error)
+
+
+def extract(source: Any) -> CompactFlightResponse:
+    """
+    Kompaktowy rekord z odpowiedzi: słownika, bajtów/tekstu JSON lub pliku otwartego w trybie binarnym
+    """
+    if isinstance(source, CompactFlightResponse):
+        return source
+    if isinstance(source, dict):
+        return from_dict(source)
+    if source is None:
+        return CompactFlightResponse(error="Brak danych odpowiedzi API")
+
+    if ijson is None:
+        if hasattr(source, 'read'):
+            source = source.read()
+        return from_dict(json.loads(source))
+
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    builder = _StreamBuilder()
+    try:
+        for prefix, event, value in ijson.parse(source):
+            builder.feed(prefix, event, value)
+    except _JSON_ERRORS as e:
+        raise ValueError(f"Nieprawidłowy JSON odpowiedzi: {e}") from e
+    return builder.build()
+
+
+async def extract_async(stream) -> CompactFlightResponse:
+    """
+    Strumieniowa ekstrakcja z asynchronicznego strumienia (np. aiohttp StreamReader) -
+    dokument jest przetwarzany w trakcie pobierania, bez buforowania całej odpowiedzi
+    """
+    if ijson is None:
+        return from_dict(json.loads(await stream.read()))
+
+    builder = _StreamBuilder()
+    try:
+        async for prefix, event, value in ijson.parse_async(stream):
+            builder.feed(prefix, event, value)
+    except _JSON_ERRORS as e:
+        raise ValueError(f"Nieprawidłowy JSON odpowiedzi: {e}") from e
+    return builder.build()
@@ -0,0 +1,172 @@
+"""
+Wektorowe dopasowanie lotów do preferencji.
+
+Opcje lotów z jednej odpowiedzi są ładowane do tabeli kolumnowej (tablice NumPy: cena, dzień wylotu,
+liczba przesiadek, macierz linii lotniczych), a wszystkie preferencje subskrybujące to wyszukiwanie
+są sprawdzane jednym przebiegiem (macierz preferencje x opcje) względem predykatów:
+- data wylotu (pierwszy odcinek opcji) równa dacie docelowej
+- cena <= max_price (jeśli podano)
+- preferowana linia lotnicza obsługuje któryś z odcinków (nazwa lub kod IATA przewoźnika, jeśli podano)
+- liczba przesiadek <= max_stops (jeśli podano)
+
+Dla każdej preferencji zwracana jest najtańsza pasująca opcja.
+"""
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from logic.flight_extract import CompactFlightResponse, FlightOption, extract
+
+_EPOCH = date(1970, 1, 1)
+NO_AIRLINE = -1       # preferencja bez wymagań co do linii
+UNKNOWN_AIRLINE = -2  # linia, której nie ma w odpowiedzi - żadna opcja nie pasuje
+MAX_STOPS = 2         # najwyższy limit przesiadek, jaki można ustawić w preferencji
+
+
+def _day_number(value: Any) -> int:
+    """
+    Data (date lub 'YYYY-MM-DD[ HH:MM]') jako liczba dni od 1970-01-01; -1 dla braku daty
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return (value - _EPOCH).days
+    try:
+        return (datetime.strptime(str(value)[:10], '%Y-%m-%d').date() - _EPOCH).days
+    except ValueError:
+        return -1
+
+
+def _airline_key(value: str) -> str:
+    return ' '.join(value.split()).casefold()
+
+
+class MatchCriteria(NamedTuple):
+    target_departure: Any
+    max_price: Optional[float] = None
+    preferred_airline: Optional[str] = None
+    max_stops: Optional[int] = None
+
+    @classmethod
+    def from_preference(cls, preference) -> 'MatchCriteria':
+        return cls(
+            target_departure=preference.target_departure,
+            max_price=preference.max_price,
+            preferred_airline=preference.preferred_airline,
+            max_stops=preference.max_stops,
+        )
+
+
+class FlightMatch(NamedTuple):
+    option: FlightOption
+    price: Optional[float]
+    airline: str
+    departure_time: str
+    stops: int
+
+
+class FlightTable:
+    """
+    Kolumnowa reprezentacja opcji lotów z jednej odpowiedzi
+    """
+
+    def __init__(self, response: Any):
+        record: CompactFlightResponse = extract(response)
+        self.options = [option for option in record.options if option.legs]
+        count = len(self.options)
+
+        self.price = np.array([option.price if option.price is not None else np.nan for option in self.options],
+                              dtype=np.float64)
+        self.departure_day = np.array([_day_number(option.legs[0].departure_time) for option in self.options],
+                                      dtype=np.int32)
+        self.stops = np.array([option.stops for option in self.options], dtype=np.int16)
+
+        # Słownik linii: nazwy i kody przewoźników (z numeru lotu, np. "LO 123" -> "lo")
+        self.airline_ids: Dict[str, int] = {}
+        memberships = []
+        for row, option in enumerate(self.options):
+            for leg in option.legs:
+                keys = [_airline_key(leg.airline)] if leg.airline else []
+                if leg.flight_number:
+                    keys.append(_airline_key(leg.flight_number.split()[0]))
+                for key in keys:
+                    memberships.append((row, self.airline_ids.setdefault(key, len(self.airline_ids))))
+
+        # Dodatkowa, zawsze pusta kolumna dla nieznanych linii (UNKNOWN_AIRLINE)
+        self.airline_matrix = np.zeros((count, len(self.airline_ids) + 1), dtype=bool)
+        if memberships:
+            rows, columns = np.array(memberships, dtype=np.int64).T
+            self.airline_matrix[rows, columns] = True
+
+    def __len__(self) -> int:
+        return len(self.options)
+
+    @property
+    def min_price(self) -> Optional[float]:
+        prices = self.price[~np.isnan(self.price)]
+        return float(prices.min()) if prices.size else None
+
+    def airline_id(self, airline: Optional[str]) -> int:
+        if not airline or not airline.strip():
+            return NO_AIRLINE
+        return self.airline_ids.get(_airline_key(airline), UNKNOWN_AIRLINE)
+
+    def match_mask(self, criteria: Sequence[MatchCriteria]) -> np.ndarray:
+        """
+        Macierz (preferencje x opcje) spełnienia wszystkich predykatów
+        """
+        if not criteria or not self.options:
+            return np.zeros((len(criteria), len(self.options)), dtype=bool)
+
+        target_day = np.array([_day_number(item.target_departure) for item in criteria], dtype=np.int32)
+        max_price = np.array([item.max_price if item.max_price is not None else np.inf for item in criteria],
+                             dtype=np.float64)
+        max_stops = np.array([item.max_stops if item.max_stops is not None else np.iinfo(np.int16).max
+                              for item in criteria], dtype=np.int16)
+        airline = np.array([self.airline_id(item.preferred_airline) for item in criteria], dtype=np.int64)
+
+        date_ok = self.departure_day[None, :] == target_day[:, None]
+        # Opcja bez ceny pasuje tylko do preferencji bez limitu ceny
+        price_ok = (self.price[None, :] <= max_price[:, None]) | np.isinf(max_price)[:, None]
+        stops_ok = self.stops[None, :] <= max_stops[:, None]
+        airline_column = np.where(airline == UNKNOWN_AIRLINE, self.airline_matrix.shape[1] - 1, airline)
+        airline_ok = np.where(
+            (airline == NO_AIRLINE)[:, None],
+            True,
+            self.airline_matrix[:, np.maximum(airline_column, 0)].T,
+        )
+        return date_ok & price_ok & stops_ok & airline_ok
+
+    def best_matches(self, criteria: Sequence[MatchCriteria]) -> List[Optional[FlightMatch]]:
+        """
+        Najtańsza pasująca opcja dla każdej preferencji (None, gdy żadna nie pasuje)
+        """
+        mask = self.match_mask(criteria)
+        if not mask.size:
+            return [None] * len(criteria)
+
+        # Opcje bez ceny na końcu, ale przed opcjami niepasującymi
+        prices = np.where(np.isnan(self.price), np.finfo(np.float64).max, self.price)
+        masked = np.where(mask, prices[None, :], np.inf)
+        best = masked.argmin(axis=1)
+        has_match = mask.any(axis=1)
+
+        matches: List[Optional[FlightMatch]] = []
+        for matched, index in zip(has_match.tolist(), best.tolist()):
+            if not matched:
+                matches.append(None)
+                continue
+            option = self.options[index]
+            matches.append(FlightMatch(option, option.price, option.airline,
+                                       option.legs[0].departure_time, option.stops))
+        return matches
+
+
+def match_preferences(response: Any, preferences: Iterable[Any]) -> List[Optional[FlightMatch]]:
+    """
+    Dopasowuje wszystkie preferencje (obiekty z target_departure, max_price, preferred_airline)
+    do jednej odpowiedzi
+    """
+    return FlightTable(response).best_matches([MatchCriteria.from_preference(preference)
+                                               for preference in preferences])
@@ -0,0 +1,134 @@
+"""
+Potokowe przetwarzanie elementów przez kolejne etapy.
+
+W trybie potokowym (run_pipeline) każdy etap ma własną pulę wątków, a etapy są połączone
+ograniczonymi kolejkami: pełna kolejka wstrzymuje etap poprzedni (a w końcu samo źródło), więc
+między etapami czeka naraz najwyżej queue_size elementów. Tryb sekwencyjny (run_sequential)
+przeprowadza każdy element przez wszystkie etapy po kolei w bieżącym wątku - te same funkcje
+etapów dają w obu trybach te same wyniki, różni się tylko kolejność i równoległość.
+
+Funkcja etapu przyjmuje element i zwraca elementy dla etapu następnego (lub None). Błąd przetwarzania
+elementu jest wypisywany i liczony, ale nie zatrzymuje potoku.
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, NamedTuple, Optional, Sequence
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    name: str
+    handler: Callable[[Any], Optional[Iterable[Any]]]
+    workers: int = 1
+    queue_size: int = 0  # 0 - dwa elementy na wątek etapu
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    errors: int = 0
+    busy: float = 0.0
+
+
+def _process(stage: Stage, item: Any, stats: StageStats, lock: threading.Lock) -> List[Any]:
+    started = time.perf_counter()
+    try:
+        outputs = list(stage.handler(item) or ())
+        failed = False
+    except Exception:
+        logger.exception("Błąd etapu '%s'", stage.name)
+        outputs, failed = [], True
+    with lock:
+        stats.processed += 1
+        stats.errors += failed
+        stats.busy += time.perf_counter() - started
+    return outputs
+
+
+def run_sequential(source: Iterable[Any], stages: Sequence[Stage]) -> Dict[str, StageStats]:
+    """
+    Każdy element przechodzi przez wszystkie etapy, zanim pobrany zostanie następny
+    """
+    stats = {stage.name: StageStats() for stage in stages}
+    lock = threading.Lock()
+
+    def push(index: int, item: Any) -> None:
+        if index == len(stages):
+            return
+        for output in _process(stages[index], item, stats[stages[index].name], lock):
+            push(index + 1, output)
+
+    for item in source:
+        push(0, item)
+    return stats
+
+
+def run_pipeline(source: Iterable[Any], stages: Sequence[Stage],
+                 context: Optional[Callable[[], ContextManager]] = None) -> Dict[str, StageStats]:
+    """
+    Uruchamia etapy w osobnych pulach wątków; źródło jest czytane w bieżącym wątku
+
+    Args:
+        context: fabryka kontekstu otwieranego na czas życia każdego wątku (np. app.app_context)
+    """
+    stats = {stage.name: StageStats() for stage in stages}
+    if not stages:
+        for _ in source:
+            pass
+        return stats
+
+    lock = threading.Lock()
+    inboxes = [queue.Queue(maxsize=stage.queue_size or 2 * max(1, stage.workers)) for stage in stages]
+    # Liczba producentów każdej kolejki - ostatni kończący producent zamyka kolejkę etapu następnego
+    producers_left = [1] + [max(1, stage.workers) for stage in stages[:-1]]
+
+    def close(index: int) -> None:
+        with lock:
+            producers_left[index] -= 1
+            last = producers_left[index] == 0
+        if last:
+            for _ in range(max(1, stages[index].workers)):
+                inboxes[index].put(_DONE)
+
+    def work(index: int) -> None:
+        stage = stages[index]
+        outbox = inboxes[index + 1] if index + 1 < len(stages) else None
+        while True:
+            item = inboxes[index].get()
+            if item is _DONE:
+                break
+            for output in _process(stage, item, stats[stage.name], lock):
+                if outbox is not None:
+                    outbox.put(output)
+
+    def run(index: int) -> None:
+        try:
+            if context is None:
+                work(index)
+            else:
+                with context():
+                    work(index)
+        finally:
+            if index + 1 < len(stages):
+                close(index + 1)
+
+    threads = [
+        threading.Thread(target=run, args=(index,), name=f"{stage.name}-{number}", daemon=True)
+        for index, stage in enumerate(stages) for number in range(max(1, stage.workers))
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for item in source:
+            inboxes[0].put(item)
+    finally:
+        close(0)
+        for thread in threads:
+            thread.join()
+    return stats
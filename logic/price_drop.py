@@ -0,0 +1,92 @@
+"""
+Wykrywanie spadków cen względem kroczącej linii bazowej.
+
+Linia bazowa każdej preferencji to wykładnicza średnia krocząca (EWMA) ceny i jej wariancja,
+aktualizowane w O(1) przy każdej obserwacji - bez ponownego czytania historii. Cała partia
+obserwacji (wszystkie preferencje sprawdzone w danym przebiegu workera) jest przetwarzana
+jednym wektorowym przebiegiem NumPy.
+"""
+from typing import NamedTuple, Optional
+import os
+
+import numpy as np
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class BaselineUpdate(NamedTuple):
+    alerts: np.ndarray
+    mean: np.ndarray
+    variance: np.ndarray
+    samples: np.ndarray
+    drop: np.ndarray
+
+
+class PriceDropDetector:
+    """
+    Spadek ceny jest zgłaszany, gdy:
+    - linia bazowa ma co najmniej `min_samples` obserwacji
+    - cena jest niższa od średniej o co najmniej `min_drop` (ułamek) i `sigmas` odchyleń standardowych
+    - cena jest niższa od ceny z poprzedniego alertu o co najmniej `realert_drop` (bez powtórzeń)
+    """
+
+    def __init__(self, span: float = 10, min_samples: int = 3, min_drop: float = 0.1,
+                 sigmas: float = 1.5, realert_drop: float = 0.05):
+        self.alpha = 2.0 / (span + 1.0)
+        self.min_samples = min_samples
+        self.min_drop = min_drop
+        self.sigmas = sigmas
+        self.realert_drop = realert_drop
+
+    @classmethod
+    def from_env(cls) -> 'PriceDropDetector':
+        return cls(
+            span=_env_float('PRICE_BASELINE_SPAN', 10),
+            min_samples=int(_env_float('PRICE_DROP_MIN_SAMPLES', 3)),
+            min_drop=_env_float('PRICE_DROP_MIN_PERCENT', 10) / 100,
+            sigmas=_env_float('PRICE_DROP_SIGMAS', 1.5),
+        )
+
+    def update(self, price: np.ndarray, mean: np.ndarray, variance: np.ndarray, samples: np.ndarray,
+               last_alert_price: Optional[np.ndarray] = None) -> BaselineUpdate:
+        """
+        Sprawdza partię obserwacji i zwraca zaktualizowane linie bazowe.
+
+        Args:
+            price: obserwowane ceny (NaN - brak obserwacji, linia bazowa bez zmian)
+            mean, variance, samples: bieżące linie bazowe (mean NaN / samples 0 - brak linii bazowej)
+            last_alert_price: cena z ostatniego alertu (NaN - brak alertu)
+        """
+        price = np.asarray(price, dtype=np.float64)
+        mean = np.asarray(mean, dtype=np.float64)
+        variance = np.asarray(variance, dtype=np.float64)
+        samples = np.asarray(samples, dtype=np.int64)
+        if last_alert_price is None:
+            last_alert_price = np.full(price.shape, np.nan)
+
+        observed = ~np.isnan(price)
+        has_baseline = samples > 0
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            drop = np.where(has_baseline & observed & (mean > 0), (mean - price) / mean, 0.0)
+            deviation = np.sqrt(np.maximum(variance, 0.0))
+            significant = (mean - price) >= self.sigmas * deviation
+            not_repeated = np.isnan(last_alert_price) | (price <= last_alert_price * (1 - self.realert_drop))
+            alerts = (observed & (samples >= self.min_samples) & (drop >= self.min_drop)
+                      & significant & not_repeated)
+
+            diff = price - mean
+            increment = self.alpha * diff
+            new_mean = np.where(observed, np.where(has_baseline, mean + increment, price), mean)
+            new_variance = np.where(
+                observed,
+                np.where(has_baseline, (1 - self.alpha) * (variance + diff * increment), 0.0),
+                variance,
+            )
+        new_samples = samples + observed.astype(np.int64)
+        return BaselineUpdate(alerts, new_mean, new_variance, new_samples, drop)
@@ -0,0 +1,351 @@
+"""
+Planowanie zapytań SerpAPI w ramach dziennego/miesięcznego limitu.
+
+Identyczne wyszukiwania (trasa, daty, waluta, klasa) są łączone w grupy - jedno zapytanie
+obsługuje wszystkich subskrybentów. Każda grupa dostaje częstotliwość sprawdzania (zapytań na dobę)
+zależną od:
+- liczby dni do wylotu (URGENCY_BUCKETS)
+- zmienności cen subskrybentów grupy (z kroczących linii bazowych cen każdej preferencji)
+- liczby subskrybentów
+
+Grupa elastycznego okna dat (flex_days) kosztuje kilka zapytań na sprawdzenie (loty w jedną stronę
+dla każdego dnia okna) - budżet liczony jest w zapytaniach, nie w sprawdzeniach.
+
+Gdy suma częstotliwości wszystkich grup przekracza budżet, wszystkie są skalowane proporcjonalnie
+(współczynnik liczony z zapotrzebowania wszystkich preferencji - demand_scale - a nie tylko
+sprawdzanej partii, raz na slot - slot_scale). Worker działa w ciągłej pętli i sprawdza tylko preferencje, na które przyszła
+kolej (next_check_at); kolejny termin wynika z częstotliwości grupy (z losowym rozrzutem), a dzienny
+budżet jest udostępniany równomiernie w ciągu doby (z zapasem jednego slotu SERPAPI_SCHEDULER_SLOT_MINUTES).
+Zużycie limitu liczone jest w bazie danych (services/quota_ledger.py), wspólnie dla wszystkich procesów.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import calendar
+import math
+import os
+import random
+
+from logic.flex_window import flight_window
+from services.quota_ledger import QuotaLedger
+
+# (maks. liczba dni do wylotu, pożądana liczba sprawdzeń na dobę)
+URGENCY_BUCKETS = [(3, 8.0), (14, 4.0), (60, 2.0), (180, 1.0), (None, 1 / 3)]
+MAX_CHECKS_PER_DAY = 12.0
+VOLATILITY_WEIGHT = 2.0
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+@dataclass
+class SearchGroup:
+    """
+    Grupa preferencji o identycznych parametrach wyszukiwania
+    """
+    key: str
+    route: str
+    target_departure: date
+    members: List[Any] = field(default_factory=list)
+    flex_days: int = 0
+    requests: int = 1
+    volatility: float = 0.0
+    desired_rate: float = 0.0
+    rate: float = 0.0
+    last_checked: Optional[float] = None
+    failures: int = 0
+    retry_at: Optional[float] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self.members)
+
+    @property
+    def calls_per_day(self) -> float:
+        return self.rate * self.requests
+
+
+class QuotaScheduler:
+    """
+    Przydział częstotliwości sprawdzeń i wybór grup do sprawdzenia w bieżącym slocie
+    """
+
+    def __init__(self, daily_budget: int = 0, monthly_budget: int = 0, slot_minutes: int = 60,
+                 ledger: Optional[QuotaLedger] = None, price_history=None):
+        self.daily_budget = daily_budget
+        self.monthly_budget = monthly_budget
+        self.slot_minutes = max(1, slot_minutes)
+        self.ledger = ledger or QuotaLedger()
+        self.price_history = price_history
+        # Skala częstotliwości policzona w bieżącym slocie: (slot, skala)
+        self._slot_scale: Optional[Tuple[Tuple[date, int], float]] = None
+
+    @classmethod
+    def from_env(cls, price_history=None) -> 'QuotaScheduler':
+        return cls(
+            daily_budget=_env_int('SERPAPI_DAILY_BUDGET', 0),
+            monthly_budget=_env_int('SERPAPI_MONTHLY_BUDGET', 0),
+            slot_minutes=_env_int('SERPAPI_SCHEDULER_SLOT_MINUTES', 60),
+            price_history=price_history,
+        )
+
+    @staticmethod
+    def base_rate(days_to_departure: int) -> float:
+        for max_days, rate in URGENCY_BUCKETS:
+            if max_days is None or days_to_departure <= max_days:
+                return rate
+        return URGENCY_BUCKETS[-1][1]
+
+    def _preference_volatility(self, preference_ids: Iterable[int]) -> Dict[int, float]:
+        """
+        Współczynnik zmienności cen preferencji (odchylenie standardowe / średnia) z ich linii bazowych;
+        preferencje bez historii nie mają wpisu
+        """
+        if self.price_history is None:
+            return {}
+        try:
+            return self.price_history.preference_volatility(preference_ids)
+        except Exception as e:
+            print(f"Błąd odczytu linii bazowych cen do oceny zmienności: {e}")
+            return {}
+
+    @staticmethod
+    def group_volatility(volatilities: List[float]) -> float:
+        """
+        Zmienność grupy: średnia kwadratowa współczynników zmienności subskrybentów z historią cen
+        (0, gdy żaden jej nie ma)
+        """
+        if not volatilities:
+            return 0.0
+        return math.sqrt(sum(value * value for value in volatilities) / len(volatilities))
+
+    def daily_allowance(self, today: Optional[date] = None) -> float:
+        """
+        Dzienny budżet: mniejszy z limitu dziennego i pozostałego limitu miesięcznego
+        rozłożonego na pozostałe dni miesiąca (math.inf, gdy limity nie są ustawione)
+        """
+        today = today or date.today()
+        allowance = float(self.daily_budget) if self.daily_budget > 0 else math.inf
+        if self.monthly_budget > 0:
+            days_left = calendar.monthrange(today.year, today.month)[1] - today.day + 1
+            remaining = max(0, self.monthly_budget - self.ledger.used_in_month(today, before_day=True))
+            allowance = min(allowance, remaining / days_left)
+        return allowance
+
+    @staticmethod
+    def group_key(search: Tuple) -> str:
+        """
+        Klucz grupy dla parametrów wyszukiwania (lotnisko wylotu, lotnisko przylotu, data wylotu,
+        data powrotu, waluta, klasa[, flex_days])
+        """
+        departure, arrival, target_departure, return_date, currency, seat_class, *window = search
+        key = f"{departure}-{arrival}:{target_departure}:{return_date}:{currency}:{seat_class}"
+        flex_days = (window[0] or 0) if window else 0
+        return f"{key}:flex{flex_days}" if flex_days else key
+
+    @staticmethod
+    def _new_group(key: str, search: Tuple, today: date) -> SearchGroup:
+        departure, arrival, target_departure, return_date, currency, seat_class, *window = search
+        flex_days = (window[0] or 0) if window else 0
+        group = SearchGroup(key, f"{departure}-{arrival}", target_departure, flex_days=flex_days)
+        if flex_days:
+            group.requests = max(1, len(flight_window(departure, arrival, target_departure, return_date,
+                                                      flex_days, currency, seat_class, today).legs))
+        return group
+
+    def _desired_rate(self, target_departure: date, subscribers: int, volatility: float, today: date) -> float:
+        days_to_departure = max(0, (target_departure - today).days)
+        weight = (1 + VOLATILITY_WEIGHT * min(volatility, 1.0)) * (1 + math.log2(max(1, subscribers)))
+        return min(MAX_CHECKS_PER_DAY, self.base_rate(days_to_departure) * weight)
+
+    def demand_scale(self, searches: Iterable[Tuple[Tuple, int, float]], today: Optional[date] = None) -> float:
+        """
+        Współczynnik skalowania częstotliwości dla wszystkich preferencji w bazie: budżet dzienny
+        podzielony przez łączne pożądane zużycie (1.0, gdy budżet wystarcza lub limity nie są ustawione).
+        Worker sprawdza preferencje partiami - skala liczona tylko z zapotrzebowania partii
+        nie uwzględniałaby pozostałych grup dzielących ten sam budżet.
+
+        Args:
+            searches: trójki (parametry wyszukiwania jak w plan, liczba preferencji z tymi parametrami,
+                zmienność grupy jak w group_volatility) - po jednej na grupę, np. strumieniowo z jednego
+                zapytania agregującego (GROUP BY); pamięć nie zależy od liczby grup
+        """
+        today = today or date.today()
+        allowance = self.daily_allowance(today)
+        if math.isinf(allowance):
+            return 1.0
+        demand = 0.0
+        for search, count, volatility in searches:
+            group = self._new_group(self.group_key(search), search, today)
+            rate = self._desired_rate(group.target_departure, count, volatility or 0.0, today)
+            demand += rate * group.requests
+        return 1.0 if demand <= allowance else allowance / demand
+
+    def slot_scale(self, searches: Callable[[], Iterable[Tuple[Tuple, int, float]]],
+                   now: Optional[datetime] = None) -> float:
+        """
+        demand_scale liczony raz na slot SERPAPI_SCHEDULER_SLOT_MINUTES - zapotrzebowanie wszystkich
+        preferencji zmienia się powoli, więc kolejne partie i przebiegi w tym samym slocie
+        używają zapamiętanej skali zamiast ponownie agregować całą tabelę
+
+        Args:
+            searches: funkcja zwracająca dane dla demand_scale, wywoływana tylko przy nowym slocie
+        """
+        now = now or datetime.now()
+        elapsed = (now - datetime.combine(now.date(), datetime.min.time())).total_seconds()
+        slot = (now.date(), int(elapsed // (self.slot_minutes * 60)))
+        if self._slot_scale is None or self._slot_scale[0] != slot:
+            self._slot_scale = (slot, self.demand_scale(searches(), now.date()))
+        return self._slot_scale[1]
+
+    def plan(self, entries: Iterable[Tuple[Any, int, Tuple]], today: Optional[date] = None,
+             scale: Optional[float] = None) -> List[SearchGroup]:
+        """
+        Grupuje preferencje i przydziela częstotliwości sprawdzeń
+
+        Args:
+            entries: trójki (element, ID preferencji, (lotnisko wylotu, lotnisko przylotu, data wylotu,
+                data powrotu, waluta, klasa[, flex_days]))
+            scale: współczynnik skalowania z demand_scale, gdy entries to tylko część preferencji
+                (domyślnie liczony z zapotrzebowania samych entries)
+        """
+        today = today or date.today()
+        groups: Dict[str, SearchGroup] = {}
+        preference_ids: Dict[str, List[int]] = {}
+        for member, preference_id, search in entries:
+            key = self.group_key(search)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = self._new_group(key, search, today)
+                preference_ids[key] = []
+            group.members.append(member)
+            preference_ids[key].append(preference_id)
+
+        volatility_by_preference = self._preference_volatility(
+            preference_id for ids in preference_ids.values() for preference_id in ids)
+        for key, group in groups.items():
+            group.volatility = self.group_volatility([volatility_by_preference[preference_id]
+                                                      for preference_id in preference_ids[key]
+                                                      if preference_id in volatility_by_preference])
+            group.desired_rate = self._desired_rate(group.target_departure, group.subscribers, group.volatility, today)
+
+        if scale is None:
+            allowance = self.daily_allowance(today)
+            demand = sum(group.desired_rate * group.requests for group in groups.values())
+            scale = 1.0 if demand <= allowance else allowance / demand
+        for group in groups.values():
+            group.rate = group.desired_rate * scale
+        return list(groups.values())
+
+    def slot_budget(self, now: Optional[datetime] = None) -> float:
+        """
+        Liczba zapytań dostępna teraz (math.inf, gdy limity nie są ustawione): część dziennego budżetu
+        przypadająca na miniony czas doby i jeden slot zapasu, pomniejszona o dzisiejsze zużycie
+        """
+        now = now or datetime.now()
+        allowance = self.daily_allowance(now.date())
+        if math.isinf(allowance):
+            return allowance
+        elapsed = (now - datetime.combine(now.date(), datetime.min.time())).total_seconds()
+        earned = allowance * min(1.0, (elapsed + self.slot_minutes * 60) / 86400)
+        return max(0, math.floor(earned - self.ledger.used_on(now.date())))
+
+    @staticmethod
+    def within_budget(groups: Iterable[SearchGroup], budget: float) -> List[SearchGroup]:
+        """
+        Grupy (w podanej kolejności) mieszczące się w budżecie zapytań; ostatnia wybrana grupa
+        (okno dat) może go nieznacznie przekroczyć
+        """
+        selected = []
+        spent = 0
+        for group in groups:
+            if spent >= budget:
+                break
+            selected.append(group)
+            spent += group.requests
+        return selected
+
+    @staticmethod
+    def next_check_delay(group: SearchGroup) -> float:
+        """
+        Sekundy do kolejnego sprawdzenia grupy - z rozrzutem ±10%, żeby sprawdzenia nie skupiały się
+        w jednej chwili
+        """
+        rate = group.rate or group.desired_rate
+        interval = 86400 / rate if rate > 0 else 86400
+        return interval * random.uniform(0.9, 1.1)
+
+    def retry_delay(self, failures: int, max_delay: float = 6 * 3600) -> float:
+        """
+        Sekundy do ponownej próby po failures kolejnych nieudanych pobraniach (pierwsza po pół slotu)
+        """
+        return min(max_delay, self.slot_minutes * 30 * 2 ** max(0, failures - 1))
+
+    def select_due(self, groups: List[SearchGroup], now: Optional[datetime] = None,
+                   budget: Optional[float] = None) -> List[SearchGroup]:
+        """
+        Wybiera grupy do sprawdzenia w bieżącym slocie: tylko te, na które przyszła kolej,
+        najpierw najbardziej zaległe, w liczbie nieprzekraczającej budżetu slotu
+
+        Args:
+            budget: pozostały budżet slotu w zapytaniach, gdy slot jest dzielony na kilka partii
+                (domyślnie slot_budget)
+        """
+        now = now or datetime.now()
+        timestamp = now.timestamp()
+
+        due = []
+        for group in groups:
+            if group.rate <= 0 or (group.retry_at is not None and group.retry_at > timestamp):
+                continue
+            interval = 86400 / group.rate
+            # Tolerancja pół slotu - grupa sprawdzana co slot nie przesuwa się o jeden slot przy każdym uruchomieniu
+            elapsed = math.inf if group.last_checked is None else timestamp - group.last_checked + self.slot_minutes * 30
+            if elapsed >= interval:
+                due.append(((group.failures > 0, min(elapsed / interval, 1e6) * group.desired_rate), group))
+        # Ponownie zakolejkowane grupy (nieudane wcześniejsze sprawdzenie) mają pierwszeństwo
+        due.sort(key=lambda item: item[0], reverse=True)
+
+        return self.within_budget((group for _, group in due), self.slot_budget(now) if budget is None else budget)
+
+    def report(self, groups: List[SearchGroup], today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Prognoza zużycia limitu przy bieżącym planie
+        """
+        today = today or date.today()
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        planned_per_day = sum(group.calls_per_day for group in groups)
+        used_today = self.ledger.used_on(today)
+        used_month = self.ledger.used_in_month(today)
+        remaining_today_fraction = 1 - (datetime.now() - datetime.combine(today, datetime.min.time())).total_seconds() / 86400
+
+        by_bucket: Dict[str, Dict[str, float]] = {}
+        for group in groups:
+            days_to_departure = max(0, (group.target_departure - today).days)
+            label = next(f"<= {max_days} dni" if max_days is not None else "dalej"
+                         for max_days, _ in URGENCY_BUCKETS if max_days is None or days_to_departure <= max_days)
+            bucket = by_bucket.setdefault(label, {'groups': 0, 'subscribers': 0, 'calls_per_day': 0.0})
+            bucket['groups'] += 1
+            bucket['subscribers'] += group.subscribers
+            bucket['calls_per_day'] = round(bucket['calls_per_day'] + group.calls_per_day, 2)
+
+        return {
+            'groups': len(groups),
+            'subscribers': sum(group.subscribers for group in groups),
+            'desired_calls_per_day': round(sum(group.desired_rate * group.requests for group in groups), 2),
+            'planned_calls_per_day': round(planned_per_day, 2),
+            'daily_budget': self.daily_budget or None,
+            'monthly_budget': self.monthly_budget or None,
+            'used_today': used_today,
+            'used_this_month': used_month,
+            'flex_windows': sum(1 for group in groups if group.flex_days),
+            'requeued': sum(1 for group in groups if group.failures),
+            'projected_today': round(used_today + planned_per_day * max(0.0, remaining_today_fraction), 1),
+            'projected_month': round(used_month + planned_per_day * (
+                days_in_month - today.day + max(0.0, remaining_today_fraction)), 1),
+            'by_departure': by_bucket,
+        }
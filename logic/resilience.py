@@ -0,0 +1,252 @@
+"""
+Odporność wywołań SerpAPI: limit czasu zapytania, globalny budżet ponowień z losowym opóźnieniem
+(full jitter) i bezpiecznik (circuit breaker), który wstrzymuje zapytania przy wysokim odsetku błędów.
+
+Wywołanie przekazywane do ResiliencePolicy zwraca (status HTTP, odpowiedź); status None oznacza
+błąd połączenia lub przekroczenie limitu czasu. Ponawiane są tylko błędy przejściowe
+(RETRYABLE_STATUSES, błędy połączenia) - odpowiedź "brak wyników" czy błędny klucz API nie.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, Tuple
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class RetryBudget:
+    """
+    Globalny budżet ponowień: każde zapytanie dokłada `ratio` żetonu, każde ponowienie zabiera jeden.
+    Przy awarii liczba ponowień jest więc ograniczona do ułamka ruchu zamiast go zwielokrotniać.
+    """
+
+    def __init__(self, ratio: float = 0.2, initial: float = 5.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min(initial, max_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik na przesuwnym oknie ostatnich wyników. Otwiera się, gdy odsetek błędów w oknie
+    przekroczy próg; po czasie `cooldown` przepuszcza pojedyncze zapytania próbne (half-open)
+    i zamyka się po pierwszym udanym.
+    """
+
+    def __init__(self, failure_threshold: float = 0.5, window: int = 20, min_requests: int = 10,
+                 cooldown: float = 60.0, half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        """
+        Liczba sekund do zapytania próbnego (0, gdy bezpiecznik jest zamknięty)
+        """
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state, self._probes = HALF_OPEN, 0
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return False
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        logger.warning("Bezpiecznik SerpAPI otwarty - zapytania wstrzymane na %.0f s", self.cooldown)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                logger.info("Bezpiecznik SerpAPI zamknięty - zapytania wznowione")
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_requests:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_threshold:
+                    self._open()
+
+
+class ResiliencePolicy:
+    """
+    Ponowienia z budżetem i opóźnieniem oraz bezpiecznik wokół pojedynczego wywołania
+    """
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, budget: Optional[RetryBudget] = None,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_cap: float = 20.0, timeout: float = 30.0):
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls) -> 'ResiliencePolicy':
+        return cls(
+            breaker=CircuitBreaker(
+                failure_threshold=_env_float('SERPAPI_BREAKER_THRESHOLD', 0.5),
+                window=int(_env_float('SERPAPI_BREAKER_WINDOW', 20)),
+                min_requests=int(_env_float('SERPAPI_BREAKER_MIN_REQUESTS', 10)),
+                cooldown=_env_float('SERPAPI_BREAKER_COOLDOWN', 60.0),
+            ),
+            budget=RetryBudget(ratio=_env_float('SERPAPI_RETRY_BUDGET_RATIO', 0.2)),
+            max_retries=int(_env_float('SERPAPI_MAX_RETRIES', 3)),
+            timeout=_env_float('SERPAPI_TIMEOUT', 30.0),
+        )
+
+    def limited(self, max_retries: int, timeout: float) -> 'ResiliencePolicy':
+        """
+        Polityka z tym samym bezpiecznikiem i budżetem ponowień, ale własnym limitem ponowień i czasu
+        """
+        return ResiliencePolicy(self.breaker, self.budget, max_retries=max_retries,
+                                backoff_base=self.backoff_base, backoff_cap=self.backoff_cap, timeout=timeout)
+
+    @staticmethod
+    def is_failure(status: Optional[int]) -> bool:
+        return status is None or status in RETRYABLE_STATUSES
+
+    def backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** retry))
+
+    def _after_attempt(self, status: Optional[int], retry: int) -> bool:
+        """
+        Rejestruje wynik próby; zwraca True, gdy należy ponowić zapytanie
+        """
+        if not self.is_failure(status):
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        return retry < self.max_retries and self.budget.withdraw()
+
+    def call(self, attempt: Callable[[], Tuple[Optional[int], Any]], unavailable: Callable[[], Any]) -> Any:
+        """
+        Wywołanie synchroniczne (aplikacja webowa)
+        """
+        self.budget.deposit()
+        retry = 0
+        while True:
+            if not self.breaker.allow():
+                return unavailable()
+            status, response = attempt()
+            if not self._after_attempt(status, retry):
+                return response
+            time.sleep(self.backoff(retry))
+            retry += 1
+
+    async def call_async(self, attempt: Callable[[], Awaitable[Tuple[Optional[int], Any]]],
+                         unavailable: Callable[[], Any]) -> Any:
+        """
+        Wywołanie asynchroniczne (silnik pobierania workera)
+        """
+        self.budget.deposit()
+        retry = 0
+        while True:
+            if not self.breaker.allow():
+                return unavailable()
+            status, response = await attempt()
+            if not self._after_attempt(status, retry):
+                return response
+            await asyncio.sleep(self.backoff(retry))
+            retry += 1
+
+
+_policy: Optional[ResiliencePolicy] = None
+_web_policy: Optional[ResiliencePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_serpapi_policy() -> ResiliencePolicy:
+    """
+    Polityka współdzielona w obrębie procesu - wszystkie wywołania SerpAPI korzystają z jednego
+    bezpiecznika i budżetu ponowień
+    """
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = ResiliencePolicy.from_env()
+    return _policy
+
+
+def get_serpapi_web_policy() -> ResiliencePolicy:
+    """
+    Polityka zapytań z aplikacji webowej: ten sam bezpiecznik i budżet ponowień co worker, ale krótki
+    limit czasu i co najwyżej jedno ponowienie (SERPAPI_WEB_TIMEOUT, SERPAPI_WEB_MAX_RETRIES) - zapytanie
+    blokuje wątek obsługujący żądanie, a nieudane wyszukiwania ponawia worker
+    """
+    global _web_policy
+    if _web_policy is None:
+        shared = get_serpapi_policy()
+        with _policy_lock:
+            if _web_policy is None:
+                _web_policy = shared.limited(
+                    max_retries=min(1, max(0, int(_env_float('SERPAPI_WEB_MAX_RETRIES', 0)))),
+                    timeout=_env_float('SERPAPI_WEB_TIMEOUT', 10.0),
+                )
+    return _web_policy
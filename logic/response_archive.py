@@ -0,0 +1,266 @@
+"""
+Archiwum surowych odpowiedzi SerpAPI: skompresowane pliki JSONL tylko do dopisywania.
+
+Układ katalogów (domyślnie DATA_DIR/archive, zmienna SERPAPI_ARCHIVE_DIR):
+    RRRR-MM-DD/WRO-AAJ/part-0000.jsonl.gz   - rekordy {search_key, fetched_at, params, response}
+    RRRR-MM-DD/WRO-AAJ/index.jsonl          - indeks: klucz wyszukiwania, część, offset, długość, min. cena
+
+Każdy rekord jest osobnym członem gzip, więc plik można dopisywać bez ponownej kompresji,
+a pojedynczy rekord odczytać bezpośrednio (seek do offsetu z indeksu). Gdy część przekroczy
+SERPAPI_ARCHIVE_MAX_BYTES, kolejne rekordy trafiają do następnej części.
+
+Zapytania: python -m logic.response_archive lowest-price --route WRO-AAJ --days 30
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import gzip
+import json
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows - bez blokad między procesami
+    fcntl = None
+
+from services.response_cache import normalize_params, search_key
+
+INDEX_FILE = 'index.jsonl'
+DEFAULT_MAX_PART_BYTES = 16 * 1024 * 1024
+
+
+def default_archive_dir() -> str:
+    return os.getenv('SERPAPI_ARCHIVE_DIR', os.path.join(os.getenv('DATA_DIR', './data'), 'archive'))
+
+
+def _route(params: Dict[str, Any]) -> str:
+    departure = str(params.get('departure_id') or 'XXX').upper()
+    arrival = str(params.get('arrival_id') or 'XXX').upper()
+    return f"{departure}-{arrival}"
+
+
+def min_price(response: Dict[str, Any]) -> Optional[float]:
+    """
+    Najniższa cena w odpowiedzi (best_flights + other_flights, ewentualnie price_insights)
+    """
+    prices = [
+        group['price'] for group in response.get('best_flights', []) + response.get('other_flights', [])
+        if isinstance(group.get('price'), (int, float))
+    ]
+    lowest = (response.get('price_insights') or {}).get('lowest_price')
+    if isinstance(lowest, (int, float)):
+        prices.append(lowest)
+    return min(prices) if prices else None
+
+
+class ResponseArchive:
+    """
+    Zapis i odczyt archiwum odpowiedzi. Bezpieczne dla wielu procesów (blokada fcntl na pliku indeksu).
+    """
+
+    def __init__(self, root: Optional[str] = None, max_part_bytes: Optional[int] = None):
+        self.root = root or default_archive_dir()
+        self.max_part_bytes = max_part_bytes or int(os.getenv('SERPAPI_ARCHIVE_MAX_BYTES', DEFAULT_MAX_PART_BYTES))
+
+    def _partition(self, day: date, route: str) -> str:
+        return os.path.join(self.root, day.isoformat(), route)
+
+    def _current_part(self, partition: str) -> str:
+        parts = sorted(name for name in os.listdir(partition) if name.startswith('part-'))
+        if parts:
+            current = os.path.join(partition, parts[-1])
+            if os.path.getsize(current) < self.max_part_bytes:
+                return current
+        return os.path.join(partition, f"part-{len(parts):04d}.jsonl.gz")
+
+    def append(self, params: Dict[str, Any], response: Dict[str, Any],
+               fetched_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Dopisuje odpowiedź do archiwum i zwraca wpis indeksu
+        """
+        return self._append(params, json.dumps(response, ensure_ascii=False, separators=(',', ':')),
+                            min_price(response), 'error' in response, fetched_at)
+
+    def append_raw(self, params: Dict[str, Any], raw: bytes, lowest_price: Optional[float],
+                   error: bool = False, fetched_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Dopisuje surową odpowiedź (bajty JSON) bez parsowania; najniższą cenę do indeksu podaje
+        wywołujący (np. z rekordu kompaktowego zbudowanego strumieniowo)
+        """
+        # Znaki nowej linii w poprawnym JSON-ie są tylko białymi znakami między tokenami - rekord zostaje jedną linią
+        text = raw.decode('utf-8').replace('\r', ' ').replace('\n', ' ')
+        return self._append(params, text, lowest_price, error, fetched_at)
+
+    def _append(self, params: Dict[str, Any], response_json: str, lowest_price: Optional[float],
+                error: bool, fetched_at: Optional[datetime]) -> Dict[str, Any]:
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        route = _route(params)
+        partition = self._partition(fetched_at.date(), route)
+        os.makedirs(partition, exist_ok=True)
+
+        key = search_key(params)
+        record = {
+            'search_key': key,
+            'fetched_at': fetched_at.isoformat(),
+            'params': normalize_params(params),
+        }
+        # Odpowiedź jest już serializowana - dołączana jako ostatnie pole rekordu
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))[:-1] + ',"response":' + response_json + '}\n'
+        member = gzip.compress(line.encode('utf-8'))
+
+        with open(os.path.join(partition, INDEX_FILE), 'a', encoding='utf-8') as index_file:
+            if fcntl is not None:
+                fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                part = self._current_part(partition)
+                with open(part, 'ab') as part_file:
+                    offset = part_file.seek(0, os.SEEK_END)
+                    part_file.write(member)
+                entry = {
+                    'search_key': key,
+                    'fetched_at': record['fetched_at'],
+                    'route': route,
+                    'outbound_date': record['params'].get('outbound_date'),
+                    'return_date': record['params'].get('return_date'),
+                    'part': os.path.basename(part),
+                    'offset': offset,
+                    'length': len(member),
+                    'min_price': lowest_price,
+                    'error': error,
+                }
+                index_file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                index_file.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(index_file, fcntl.LOCK_UN)
+        return entry
+
+    def _partitions(self, route: Optional[str], days: Optional[int]) -> Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        since = (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat() if days else None
+        for day in sorted(os.listdir(self.root)):
+            if since and day < since:
+                continue
+            day_dir = os.path.join(self.root, day)
+            if not os.path.isdir(day_dir):
+                continue
+            routes = [route.upper()] if route else sorted(os.listdir(day_dir))
+            for name in routes:
+                partition = os.path.join(day_dir, name)
+                if os.path.isdir(partition):
+                    yield partition
+
+    def iter_index(self, route: Optional[str] = None, days: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Strumieniowo iteruje po wpisach indeksu (bez otwierania plików z odpowiedziami)
+        """
+        for partition in self._partitions(route, days):
+            index_path = os.path.join(partition, INDEX_FILE)
+            if not os.path.exists(index_path):
+                continue
+            with open(index_path, encoding='utf-8') as index_file:
+                for line in index_file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entry['partition'] = partition
+                        yield entry
+
+    def iter_records(self, route: Optional[str] = None, days: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Strumieniowo iteruje po pełnych rekordach - dekompresja linia po linii, nie całych plików
+        """
+        for partition in self._partitions(route, days):
+            for name in sorted(os.listdir(partition)):
+                if not name.startswith('part-'):
+                    continue
+                with gzip.open(os.path.join(partition, name), 'rt', encoding='utf-8') as part_file:
+                    for line in part_file:
+                        if line.strip():
+                            yield json.loads(line)
+
+    def read(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Odczytuje pojedynczy rekord wskazany przez wpis indeksu
+        """
+        with open(os.path.join(entry['partition'], entry['part']), 'rb') as part_file:
+            part_file.seek(entry['offset'])
+            return json.loads(gzip.decompress(part_file.read(entry['length'])))
+
+    def find(self, key: str, route: Optional[str] = None, days: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Zwraca wpisy indeksu dla podanego klucza wyszukiwania
+        """
+        return [entry for entry in self.iter_index(route, days) if entry['search_key'] == key]
+
+    def lowest_price(self, route: str, days: int = 30, scan: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Najniższa cena zaobserwowana na trasie w ostatnich `days` dniach.
+        Domyślnie z indeksu; scan=True przelicza ceny z pełnych odpowiedzi.
+        """
+        best = None
+        if scan:
+            for record in self.iter_records(route, days):
+                price = min_price(record['response'])
+                if price is not None and (best is None or price < best['min_price']):
+                    best = {
+                        'search_key': record['search_key'],
+                        'fetched_at': record['fetched_at'],
+                        'outbound_date': record['params'].get('outbound_date'),
+                        'return_date': record['params'].get('return_date'),
+                        'min_price': price,
+                    }
+            return best
+
+        for entry in self.iter_index(route, days):
+            price = entry.get('min_price')
+            if price is not None and (best is None or price < best['min_price']):
+                best = entry
+        return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Archiwum odpowiedzi SerpAPI")
+    parser.add_argument('--root', default=None, help="Katalog archiwum")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    lowest_parser = subparsers.add_parser('lowest-price', help="Najniższa cena na trasie")
+    lowest_parser.add_argument('--route', required=True, help="Trasa, np. WRO-AAJ")
+    lowest_parser.add_argument('--days', type=int, default=30, help="Liczba ostatnich dni")
+    lowest_parser.add_argument('--scan', action='store_true', help="Przelicz ceny z pełnych odpowiedzi")
+
+    list_parser = subparsers.add_parser('list', help="Wypisz wpisy indeksu")
+    list_parser.add_argument('--route', default=None)
+    list_parser.add_argument('--days', type=int, default=None)
+
+    show_parser = subparsers.add_parser('show', help="Wypisz odpowiedzi dla klucza wyszukiwania")
+    show_parser.add_argument('search_key')
+    show_parser.add_argument('--route', default=None)
+    show_parser.add_argument('--days', type=int, default=None)
+
+    args = parser.parse_args(argv)
+    archive = ResponseArchive(args.root)
+
+    if args.command == 'lowest-price':
+        best = archive.lowest_price(args.route, args.days, scan=args.scan)
+        if best is None:
+            print(f"Brak cen dla trasy {args.route.upper()} w ostatnich {args.days} dniach")
+            return 1
+        print(f"Najniższa cena {args.route.upper()}: {best['min_price']} "
+              f"(wylot {best.get('outbound_date')}, powrót {best.get('return_date')}, pobrano {best['fetched_at']})")
+        return 0
+
+    if args.command == 'list':
+        for entry in archive.iter_index(args.route, args.days):
+            entry.pop('partition', None)
+            print(json.dumps(entry, ensure_ascii=False))
+        return 0
+
+    for entry in archive.find(args.search_key, args.route, args.days):
+        print(json.dumps(archive.read(entry), ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
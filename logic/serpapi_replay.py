@@ -0,0 +1,309 @@
+"""
+Tryb odtwarzania SerpAPI (engine google_flights) bez sieci i bez zużywania limitu zapytań.
+
+Odpowiedzi są budowane na podstawie nagranej odpowiedzi (domyślnie flights_dates.json),
+z deterministycznie generowanymi lotami zależnymi od trasy i dat:
+- każda trasa ma własny poziom cen, zestaw linii, liczbę wyników i udział przesiadek
+- część tras zwraca pustą odpowiedź (jak prawdziwe SerpAPI dla tras bez połączeń)
+- ceny zmieniają się w czasie (co SERPAPI_REPLAY_PRICE_PERIOD sekund)
+
+Użycie:
+    SERPAPI_MODE=replay                         - DataGrabber generuje odpowiedzi w procesie
+    python -m logic.serpapi_replay serve        - lokalny serwer HTTP zgodny z /search.json
+                                                  (SERPAPI_BASE_URL=http://127.0.0.1:8001/search.json)
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_RECORDING = os.path.join(PROJECT_ROOT, 'flights_dates.json')
+
+_AIRLINES = [
+    ('LOT', 'LO'), ('Lufthansa', 'LH'), ('Ryanair', 'FR'), ('Wizz Air', 'W6'), ('KLM', 'KL'),
+    ('Air France', 'AF'), ('Turkish Airlines', 'TK'), ('Emirates', 'EK'), ('Qatar Airways', 'QR'),
+    ('SAS', 'SK'), ('Swiss', 'LX'), ('Austrian', 'OS'), ('easyJet', 'U2'), ('Finnair', 'AY'),
+]
+_HUBS = ['WAW', 'FRA', 'MUC', 'AMS', 'CDG', 'IST', 'DOH', 'DXB', 'HEL', 'ZRH', 'VIE', 'CPH']
+_ERROR_STATUSES = (429, 500, 503)
+_NO_RESULTS_ERROR = "Google Flights hasn't returned any results for this query."
+
+
+def _seed(*parts: Any) -> int:
+    return int.from_bytes(hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).digest()[:8], 'big')
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class ReplaySource:
+    """
+    Generator odpowiedzi google_flights na podstawie nagrania
+    """
+
+    def __init__(self, recording_path: Optional[str] = None, error_rate: float = 0.0,
+                 no_results_rate: float = 0.1, price_period: float = 3600.0, seed: str = 'replay'):
+        recording_path = recording_path or DEFAULT_RECORDING
+        try:
+            with open(recording_path, encoding='utf-8') as file:
+                self.recording = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Ostrzeżenie: nie można wczytać nagrania {recording_path}: {e}")
+            self.recording = {}
+        self.error_rate = error_rate
+        self.no_results_rate = no_results_rate
+        self.price_period = max(1.0, price_period)
+        self.seed = seed
+        self._random = random.Random()
+
+    @classmethod
+    def from_env(cls) -> 'ReplaySource':
+        return cls(
+            recording_path=os.getenv('SERPAPI_REPLAY_FILE'),
+            error_rate=_env_float('SERPAPI_REPLAY_ERROR_RATE', 0.0),
+            no_results_rate=_env_float('SERPAPI_REPLAY_NO_RESULTS_RATE', 0.1),
+            price_period=_env_float('SERPAPI_REPLAY_PRICE_PERIOD', 3600.0),
+            seed=os.getenv('SERPAPI_REPLAY_SEED', 'replay'),
+        )
+
+    def _route_profile(self, departure: str, arrival: str) -> Dict[str, Any]:
+        """
+        Stałe cechy trasy: poziom cen, linie, liczba wyników, udział lotów z przesiadką
+        """
+        rng = random.Random(_seed(self.seed, 'route', departure, arrival))
+        has_results = rng.random() >= self.no_results_rate
+        return {
+            'has_results': has_results,
+            'base_price': rng.randint(150, 4000),
+            'airlines': rng.sample(_AIRLINES, rng.randint(1, 5)),
+            'results': rng.randint(2, 16) if has_results else 0,
+            'stop_share': rng.random(),
+            'duration': rng.randint(60, 900),
+        }
+
+    def _flight(self, rng: random.Random, departure: str, arrival: str, departure_at: datetime,
+                duration: int, airline: Tuple[str, str], travel_class: str) -> Dict[str, Any]:
+        arrival_at = departure_at + timedelta(minutes=duration)
+        return {
+            'departure_airport': {'name': departure, 'id': departure, 'time': departure_at.strftime('%Y-%m-%d %H:%M')},
+            'arrival_airport': {'name': arrival, 'id': arrival, 'time': arrival_at.strftime('%Y-%m-%d %H:%M')},
+            'duration': duration,
+            'airplane': rng.choice(['Airbus A320', 'Airbus A321neo', 'Boeing 737', 'Boeing 787', 'Embraer 195']),
+            'airline': airline[0],
+            'travel_class': travel_class,
+            'flight_number': f"{airline[1]} {rng.randint(100, 9999)}",
+            'legroom': f"{rng.randint(28, 34)} in",
+            'extensions': [],
+        }
+
+    def _flight_group(self, rng: random.Random, profile: Dict[str, Any], departure: str, arrival: str,
+                      outbound_date: datetime, price_factor: float, travel_class: str) -> Dict[str, Any]:
+        airline = rng.choice(profile['airlines'])
+        departure_at = outbound_date + timedelta(minutes=rng.randrange(5 * 60, 22 * 60, 5))
+        duration = max(45, int(profile['duration'] * rng.uniform(0.9, 1.2)))
+
+        if rng.random() < profile['stop_share']:
+            hub = rng.choice([hub for hub in _HUBS if hub not in (departure, arrival)])
+            first_leg = max(40, duration // 2)
+            layover = rng.randint(45, 300)
+            flights = [
+                self._flight(rng, departure, hub, departure_at, first_leg, airline, travel_class),
+                self._flight(rng, hub, arrival, departure_at + timedelta(minutes=first_leg + layover),
+                             duration - first_leg, airline, travel_class),
+            ]
+            layovers = [{'duration': layover, 'name': hub, 'id': hub}]
+            total_duration = duration + layover
+            stop_factor = 0.85
+        else:
+            flights = [self._flight(rng, departure, arrival, departure_at, duration, airline, travel_class)]
+            layovers = []
+            total_duration = duration
+            stop_factor = 1.0
+
+        return {
+            'flights': flights,
+            'layovers': layovers,
+            'total_duration': total_duration,
+            'carbon_emissions': {'this_flight': total_duration * rng.randint(900, 1300)},
+            'price': int(profile['base_price'] * price_factor * stop_factor * rng.uniform(0.8, 1.6)),
+            'type': 'Round trip',
+            'airline_logo': f"https://www.gstatic.com/flights/airline_logos/70px/{airline[1]}.png",
+            'departure_token': hashlib.sha1(f"{departure}{arrival}{departure_at}{rng.random()}".encode()).hexdigest(),
+        }
+
+    def synthesize(self, params: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Buduje odpowiedź dla parametrów zapytania (bez losowych błędów)
+        """
+        departure = str(params.get('departure_id') or '').upper()
+        arrival = str(params.get('arrival_id') or '').upper()
+        outbound = str(params.get('outbound_date') or '')
+        travel_class = str(params.get('travel_class') or '1')
+        now = time.time() if now is None else now
+
+        # Zapytanie zgodne z nagraniem zawierającym wyniki - zwracane jest nagranie bez zmian
+        recorded = self.recording.get('search_parameters', {})
+        if ('best_flights' in self.recording or 'other_flights' in self.recording) and (
+                str(recorded.get('departure_id', '')).upper(), str(recorded.get('arrival_id', '')).upper(),
+                recorded.get('outbound_date')) == (departure, arrival, outbound):
+            return copy.deepcopy(self.recording)
+
+        response = copy.deepcopy({key: value for key, value in self.recording.items()
+                                  if key not in ('best_flights', 'other_flights', 'price_insights', 'error')})
+        created_at = datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+        metadata = response.setdefault('search_metadata', {})
+        metadata.update({
+            'id': hashlib.sha1(f"{params}{now}".encode()).hexdigest()[:24],
+            'status': 'Success',
+            'created_at': created_at,
+            'processed_at': created_at,
+            'google_flights_url': f"https://www.google.com/travel/flights?hl=pl&q={departure}-{arrival}-{outbound}",
+            'total_time_taken': 0.0,
+        })
+        response['search_parameters'] = {key: value for key, value in params.items() if key != 'api_key'}
+
+        profile = self._route_profile(departure, arrival)
+        try:
+            outbound_date = datetime.strptime(outbound, '%Y-%m-%d')
+        except ValueError:
+            profile['has_results'] = False
+
+        if not profile['has_results']:
+            response['search_information'] = {'flights_results_state': 'Fully empty'}
+            response['error'] = _NO_RESULTS_ERROR
+            return response
+
+        # Ceny zależą od trasy, dat i okresu czasu - kolejne pobrania w tym samym okresie są identyczne
+        epoch = int(now // self.price_period)
+        rng = random.Random(_seed(self.seed, departure, arrival, outbound, params.get('return_date'), epoch))
+        price_factor = random.Random(_seed(self.seed, 'epoch', departure, arrival, epoch)).uniform(0.75, 1.25)
+
+        groups = [self._flight_group(rng, profile, departure, arrival, outbound_date, price_factor, travel_class)
+                  for _ in range(profile['results'])]
+        if str(params.get('type')) == '2':
+            for group in groups:
+                group['type'] = 'One way'
+                group['price'] = int(group['price'] * 0.55)
+        groups.sort(key=lambda group: group['price'])
+        best_count = min(len(groups), rng.randint(1, 3))
+        prices = [group['price'] for group in groups]
+
+        response['search_information'] = {'flights_results_state': 'Results'}
+        response['best_flights'] = groups[:best_count]
+        response['other_flights'] = groups[best_count:]
+        response['price_insights'] = {
+            'lowest_price': prices[0],
+            'price_level': rng.choice(['low', 'typical', 'high']),
+            'typical_price_range': [int(profile['base_price'] * 0.9), int(profile['base_price'] * 1.3)],
+        }
+        return response
+
+    def respond(self, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Zwraca (status HTTP, odpowiedź) z uwzględnieniem losowych błędów (error_rate)
+        """
+        if self.error_rate and self._random.random() < self.error_rate:
+            status = self._random.choice(_ERROR_STATUSES)
+            return status, {'error': f"Symulowany błąd SerpAPI (HTTP {status})"}
+        return 200, self.synthesize(params)
+
+
+async def serve(source: ReplaySource, host: str, port: int, latency_ms: float, jitter_ms: float) -> None:
+    """
+    Lokalny serwer zastępczy: GET /search.json (jak SerpAPI) oraz GET /stats
+    """
+    from aiohttp import web
+
+    stats = {'requests': 0, 'errors': 0, 'empty': 0}
+    rng = random.Random()
+
+    async def search(request: 'web.Request') -> 'web.Response':
+        stats['requests'] += 1
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+        params = dict(request.query)
+        if params.get('engine', 'google_flights') != 'google_flights':
+            stats['errors'] += 1
+            return web.json_response({'error': f"Nieobsługiwany engine: {params.get('engine')}"}, status=400)
+
+        status, body = source.respond(params)
+        if status != 200:
+            stats['errors'] += 1
+        elif 'error' in body:
+            stats['empty'] += 1
+        return web.json_response(body, status=status, dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    async def get_stats(request: 'web.Request') -> 'web.Response':
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get('/search.json', search)
+    app.router.add_get('/search', search)
+    app.router.add_get('/stats', get_stats)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serwer zastępczy SerpAPI: http://{host}:{port}/search.json "
+          f"(opóźnienie {latency_ms}±{jitter_ms} ms, błędy {source.error_rate:.0%}, "
+          f"trasy bez wyników {source.no_results_rate:.0%})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Odtwarzanie odpowiedzi SerpAPI (google_flights)")
+    parser.add_argument('--recording', default=None, help="Nagrana odpowiedź (domyślnie flights_dates.json)")
+    parser.add_argument('--error-rate', type=float, default=_env_float('SERPAPI_REPLAY_ERROR_RATE', 0.0))
+    parser.add_argument('--no-results-rate', type=float, default=_env_float('SERPAPI_REPLAY_NO_RESULTS_RATE', 0.1))
+    parser.add_argument('--price-period', type=float, default=_env_float('SERPAPI_REPLAY_PRICE_PERIOD', 3600.0))
+    parser.add_argument('--seed', default=os.getenv('SERPAPI_REPLAY_SEED', 'replay'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="Uruchom lokalny serwer zastępczy")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8001)
+    serve_parser.add_argument('--latency-ms', type=float, default=300.0, help="Średnie opóźnienie odpowiedzi")
+    serve_parser.add_argument('--jitter-ms', type=float, default=200.0, help="Rozrzut opóźnienia")
+
+    sample_parser = subparsers.add_parser('sample', help="Wypisz przykładową odpowiedź")
+    sample_parser.add_argument('--route', required=True, help="Trasa, np. WRO-AAJ")
+    sample_parser.add_argument('--outbound-date', required=True)
+    sample_parser.add_argument('--return-date', default=None)
+
+    args = parser.parse_args(argv)
+    source = ReplaySource(args.recording, error_rate=args.error_rate, no_results_rate=args.no_results_rate,
+                          price_period=args.price_period, seed=args.seed)
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(source, args.host, args.port, args.latency_ms, args.jitter_ms))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    departure, _, arrival = args.route.upper().partition('-')
+    params = {'engine': 'google_flights', 'departure_id': departure, 'arrival_id': arrival,
+              'outbound_date': args.outbound_date, 'return_date': args.return_date}
+    print(json.dumps(source.synthesize(params), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class CacheBackend(ABC):
+    """
+    Wspólny interfejs cache'u z ograniczonym rozmiarem (LRU), czasem życia wpisów (TTL)
+    i licznikami trafień/chybień.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 10000, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class MemoryCache(CacheBackend):
+    """
+    Cache w pamięci procesu (OrderedDict jako LRU), bezpieczny wątkowo
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 10000, ttl: Optional[float] = None):
+        super().__init__(namespace, max_entries, ttl)
+        self._entries: "OrderedDict[str, tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'namespace': self.namespace,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache współdzielony między procesami (np. workerami gunicorna) przez serwer zgodny z Redis.
+    TTL realizowany przez wygasanie kluczy, LRU przez sorted set z czasem ostatniego dostępu,
+    liczniki trafień/chybień trzymane w hashu, więc są wspólne dla wszystkich procesów.
+    Terminy wygaśnięcia trzymane są dodatkowo w osobnym sorted secie, żeby klucze wygasłe
+    przez TTL usuwać też z LRU - inaczej zawyżałyby rozmiar i zajmowały miejsce przy eksmisji.
+    """
+
+    def __init__(self, namespace: str, url: str, max_entries: int = 10000, ttl: Optional[float] = None):
+        super().__init__(namespace, max_entries, ttl)
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = f"cache:{namespace}:"
+        self._lru_key = f"cache:{namespace}:__lru__"
+        self._stats_key = f"cache:{namespace}:__stats__"
+        self._expiry_key = f"cache:{namespace}:__expiry__"
+
+    def _prune_expired(self) -> None:
+        """
+        Usuwa z LRU i z indeksu terminów wpisy, których klucze wygasły już przez TTL
+        """
+        expired = self._client.zrangebyscore(self._expiry_key, '-inf', time.time())
+        if expired:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.zrem(self._lru_key, *expired)
+            pipe.zrem(self._expiry_key, *expired)
+            pipe.execute()
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(self._prefix + key)
+        pipe = self._client.pipeline(transaction=False)
+        if raw is None:
+            pipe.hincrby(self._stats_key, 'misses', 1)
+            pipe.zrem(self._lru_key, key)
+            pipe.zrem(self._expiry_key, key)
+            pipe.execute()
+            return None
+
+        pipe.hincrby(self._stats_key, 'hits', 1)
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.execute()
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._prune_expired()
+        pipe = self._client.pipeline(transaction=False)
+        if ttl:
+            pipe.set(self._prefix + key, json.dumps(value), px=int(ttl * 1000))
+            pipe.zadd(self._expiry_key, {key: time.time() + ttl})
+        else:
+            pipe.set(self._prefix + key, json.dumps(value))
+            pipe.zrem(self._expiry_key, key)
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.zcard(self._lru_key)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = self._client.zpopmin(self._lru_key, overflow)
+            if evicted:
+                members = [member for member, _ in evicted]
+                pipe = self._client.pipeline(transaction=False)
+                pipe.delete(*[self._prefix + member.decode() for member in members])
+                pipe.zrem(self._expiry_key, *members)
+                pipe.hincrby(self._stats_key, 'evictions', len(evicted))
+                pipe.execute()
+
+    def delete(self, key: str) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(self._prefix + key)
+        pipe.zrem(self._lru_key, key)
+        pipe.zrem(self._expiry_key, key)
+        pipe.execute()
+
+    def clear(self) -> None:
+        keys = list(self._client.scan_iter(match=self._prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune_expired()
+        counters = {key.decode(): int(value) for key, value in self._client.hgetall(self._stats_key).items()}
+        return {
+            'backend': 'redis',
+            'namespace': self.namespace,
+            'size': self._client.zcard(self._lru_key),
+            'max_entries': self.max_entries,
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'evictions': counters.get('evictions', 0),
+        }
+
+
+_caches: Dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str, max_entries: int = 10000, ttl: Optional[float] = None) -> CacheBackend:
+    """
+    Zwraca cache dla danej przestrzeni nazw, współdzielony w obrębie procesu.
+
+    Backend wybierany zmienną CACHE_BACKEND:
+    - "memory" (domyślnie) - cache w pamięci procesu
+    - "redis" - cache współdzielony między procesami, adres z CACHE_URL
+    """
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            backend = os.getenv('CACHE_BACKEND', 'memory').lower()
+            if backend == 'redis':
+                url = os.getenv('CACHE_URL', 'redis://localhost:6379/0')
+                cache = RedisCache(namespace, url, max_entries=max_entries, ttl=ttl)
+            else:
+                cache = MemoryCache(namespace, max_entries=max_entries, ttl=ttl)
+            _caches[namespace] = cache
+        return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Zwraca statystyki wszystkich cache'y utworzonych w tym procesie
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.namespace: cache.stats() for cache in caches}
@@ -1,11 +1,47 @@
-from sqlalchemy import or_
-from datetime import datetime
+from sqlalchemy import and_, bindparam, delete, or_, select, true, update
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 # Importujemy centralny obiekt db, a nie tworzymy własnego silnika
 from services.db_instance import db
-from services.models import User, FlightPreference
+from services.models import User, FlightPreference, PriceBaseline, PriceHistory
 from services.schemas import FlightPreferences
 
+# Liczba identyfikatorów w jednej klauzuli IN przy operacjach wsadowych
+BULK_CHUNK = 500
+
+
+class BulkResult(NamedTuple):
+    """
+    Wynik operacji wsadowej: identyfikatory zapisanych preferencji oraz błędy poszczególnych wierszy
+    (klucz - ID preferencji, a przy dodawaniu pozycja wiersza na wejściu)
+    """
+    succeeded: List[int]
+    errors: Dict[int, str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(ids), BULK_CHUNK):
+        yield ids[start:start + BULK_CHUNK]
+
+
+def _price_data_deletes(preference_ids: List[int]):
+    """
+    Usunięcie historii cen i linii bazowych preferencji - w tej samej transakcji co preferencje
+    (klucze obce mają ON DELETE CASCADE, ale SQLite domyślnie ich nie egzekwuje)
+    """
+    for table in (PriceHistory.__table__, PriceBaseline.__table__):
+        yield delete(table).where(table.c.preference_id.in_(preference_ids))
+
+
 def create_tables(app):
     """Funkcja pomocnicza do tworzenia tabel w kontekście aplikacji."""
     with app.app_context():
@@ -31,8 +67,10 @@ class Database:
             user = db.session.query(User).filter(or_(*query_filter)).first()
 
             if user:
-                if email and not user.email: user.email = email
-                db.session.commit()
+                # Zapis tylko przy zmianie - sam odczyt istniejącego użytkownika nie wymaga COMMIT
+                if email and not user.email:
+                    user.email = email
+                    db.session.commit()
                 return user.user_id, True
             else:
                 new_user = User(email=email)
@@ -44,19 +82,24 @@ class Database:
             print(f"Błąd przy zapisie użytkownika: {e}")
             return None, False
 
+    @staticmethod
+    def _preference_row(user_id: int, flight_prefs: FlightPreferences) -> dict:
+        """Kolumny nowej preferencji lotu (ValueError przy niepoprawnej dacie)."""
+        return dict(
+            user_id=user_id,
+            target_departure=datetime.strptime(flight_prefs.target_departure, '%Y-%m-%d').date(),
+            return_date=datetime.strptime(flight_prefs.return_date, '%Y-%m-%d').date()
+            if flight_prefs.return_date else None,
+            departure_airport=flight_prefs.departure_airport, arrival_airport=flight_prefs.arrival_airport,
+            currency=flight_prefs.currency, seat_class=flight_prefs.seat_class,
+            max_price=flight_prefs.max_price, preferred_airline=flight_prefs.preferred_airline,
+            max_stops=flight_prefs.max_stops, flex_days=flight_prefs.flex_days
+        )
+
     def flight_preferences(self, user_id: int, flight_prefs: FlightPreferences) -> bool:
         """Zapisuje w bazie nowe preferencje lotu."""
         try:
-            dep_date = datetime.strptime(flight_prefs.target_departure, '%Y-%m-%d').date()
-            ret_date = datetime.strptime(flight_prefs.return_date, '%Y-%m-%d').date()
-
-            new_flight_pref = FlightPreference(
-                user_id=user_id,
-                target_departure=dep_date, return_date=ret_date,
-                departure_airport=flight_prefs.departure_airport, arrival_airport=flight_prefs.arrival_airport,
-                currency=flight_prefs.currency, seat_class=flight_prefs.seat_class,
-                max_price=flight_prefs.max_price, preferred_airline=flight_prefs.preferred_airline
-            )
+            new_flight_pref = FlightPreference(**self._preference_row(user_id, flight_prefs))
             db.session.add(new_flight_pref)
             db.session.commit()
             return True
@@ -68,6 +111,8 @@ class Database:
     def delete_flight_preference(self, preference: FlightPreference) -> bool:
         """Usuwa podaną preferencję lotu z bazy danych."""
         try:
+            for statement in _price_data_deletes([preference.preference_id]):
+                db.session.execute(statement)
             db.session.delete(preference)
             db.session.commit()
             return True
@@ -75,3 +120,121 @@ class Database:
             db.session.rollback()
             print(f"Błąd przy usuwaniu preferencji lotu: {e}")
             return False
+
+    def add_flight_preferences(self, entries: Iterable[Tuple[int, FlightPreferences]]) -> BulkResult:
+        """
+        Zapisuje wiele preferencji lotu (pary: ID użytkownika, preferencje) jednym wsadowym INSERT-em
+        w jednej transakcji. Gdy baza odrzuci wsad, wiersze są wstawiane pojedynczo (każdy we własnym
+        SAVEPOINT), żeby zapisać poprawne i wskazać błędne. Błędy są kluczowane pozycją wiersza na wejściu.
+        """
+        rows, positions, errors = [], [], {}
+        for position, (user_id, flight_prefs) in enumerate(entries):
+            try:
+                rows.append(self._preference_row(user_id, flight_prefs))
+                positions.append(position)
+            except (TypeError, ValueError) as e:
+                errors[position] = f"Niepoprawne dane preferencji: {e}"
+        if not rows:
+            return BulkResult([], errors)
+
+        table = FlightPreference.__table__
+        statement = table.insert().returning(table.c.preference_id, sort_by_parameter_order=True)
+        try:
+            with db.engine.begin() as connection:
+                return BulkResult(connection.execute(statement, rows).scalars().all(), errors)
+        except Exception as e:
+            print(f"Wsadowy zapis preferencji lotu odrzucony ({getattr(e, 'orig', None) or e}) - zapisuję wiersze pojedynczo.")
+
+        succeeded = []
+        try:
+            with db.engine.begin() as connection:
+                for position, row in zip(positions, rows):
+                    try:
+                        with connection.begin_nested():
+                            succeeded.append(connection.execute(statement, row).scalar_one())
+                    except Exception as e:
+                        errors[position] = str(getattr(e, 'orig', None) or e)
+        except Exception as e:
+            print(f"Błąd przy zapisie preferencji lotu: {e}")
+            errors.update((position, str(e)) for position in positions if position not in errors)
+            return BulkResult([], errors)
+        return BulkResult(succeeded, errors)
+
+    def delete_flight_preferences(self, preference_ids: Iterable[int]) -> BulkResult:
+        """
+        Usuwa wiele preferencji lotu (np. po wysłaniu powiadomień) w jednej transakcji -
+        jedno zapytanie DELETE na każde BULK_CHUNK identyfikatorów zamiast DELETE i COMMIT na wiersz.
+        Razem z preferencjami usuwane są ich historia cen i linie bazowe.
+        """
+        ids = list(dict.fromkeys(preference_ids))
+        if not ids:
+            return BulkResult([], {})
+        table = FlightPreference.__table__
+        deleted = set()
+        try:
+            with db.engine.begin() as connection:
+                for chunk in _chunks(ids):
+                    deleted.update(connection.execute(
+                        select(table.c.preference_id).where(table.c.preference_id.in_(chunk)).with_for_update()
+                    ).scalars())
+                    for statement in _price_data_deletes(chunk):
+                        connection.execute(statement)
+                    connection.execute(delete(table).where(table.c.preference_id.in_(chunk)))
+        except Exception as e:
+            print(f"Błąd przy usuwaniu preferencji lotu: {e}")
+            return BulkResult([], {preference_id: str(e) for preference_id in ids})
+        return BulkResult(
+            [preference_id for preference_id in ids if preference_id in deleted],
+            {preference_id: "Nie znaleziono preferencji" for preference_id in ids if preference_id not in deleted},
+        )
+
+    def record_check_results(self, checked: Dict[int, datetime], failed: Dict[int, datetime],
+                             checked_at: Optional[datetime] = None,
+                             claimed_by: Optional[str] = None) -> BulkResult:
+        """
+        Zapisuje wyniki sprawdzeń wielu preferencji w jednej transakcji i zwalnia ich dzierżawy
+
+        Args:
+            checked: preferencje sprawdzone -> termin kolejnego sprawdzenia
+            failed: preferencje, których nie udało się sprawdzić -> termin ponownej próby
+            claimed_by: zapisuje tylko preferencje z dzierżawą tego workera
+        """
+        ids = list(checked) + [preference_id for preference_id in failed if preference_id not in checked]
+        if not ids:
+            return BulkResult([], {})
+        checked_at = checked_at or _utcnow()
+        table = FlightPreference.__table__
+        owned = table.c.claimed_by == claimed_by if claimed_by else true()
+        try:
+            with db.engine.begin() as connection:
+                # Wiersze, które nadal istnieją (i należą do workera) - pozostałe są zgłaszane jako błędy
+                present = set()
+                for chunk in _chunks(ids):
+                    present.update(connection.execute(
+                        select(table.c.preference_id).where(table.c.preference_id.in_(chunk), owned)
+                    ).scalars())
+                target = and_(table.c.preference_id == bindparam('b_id'), owned)
+
+                checked_rows = [{'b_id': preference_id, 'b_next': next_check}
+                                for preference_id, next_check in checked.items() if preference_id in present]
+                if checked_rows:
+                    connection.execute(update(table).where(target).values(
+                        next_check_at=bindparam('b_next'), last_checked_at=checked_at, check_failures=0,
+                        claimed_by=None, claimed_until=None,
+                    ), checked_rows)
+                failed_rows = [{'b_id': preference_id, 'b_next': next_check}
+                               for preference_id, next_check in failed.items()
+                               if preference_id in present and preference_id not in checked]
+                if failed_rows:
+                    connection.execute(update(table).where(target).values(
+                        next_check_at=bindparam('b_next'), check_failures=table.c.check_failures + 1,
+                        claimed_by=None, claimed_until=None,
+                    ), failed_rows)
+        except Exception as e:
+            print(f"Błąd przy zapisie wyników sprawdzeń: {e}")
+            return BulkResult([], {preference_id: str(e) for preference_id in ids})
+        missing = "Nie znaleziono preferencji" + (f" z dzierżawą workera {claimed_by}" if claimed_by else "")
+        return BulkResult(
+            [preference_id for preference_id in ids if preference_id in present],
+            {preference_id: missing for preference_id in ids if preference_id not in present},
+        )
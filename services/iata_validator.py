@@ -0,0 +1,136 @@
+from typing import Iterable, List, Optional, Set
+import threading
+
+# Liczba wszystkich możliwych kodów AAA-ZZZ - kod IATA mapowany jest bezkolizyjnie na indeks w tej tablicy
+_CODE_SPACE = 26 ** 3
+
+
+def _code_slot(code: str) -> int:
+    """
+    Doskonała funkcja skrótu dla kodu IATA: "AAA" -> 0, "ZZZ" -> 17575
+    """
+    return (ord(code[0]) - 65) * 676 + (ord(code[1]) - 65) * 26 + (ord(code[2]) - 65)
+
+
+class IataValidator:
+    """
+    Walidacja kodów IATA w O(1): bitmapa wszystkich 17 576 możliwych kodów, ładowana raz na proces
+    ze snapshotu danych lotnisk (airportfinder + airports-py).
+    """
+
+    def __init__(self, codes: Iterable[str]):
+        self.codes = frozenset(code.upper() for code in codes if self._well_formed(code.upper()))
+        self._table = bytearray(_CODE_SPACE)
+        for code in self.codes:
+            self._table[_code_slot(code)] = 1
+        self._numpy_table = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @staticmethod
+    def _well_formed(code: str) -> bool:
+        return len(code) == 3 and code.isascii() and code.isalpha()
+
+    def is_valid(self, code: str) -> bool:
+        """
+        Sprawdza, czy kod (po normalizacji) jest znanym kodem IATA
+        """
+        if not code:
+            return False
+        code = code.strip().upper()
+        return self._well_formed(code) and self._table[_code_slot(code)] == 1
+
+    def validate_many(self, codes: List[str]) -> List[bool]:
+        """
+        Wsadowa walidacja wielu kodów. Z NumPy sprawdzenie przynależności jest wektorowe
+        (jedno indeksowanie tablicy dla wszystkich kodów), bez NumPy - pętla po bitmapie.
+        """
+        normalized = [(code or '').strip().upper() for code in codes]
+        try:
+            import numpy as np
+        except ImportError:
+            return [self._well_formed(code) and self._table[_code_slot(code)] == 1 for code in normalized]
+
+        if not normalized:
+            return []
+        if self._numpy_table is None:
+            self._numpy_table = np.frombuffer(bytes(self._table), dtype=np.uint8).astype(bool)
+
+        well_formed = np.fromiter((self._well_formed(code) for code in normalized), dtype=bool, count=len(normalized))
+        raw = ''.join(code if ok else 'AAA' for code, ok in zip(normalized, well_formed))
+        letters = np.frombuffer(raw.encode('ascii'), dtype=np.uint8).reshape(-1, 3).astype(np.int32) - 65
+        slots = letters[:, 0] * 676 + letters[:, 1] * 26 + letters[:, 2]
+        return (self._numpy_table[slots] & well_formed).tolist()
+
+    def invalid_codes(self, codes: Iterable[str]) -> Set[str]:
+        """
+        Zwraca zbiór kodów, które nie są poprawnymi kodami IATA
+        """
+        codes = list(codes)
+        return {code for code, valid in zip(codes, self.validate_many(codes)) if not valid}
+
+
+_validator: Optional[IataValidator] = None
+_validator_loaded = False
+_validator_lock = threading.Lock()
+
+
+def _load_codes() -> Optional[List[str]]:
+    """
+    Ładuje listę kodów IATA ze snapshotu, a gdy go nie ma - bezpośrednio z airports-py
+    """
+    try:
+        from logic.airport_snapshot import load_snapshot
+        snapshot = load_snapshot()
+        if snapshot is not None:
+            return list(snapshot.iter_valid_codes())
+    except ImportError:
+        pass
+
+    try:
+        from airports import airport_data
+        return [airport['iata'] for airport in airport_data.airports if isinstance(airport.get('iata'), str)]
+    except ImportError:
+        return None
+
+
+def get_iata_validator() -> Optional[IataValidator]:
+    """
+    Zwraca walidator współdzielony w obrębie procesu lub None, gdy dane lotnisk są niedostępne
+    """
+    global _validator, _validator_loaded
+    if not _validator_loaded:
+        with _validator_lock:
+            if not _validator_loaded:
+                codes = _load_codes()
+                _validator = IataValidator(codes) if codes else None
+                _validator_loaded = True
+    return _validator
+
+
+def validate_airport_code(v: str) -> str:
+    """
+    Wspólna walidacja kodu lotniska dla schematów Pydantic.
+    Zwraca znormalizowany kod lub rzuca ValueError.
+    """
+    if not v:
+        raise ValueError("Kod lotniska nie może być pusty")
+
+    v = v.strip().upper()
+
+    if len(v) != 3:
+        raise ValueError("Kod IATA musi mieć dokładnie 3 znaki")
+
+    if not v.isalpha():
+        raise ValueError("Kod IATA może zawierać tylko litery")
+
+    validator = get_iata_validator()
+    if validator is None:
+        print("Ostrzeżenie: dane lotnisk nie są dostępne, pomijam walidację IATA")
+        return v
+
+    if not validator.is_valid(v):
+        raise ValueError(f"Nieznany kod lotniska IATA: {v}")
+
+    return v
@@ -0,0 +1,164 @@
+import os
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, Union
+
+# Granice kubełków histogramu czasów (w milisekundach)
+TIMING_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_logging_configured = False
+_logging_lock = threading.Lock()
+
+
+def configure_logging() -> None:
+    """
+    Konfiguruje logowanie aplikacji raz na proces. Poziom z LOG_LEVEL (domyślnie INFO).
+    """
+    global _logging_configured
+    with _logging_lock:
+        if _logging_configured:
+            return
+        logging.basicConfig(
+            level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+            format='%(asctime)s %(levelname)s %(name)s [%(process)d]: %(message)s',
+        )
+        _logging_configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
+
+
+class SampledLogger:
+    """
+    Logger dla gorących ścieżek: komunikaty DEBUG/INFO są próbkowane (sample_rate),
+    ostrzeżenia i błędy zawsze trafiają do logów. Argumenty są formatowane leniwie
+    dopiero po decyzji o zapisaniu komunikatu.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_rate: float = 1.0):
+        self.logger = logger
+        self.sample_rate = sample_rate
+
+    def _sampled(self, level: int) -> bool:
+        if not self.logger.isEnabledFor(level):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def debug(self, message: str, *args) -> None:
+        if self._sampled(logging.DEBUG):
+            self.logger.debug(message, *args)
+
+    def info(self, message: str, *args) -> None:
+        if self._sampled(logging.INFO):
+            self.logger.info(message, *args)
+
+    def warning(self, message: str, *args) -> None:
+        self.logger.warning(message, *args)
+
+    def error(self, message: str, *args, exc_info: bool = False) -> None:
+        self.logger.error(message, *args, exc_info=exc_info)
+
+    def exception(self, message: str, *args) -> None:
+        self.logger.exception(message, *args)
+
+
+def get_sampled_logger(name: str, env_var: str = 'LOG_SAMPLE_RATE', default_rate: float = 0.01) -> SampledLogger:
+    """
+    Zwraca logger z próbkowaniem; częstotliwość próbkowania z podanej zmiennej środowiskowej
+    """
+    try:
+        rate = float(os.getenv(env_var, default_rate))
+    except ValueError:
+        rate = default_rate
+    return SampledLogger(get_logger(name), sample_rate=rate)
+
+
+class StageTimings:
+    """
+    Zbiera czasy wykonania poszczególnych etapów (liczba, suma, maksimum, histogram)
+    w pamięci procesu. Bezpieczne wątkowo, koszt zapisu O(log liczby kubełków).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        elapsed_ms = seconds * 1000
+        bucket = bisect_left(TIMING_BUCKETS_MS, elapsed_ms)
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                         'buckets': [0] * (len(TIMING_BUCKETS_MS) + 1)}
+                self._stages[stage] = stats
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['buckets'][bucket] += 1
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Mierzy czas bloku kodu: with timings.stage('index_lookup'): ...
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    @staticmethod
+    def _percentile(buckets, count: int, fraction: float) -> Union[float, str, None]:
+        """
+        Górna granica kubełka z percentylem; powyżej ostatniej granicy napis ">5000"
+        (nieskończoność nie ma reprezentacji w JSON)
+        """
+        if not count:
+            return None
+        threshold = fraction * count
+        seen = 0
+        for position, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= threshold:
+                if position < len(TIMING_BUCKETS_MS):
+                    return TIMING_BUCKETS_MS[position]
+                return f">{TIMING_BUCKETS_MS[-1]}"
+        return None
+
+    def export(self) -> Dict[str, Any]:
+        """
+        Eksportuje statystyki etapów (percentyle jako górne granice kubełków histogramu)
+        """
+        with self._lock:
+            stages = {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self._stages.items()}
+
+        exported = {}
+        for stage, stats in stages.items():
+            count = stats['count']
+            exported[stage] = {
+                'count': count,
+                'total_ms': round(stats['total_ms'], 3),
+                'avg_ms': round(stats['total_ms'] / count, 3) if count else 0.0,
+                'max_ms': round(stats['max_ms'], 3),
+                'p50_ms': self._percentile(stats['buckets'], count, 0.5),
+                'p95_ms': self._percentile(stats['buckets'], count, 0.95),
+                'p99_ms': self._percentile(stats['buckets'], count, 0.99),
+                'histogram': dict(zip([f"<={bound}" for bound in TIMING_BUCKETS_MS] + ['>max'], stats['buckets'])),
+            }
+        return {'name': self.name, 'stages': exported}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+# Czasy etapów wyszukiwania lotnisk: translate, cache, index_lookup, format, sort, total
+airport_search_timings = StageTimings('airport_search')
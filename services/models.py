@@ -19,4 +19,56 @@ class FlightPreference(db.Model):
     seat_class = db.Column(db.String(20), nullable=False)
     max_price = db.Column(db.Float, nullable=True)
     preferred_airline = db.Column(db.String(100), nullable=True)
+    max_stops = db.Column(db.SmallInteger, nullable=True)
+    flex_days = db.Column(db.SmallInteger, nullable=False, default=0, server_default='0')
+    # Dzierżawa preferencji przejętej przez proces workera (services/preference_claims.py)
+    claimed_by = db.Column(db.String(64), nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True, index=True)
+    # Harmonogram sprawdzeń (UTC): preferencja jest sprawdzana, gdy next_check_at minie (NULL - od razu)
+    next_check_at = db.Column(db.DateTime, nullable=True, index=True)
+    last_checked_at = db.Column(db.DateTime, nullable=True)
+    check_failures = db.Column(db.SmallInteger, nullable=False, default=0, server_default='0')
     user = db.relationship("User", back_populates="flight_preferences")
+
+class SearchResponseCache(db.Model):
+    __tablename__ = 'serpapi_response_cache'
+    search_key = db.Column(db.String(64), primary_key=True)
+    params = db.Column(db.JSON, nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    stale_until = db.Column(db.DateTime, nullable=False, index=True)
+
+class PriceHistory(db.Model):
+    __tablename__ = 'price_history'
+    __table_args__ = (
+        db.Index('ix_price_history_preference_checked', 'preference_id', 'checked_at'),
+        db.Index('ix_price_history_route_checked', 'route', 'checked_at'),
+    )
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    preference_id = db.Column(db.Integer, db.ForeignKey('flight_preferences.preference_id', ondelete='CASCADE'),
+                              nullable=False)
+    route = db.Column(db.String(9), nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False)
+    min_price = db.Column(db.Float, nullable=True)
+    observed_price = db.Column(db.Float, nullable=True)
+    matched_price = db.Column(db.Float, nullable=True)
+    airline = db.Column(db.String(100), nullable=True)
+    stops = db.Column(db.SmallInteger, nullable=True)
+    options = db.Column(db.SmallInteger, nullable=False, default=0)
+
+class PriceBaseline(db.Model):
+    __tablename__ = 'price_baselines'
+    preference_id = db.Column(db.Integer, db.ForeignKey('flight_preferences.preference_id', ondelete='CASCADE'),
+                              primary_key=True)
+    mean = db.Column(db.Float, nullable=False)
+    variance = db.Column(db.Float, nullable=False, default=0.0)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    last_alert_price = db.Column(db.Float, nullable=True)
+    last_alert_at = db.Column(db.DateTime, nullable=True)
+
+class SerpApiUsage(db.Model):
+    __tablename__ = 'serpapi_usage'
+    day = db.Column(db.Date, primary_key=True)
+    calls = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,219 @@
+"""
+Rozdział preferencji między wiele procesów workera (również na różnych maszynach).
+
+Worker przejmuje preferencje partiami: SELECT ... FOR UPDATE SKIP LOCKED wybiera wiersze, na które
+przyszła kolej (next_check_at), bez ważnej dzierżawy (claimed_until), pomijając wiersze blokowane
+w tej chwili przez inny proces, a UPDATE w tej samej transakcji zapisuje identyfikator workera i czas
+wygaśnięcia dzierżawy. Przejęte wiersze nie trafią do innego workera, dopóki dzierżawa jest ważna -
+wątek heartbeat przedłuża ją w trakcie przebiegu, a po sprawdzeniu partii jest zwalniana razem
+z zapisem kolejnego terminu (complete). Dzierżawa workera, który uległ awarii, wygasa po
+WORKER_LEASE_SECONDS i niesprawdzone wiersze są przejmowane ponownie - sprawdzone wcześniej partie
+mają już nowe terminy, więc praca jest wznawiana od miejsca przerwania.
+
+Partie są uzupełniane do całych grup wyszukiwania, więc identyczne wyszukiwania trafiają do jednego
+workera (jedno zapytanie do SerpAPI). Bazy bez SKIP LOCKED (SQLite) pomijają klauzulę blokady -
+wystarcza to dla pojedynczego workera.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select, tuple_, update
+
+from services.database import BulkResult, Database
+from services.db_instance import db
+from services.models import FlightPreference
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PreferenceClaims:
+    """
+    Dzierżawy preferencji przejętych przez jeden proces workera
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, lease_seconds: int = 600, batch_size: int = 500):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = timedelta(seconds=max(30, lease_seconds))
+        self.batch_size = max(1, batch_size)
+
+    @classmethod
+    def from_env(cls) -> 'PreferenceClaims':
+        return cls(
+            worker_id=os.getenv('WORKER_ID') or None,
+            lease_seconds=_env_int('WORKER_LEASE_SECONDS', 600),
+            batch_size=_env_int('WORKER_CLAIM_BATCH', 500),
+        )
+
+    def claim_batch(self, today: Optional[date] = None, now: Optional[datetime] = None) -> List[int]:
+        """
+        Przejmuje kolejną partię preferencji do sprawdzenia (z datą wylotu od dziś, bez ważnej dzierżawy
+        i z minionym next_check_at - najpierw najbardziej zaległe) i zwraca ich identyfikatory.
+
+        Partia jest uzupełniana o pozostałe wolne preferencje tych samych grup wyszukiwania, także
+        te, na które jeszcze nie przyszła kolej - jedno zapytanie obsługuje całą grupę, a terminy
+        sprawdzeń jej członków się wyrównują.
+        """
+        today = today or date.today()
+        now = now or _utcnow()
+        table = FlightPreference.__table__
+        search_columns = [table.c.departure_airport, table.c.arrival_airport, table.c.target_departure,
+                          table.c.return_date, table.c.currency, table.c.seat_class, table.c.flex_days]
+        available = and_(
+            table.c.target_departure >= today,
+            or_(table.c.claimed_until.is_(None), table.c.claimed_until < now),
+        )
+        due = or_(table.c.next_check_at.is_(None), table.c.next_check_at <= now)
+
+        with db.engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.preference_id, *search_columns)
+                .where(available, due)
+                .order_by(table.c.next_check_at.asc().nulls_first(), table.c.preference_id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                return []
+            ids = [row.preference_id for row in rows]
+
+            groups = list({tuple(row[1:]) for row in rows})
+            for start in range(0, len(groups), 500):
+                ids += connection.execute(
+                    select(table.c.preference_id)
+                    .where(available, table.c.preference_id.not_in(ids),
+                           tuple_(*search_columns).in_(groups[start:start + 500]))
+                    .with_for_update(skip_locked=True)
+                ).scalars().all()
+
+            connection.execute(
+                update(table).where(table.c.preference_id.in_(ids))
+                .values(claimed_by=self.worker_id, claimed_until=now + self.lease)
+            )
+        return ids
+
+    def complete(self, checked: Dict[int, datetime], failed: Dict[int, datetime],
+                 checked_at: Optional[datetime] = None) -> BulkResult:
+        """
+        Zapisuje wyniki sprawdzeń i zwalnia dzierżawy w jednej transakcji (tylko wiersze tego workera)
+
+        Args:
+            checked: preferencje sprawdzone -> termin kolejnego sprawdzenia
+            failed: preferencje, których nie udało się sprawdzić -> termin ponownej próby
+        """
+        return Database().record_check_results(checked, failed, checked_at, claimed_by=self.worker_id)
+
+    def heartbeat(self) -> int:
+        """
+        Przedłuża wszystkie dzierżawy tego workera; zwraca liczbę przedłużonych
+        """
+        table = FlightPreference.__table__
+        with db.engine.begin() as connection:
+            return connection.execute(
+                update(table).where(table.c.claimed_by == self.worker_id, table.c.claimed_until.is_not(None))
+                .values(claimed_until=_utcnow() + self.lease)
+            ).rowcount
+
+    def release(self, ids: Optional[List[int]] = None) -> int:
+        """
+        Zwalnia dzierżawy tego workera (wskazane lub wszystkie)
+        """
+        table = FlightPreference.__table__
+        statement = update(table).where(table.c.claimed_by == self.worker_id)
+        if ids is not None:
+            if not ids:
+                return 0
+            statement = statement.where(table.c.preference_id.in_(ids))
+        with db.engine.begin() as connection:
+            return connection.execute(statement.values(claimed_by=None, claimed_until=None)).rowcount
+
+    @staticmethod
+    def status() -> Dict[str, Dict[str, Any]]:
+        """
+        Liczba dzierżaw i najbliższe wygaśnięcie dla każdego workera
+        """
+        table = FlightPreference.__table__
+        now = _utcnow()
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.claimed_by, func.count(), func.min(table.c.claimed_until), func.max(table.c.claimed_until))
+                .where(table.c.claimed_by.is_not(None))
+                .group_by(table.c.claimed_by)
+            ).all()
+        return {
+            worker: {
+                'claimed': count,
+                'expires_at': str(earliest),
+                'expired': latest is not None and latest < now,
+            }
+            for worker, count, earliest, latest in rows
+        }
+
+    @contextmanager
+    def keep_alive(self) -> Iterator[None]:
+        """
+        Wątek heartbeat przedłużający dzierżawy co 1/3 ich długości; na koniec dzierżawy są zwalniane
+        """
+        app = current_app._get_current_object()
+        stop = threading.Event()
+
+        def beat():
+            with app.app_context():
+                while not stop.wait(self.lease.total_seconds() / 3):
+                    try:
+                        self.heartbeat()
+                    except Exception:
+                        logger.exception("Błąd przedłużania dzierżaw preferencji")
+
+        thread = threading.Thread(target=beat, name="claims-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            try:
+                self.release()
+            except Exception:
+                logger.exception("Błąd zwalniania dzierżaw preferencji")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Dzierżawy preferencji przejętych przez workery")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Dzierżawy według workera")
+    release_parser = subparsers.add_parser('release', help="Zwolnij dzierżawy workera (np. po awarii)")
+    release_parser.add_argument('worker_id')
+    args = parser.parse_args(argv)
+
+    from app import app
+    with app.app_context():
+        if args.command == 'status':
+            print(json.dumps(PreferenceClaims.status(), indent=2, ensure_ascii=False))
+        else:
+            released = PreferenceClaims(args.worker_id).release()
+            print(f"Zwolniono {released} dzierżaw workera {args.worker_id}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
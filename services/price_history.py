@@ -0,0 +1,196 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import math
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from logic.price_drop import PriceDropDetector
+from services.db_instance import db
+from services.models import FlightPreference, PriceBaseline, PriceHistory
+
+
+# Liczba identyfikatorów w jednym zapytaniu o linie bazowe
+VOLATILITY_CHUNK = 500
+
+
+class PriceObservation(NamedTuple):
+    preference_id: int
+    route: str
+    min_price: Optional[float]
+    observed_price: Optional[float]
+    matched_price: Optional[float] = None
+    airline: Optional[str] = None
+    stops: Optional[int] = None
+    options: int = 0
+
+
+class PriceDrop(NamedTuple):
+    preference_id: int
+    price: float
+    baseline: float
+    drop: float
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PriceHistoryStore:
+    """
+    Historia cen w bazie (tabela price_history, tylko dopisywanie) oraz kroczące linie bazowe
+    (tabela price_baselines, jeden wiersz na preferencję).
+
+    Obserwacje z całego przebiegu workera zapisywane są jednym wsadowym INSERT-em, a linie bazowe
+    aktualizowane wektorowo (PriceDropDetector) - koszt nie zależy od długości historii.
+    """
+
+    def __init__(self, detector: Optional[PriceDropDetector] = None):
+        self.detector = detector or PriceDropDetector.from_env()
+
+    def record(self, observations: Iterable[PriceObservation],
+               checked_at: Optional[datetime] = None) -> List[PriceDrop]:
+        """
+        Zapisuje obserwacje, aktualizuje linie bazowe i zwraca wykryte spadki cen.
+        Obserwacje preferencji usuniętych w międzyczasie (np. po powiadomieniu) są pomijane.
+        """
+        observations = list(observations)
+        if not observations:
+            return []
+        checked_at = checked_at or _utcnow()
+
+        history = PriceHistory.__table__
+        baselines = PriceBaseline.__table__
+        preferences = FlightPreference.__table__
+
+        with db.engine.begin() as connection:
+            existing = set(connection.execute(
+                select(preferences.c.preference_id).where(
+                    preferences.c.preference_id.in_({observation.preference_id for observation in observations}))
+            ).scalars())
+            observations = [observation for observation in observations if observation.preference_id in existing]
+            if not observations:
+                return []
+            ids = [observation.preference_id for observation in observations]
+
+            connection.execute(history.insert(), [
+                {
+                    'preference_id': observation.preference_id,
+                    'route': observation.route,
+                    'checked_at': checked_at,
+                    'min_price': observation.min_price,
+                    'observed_price': observation.observed_price,
+                    'matched_price': observation.matched_price,
+                    'airline': (observation.airline or None) and observation.airline[:100],
+                    'stops': observation.stops,
+                    'options': observation.options,
+                }
+                for observation in observations
+            ])
+
+            current = {
+                row.preference_id: row for row in connection.execute(
+                    select(baselines).where(baselines.c.preference_id.in_(set(ids)))
+                )
+            }
+
+            # Jedna obserwacja na preferencję (przy duplikatach liczy się ostatnia)
+            latest = {observation.preference_id: observation for observation in observations}
+            ids = list(latest)
+            rows = [current.get(preference_id) for preference_id in ids]
+            price = np.array([latest[preference_id].observed_price if latest[preference_id].observed_price is not None
+                              else np.nan for preference_id in ids], dtype=np.float64)
+            mean = np.array([row.mean if row else np.nan for row in rows], dtype=np.float64)
+            variance = np.array([row.variance if row else 0.0 for row in rows], dtype=np.float64)
+            samples = np.array([row.samples if row else 0 for row in rows], dtype=np.int64)
+            last_alert = np.array([row.last_alert_price if row and row.last_alert_price is not None else np.nan
+                                   for row in rows], dtype=np.float64)
+
+            update = self.detector.update(price, mean, variance, samples, last_alert)
+
+            values = []
+            drops = []
+            for position, preference_id in enumerate(ids):
+                if update.samples[position] == 0:
+                    continue
+                row = rows[position]
+                alert = bool(update.alerts[position])
+                last_alert_price = row.last_alert_price if row else None
+                last_alert_at = row.last_alert_at if row else None
+                # Po powrocie ceny powyżej linii bazowej kolejny spadek może znów wywołać alert
+                if not alert and not np.isnan(price[position]) and price[position] >= update.mean[position]:
+                    last_alert_price = last_alert_at = None
+                values.append({
+                    'preference_id': preference_id,
+                    'mean': float(update.mean[position]),
+                    'variance': float(update.variance[position]),
+                    'samples': int(update.samples[position]),
+                    'updated_at': checked_at,
+                    'last_alert_price': float(price[position]) if alert else last_alert_price,
+                    'last_alert_at': checked_at if alert else last_alert_at,
+                })
+                if alert:
+                    drops.append(PriceDrop(preference_id, float(price[position]), float(mean[position]),
+                                           float(update.drop[position])))
+
+            if values:
+                if connection.dialect.name == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+                    statement = insert(baselines)
+                    connection.execute(statement.on_conflict_do_update(
+                        index_elements=[baselines.c.preference_id],
+                        set_={key: statement.excluded[key] for key in values[0] if key != 'preference_id'},
+                    ), values)
+                else:
+                    connection.execute(delete(baselines).where(
+                        baselines.c.preference_id.in_([value['preference_id'] for value in values])))
+                    connection.execute(baselines.insert(), values)
+
+        return drops
+
+    def purge_history(self, older_than: datetime) -> int:
+        """
+        Usuwa obserwacje sprzed older_than (retencja historii cen). Linie bazowe są kroczące,
+        więc nie zależą od usuwanych wierszy. Zwraca liczbę usuniętych obserwacji.
+        """
+        history = PriceHistory.__table__
+        with db.engine.begin() as connection:
+            result = connection.execute(delete(history).where(history.c.checked_at < older_than))
+        return result.rowcount
+
+    def series(self, preference_id: int, since: Optional[datetime] = None):
+        """
+        Historia cen preferencji jako tablice NumPy (czasy, ceny obserwowane)
+        """
+        history = PriceHistory.__table__
+        query = select(history.c.checked_at, history.c.observed_price).where(
+            history.c.preference_id == preference_id).order_by(history.c.checked_at)
+        if since is not None:
+            query = query.where(history.c.checked_at >= since)
+        with db.engine.connect() as connection:
+            rows = connection.execute(query).all()
+        times = np.array([row.checked_at for row in rows], dtype='datetime64[s]')
+        prices = np.array([row.observed_price if row.observed_price is not None else np.nan for row in rows],
+                          dtype=np.float64)
+        return times, prices
+
+    def preference_volatility(self, preference_ids: Iterable[int]) -> Dict[int, float]:
+        """
+        Współczynnik zmienności cen preferencji (odchylenie standardowe / średnia) z kroczących linii
+        bazowych (price_baselines). Każda linia bazowa to ceny jednej preferencji - jednej waluty, klasy
+        i dat podróży (a dla okna dat tych samych kombinacji lotów), więc statystyka nie miesza cen
+        różnych wyszukiwań tej samej trasy. Preferencje z mniej niż dwiema obserwacjami nie mają wpisu.
+        """
+        ids = sorted(set(preference_ids))
+        baselines = PriceBaseline.__table__
+        volatility = {}
+        with db.engine.connect() as connection:
+            for start in range(0, len(ids), VOLATILITY_CHUNK):
+                rows = connection.execute(
+                    select(baselines.c.preference_id, baselines.c.mean, baselines.c.variance)
+                    .where(baselines.c.preference_id.in_(ids[start:start + VOLATILITY_CHUNK]),
+                           baselines.c.samples >= 2, baselines.c.mean > 0)
+                )
+                for preference_id, mean, variance in rows:
+                    volatility[preference_id] = math.sqrt(max(0.0, variance)) / mean
+        return volatility
@@ -0,0 +1,67 @@
+"""
+Licznik zużycia limitu SerpAPI w bazie danych (tabela serpapi_usage, jeden wiersz na dzień).
+
+Licznik jest wspólny dla aplikacji webowej i wszystkich procesów workera, również na różnych
+maszynach - każde zapytanie zwiększa go atomową instrukcją UPDATE (w PostgreSQL INSERT ... ON CONFLICT
+DO UPDATE), więc równoległe zapisy się nie nadpisują, a kilka węzłów wydaje jeden wspólny budżet.
+"""
+from datetime import date
+from typing import Optional
+import logging
+
+from sqlalchemy import func, select, update
+
+from services.db_instance import db
+from services.models import SerpApiUsage
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaLedger:
+    """
+    Dzienne liczniki zapytań do SerpAPI (odpowiedzi z cache'u się nie liczą)
+    """
+
+    def record_calls(self, count: int, day: Optional[date] = None) -> None:
+        """
+        Dolicza count zapytań do licznika dnia (domyślnie dzisiejszego)
+        """
+        if count <= 0:
+            return
+        day = day or date.today()
+        table = SerpApiUsage.__table__
+        try:
+            with db.engine.begin() as connection:
+                if connection.dialect.name == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+                    statement = insert(table).values(day=day, calls=count)
+                    connection.execute(statement.on_conflict_do_update(
+                        index_elements=[table.c.day],
+                        set_={'calls': table.c.calls + statement.excluded.calls},
+                    ))
+                else:
+                    updated = connection.execute(
+                        update(table).where(table.c.day == day).values(calls=table.c.calls + count)
+                    ).rowcount
+                    if not updated:
+                        connection.execute(table.insert().values(day=day, calls=count))
+        except Exception:
+            logger.exception("Błąd zapisu licznika limitu SerpAPI")
+
+    def used_on(self, day: date) -> int:
+        table = SerpApiUsage.__table__
+        with db.engine.connect() as connection:
+            used = connection.execute(select(table.c.calls).where(table.c.day == day)).scalar()
+        return used or 0
+
+    def used_in_month(self, day: date, before_day: bool = False) -> int:
+        """
+        Zużycie w miesiącu dnia day (do dnia day włącznie lub - before_day - bez niego)
+        """
+        table = SerpApiUsage.__table__
+        end = table.c.day < day if before_day else table.c.day <= day
+        with db.engine.connect() as connection:
+            used = connection.execute(
+                select(func.sum(table.c.calls)).where(table.c.day >= day.replace(day=1), end)
+            ).scalar()
+        return int(used or 0)
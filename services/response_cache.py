@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from flask import current_app, has_app_context
+from sqlalchemy import Text, cast, delete, select, type_coerce
+
+from config.config import Config
+from services.db_instance import db
+from services.models import SearchResponseCache
+
+logger = logging.getLogger(__name__)
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+# Parametry, które nie wpływają na wynik wyszukiwania i nie mogą trafić do klucza/bazy
+_EXCLUDED_PARAMS = {'api_key'}
+_UPPERCASE_PARAMS = {'departure_id', 'arrival_id', 'currency'}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Normalizuje parametry zapytania SerpAPI (bez klucza API), żeby identyczne wyszukiwania
+    z formularza i z workera dawały ten sam klucz
+    """
+    normalized = {}
+    for key, value in params.items():
+        if key in _EXCLUDED_PARAMS or value is None:
+            continue
+        value = str(value).strip()
+        normalized[key] = value.upper() if key in _UPPERCASE_PARAMS else value
+    return normalized
+
+
+def search_key(params: Dict[str, Any]) -> str:
+    """
+    Klucz cache'u: SHA-256 ze znormalizowanych parametrów wyszukiwania
+    """
+    canonical = json.dumps(normalize_params(params), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Trwały cache odpowiedzi SerpAPI w bazie danych, współdzielony przez aplikację webową i workera.
+
+    - TTL zależy od liczby dni do wylotu (SERPAPI_CACHE_TTL_BUCKETS)
+    - po wygaśnięciu TTL odpowiedź jest jeszcze przez pewien czas zwracana jako nieaktualna,
+      a w tle pobierana jest nowa (stale-while-revalidate)
+    """
+
+    _refreshing = set()
+    _refreshing_lock = threading.Lock()
+
+    def __init__(self, enabled: Optional[bool] = None, ttl_buckets=None, stale_factor: Optional[float] = None):
+        config = current_app.config if has_app_context() else {}
+        self.enabled = enabled if enabled is not None else config.get(
+            'SERPAPI_CACHE_ENABLED', Config.SERPAPI_CACHE_ENABLED)
+        self.ttl_buckets = ttl_buckets or config.get('SERPAPI_CACHE_TTL_BUCKETS', Config.SERPAPI_CACHE_TTL_BUCKETS)
+        self.stale_factor = stale_factor if stale_factor is not None else config.get(
+            'SERPAPI_CACHE_STALE_FACTOR', Config.SERPAPI_CACHE_STALE_FACTOR)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @property
+    def active(self) -> bool:
+        """
+        Cache działa tylko gdy jest włączony i dostępny jest kontekst aplikacji (połączenie z bazą)
+        """
+        return self.enabled and has_app_context()
+
+    def ttl_for(self, outbound_date: Optional[str]) -> int:
+        """
+        Zwraca TTL (w sekundach) dla wyszukiwania z podaną datą wylotu (YYYY-MM-DD)
+        """
+        try:
+            days_to_departure = (datetime.strptime(outbound_date, '%Y-%m-%d').date() - _utcnow().date()).days
+        except (TypeError, ValueError):
+            days_to_departure = None
+
+        for max_days, ttl in self.ttl_buckets:
+            if max_days is None or (days_to_departure is not None and days_to_departure <= max_days):
+                return ttl
+        return self.ttl_buckets[-1][1]
+
+    def get(self, params: Dict[str, Any]) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Zwraca (odpowiedź, stan), gdzie stan to FRESH, STALE lub None (brak w cache'u)
+        """
+        table = SearchResponseCache.__table__
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(table.c.response, table.c.expires_at, table.c.stale_until)
+                .where(table.c.search_key == search_key(params))
+            ).first()
+
+        now = _utcnow()
+        if row is None or row.stale_until <= now:
+            return None, None
+        if row.expires_at > now:
+            return row.response, FRESH
+        return row.response, STALE
+
+    def put(self, params: Dict[str, Any], response: Union[dict, bytes]) -> None:
+        """
+        Zapisuje (lub nadpisuje) odpowiedź dla podanych parametrów. Odpowiedź można przekazać także
+        jako surowe bajty JSON - trafiają do bazy bez parsowania i ponownej serializacji.
+        """
+        table = SearchResponseCache.__table__
+        if isinstance(response, bytes):
+            response = type_coerce(response.decode('utf-8'), Text)
+            if db.engine.dialect.name == 'postgresql':
+                response = cast(response, table.c.response.type)
+
+        ttl = self.ttl_for(params.get('outbound_date'))
+        now = _utcnow()
+        values = {
+            'search_key': search_key(params),
+            'params': normalize_params(params),
+            'response': response,
+            'fetched_at': now,
+            'expires_at': now + timedelta(seconds=ttl),
+            'stale_until': now + timedelta(seconds=ttl * (1 + self.stale_factor)),
+        }
+
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+                statement = insert(table).values(**values)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=[table.c.search_key],
+                    set_={key: statement.excluded[key] for key in values if key != 'search_key'},
+                ))
+            else:
+                connection.execute(delete(table).where(table.c.search_key == values['search_key']))
+                connection.execute(table.insert().values(**values))
+
+    def get_or_fetch(self, params: Dict[str, Any], fetch: Callable[[], dict]) -> dict:
+        """
+        Zwraca odpowiedź z cache'u lub pobiera ją funkcją fetch i zapisuje.
+        Odpowiedzi z błędem ("error") nie są cache'owane.
+        """
+        if not self.active:
+            return fetch()
+
+        try:
+            response, state = self.get(params)
+        except Exception:
+            logger.exception("Błąd odczytu cache'u odpowiedzi SerpAPI")
+            return fetch()
+
+        if state == FRESH:
+            self.hits += 1
+            return response
+        if state == STALE:
+            self.stale_hits += 1
+            self._revalidate_in_background(params, fetch)
+            return response
+
+        self.misses += 1
+        response = fetch()
+        self.store(params, response)
+        return response
+
+    def store(self, params: Dict[str, Any], response: Union[dict, bytes, None]) -> None:
+        """
+        Zapisuje poprawną odpowiedź, ignorując błędy zapisu (cache nie może przerwać pobierania danych).
+        Surowe bajty (bez parsowania) sprawdza wywołujący - zapisywane są bez sprawdzania błędu API.
+        """
+        if not response or (isinstance(response, dict) and 'error' in response):
+            return
+        try:
+            self.put(params, response)
+        except Exception:
+            logger.exception("Błąd zapisu cache'u odpowiedzi SerpAPI")
+
+    def _revalidate_in_background(self, params: Dict[str, Any], fetch: Callable[[], dict]) -> None:
+        """
+        Odświeża nieaktualny wpis w osobnym wątku (najwyżej jedno odświeżanie danego klucza na proces)
+        """
+        key = search_key(params)
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    self.store(params, fetch())
+            except Exception:
+                logger.exception("Błąd odświeżania odpowiedzi SerpAPI w tle")
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"serpapi-revalidate-{key[:8]}", daemon=True).start()
+
+    def purge_expired(self) -> int:
+        """
+        Usuwa wpisy, których nie można już zwrócić nawet jako nieaktualne. Zwraca liczbę usuniętych wpisów.
+        """
+        table = SearchResponseCache.__table__
+        with db.engine.begin() as connection:
+            result = connection.execute(delete(table).where(table.c.stale_until <= _utcnow()))
+        return result.rowcount
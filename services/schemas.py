@@ -2,6 +2,9 @@ from pydantic import BaseModel, EmailStr, Field, model_validator, field_validato
 from typing import Optional, Any
 from datetime import datetime, date
 from enum import Enum
+from services.iata_validator import validate_airport_code
+from logic.flex_window import MAX_FLEX_DAYS
+from logic.match_engine import MAX_STOPS
 
 
 class SeatClassEnum(str, Enum):
@@ -22,49 +25,39 @@ class SeatClassEnum(str, Enum):
             raise ValueError("Nieprawidłowa klasa siedzenia.")
         return mapping[value]
 
+    @classmethod
+    def to_form(cls, value: str) -> str:
+        """
+        Kod klasy z formularza ("1"-"4", jak travel_class w SerpAPI) dla wartości zapisanej w bazie
+        """
+        if value in ("1", "2", "3", "4"):
+            return value
+        try:
+            return str(list(cls).index(cls(getattr(value, 'value', value))) + 1)
+        except ValueError:
+            raise ValueError("Nieprawidłowa klasa siedzenia.")
+
 
 class FlightSearchParams(BaseModel):
     # Wszystkie pola przyjmują stringi, bo to właśnie dostajemy z formularza HTML
     target_departure: str = Field(..., description="Data wylotu w formacie YYYY-MM-DD")
-    return_date: str = Field(..., description="Data powrotu w formacie YYYY-MM-DD")
+    # Brak daty powrotu - lot w jedną stronę (odcinki elastycznych okien dat)
+    return_date: Optional[str] = Field(None, description="Data powrotu w formacie YYYY-MM-DD")
     departure_airport: str = Field(..., min_length=3, max_length=4, description="Kod IATA lotniska wylotu")
     arrival_airport: str = Field(..., min_length=3, max_length=4, description="Kod IATA lotniska przylotu")
     currency: str = Field(default="PLN", pattern="^[A-Z]{3}$")
     seat_class: str = Field(default="1", pattern="^[1-4]$")
+    flex_days: int = Field(default=0, ge=0, le=MAX_FLEX_DAYS, description="Elastyczność dat (± dni)")
+    max_stops: Optional[int] = Field(None, ge=0, le=MAX_STOPS, description="Maksymalna liczba przesiadek (brak - dowolna)")
 
     @field_validator('departure_airport', 'arrival_airport')
     @classmethod
     def validate_airport_code(cls, v):
-            """
-            Waliduje kod IATA lotniska używając biblioteki airports-py
-            """
-            if not v:
-                raise ValueError("Kod lotniska nie może być pusty")
-
-            v = v.strip().upper()
-
-            if len(v) != 3:
-                raise ValueError("Kod IATA musi mieć dokładnie 3 znaki")
-
-            if not v.isalpha():
-                raise ValueError("Kod IATA może zawierać tylko litery")
-
-            try:
-                from airports import airport_data
-                airports_list = airport_data.get_airport_by_iata(v)
-
-                if not airports_list or len(airports_list) == 0:
-                    raise ValueError(f"Nieznany kod lotniska IATA: {v}")
-
-                return v
+        """
+        Waliduje kod IATA lotniska (wspólny walidator ze zbiorem kodów ładowanym raz na proces)
+        """
+        return validate_airport_code(v)
 
-            except ImportError:
-                print("Ostrzeżenie: airports-py nie jest dostępne, pomijam walidację IATA")
-                return v
-            except ValueError:
-                raise
-            except Exception as e:
-                raise ValueError(f"Błąd podczas walidacji kodu lotniska {v}: {str(e)}")
     @model_validator(mode='after')
     def validate_dates_and_airports(self) -> 'FlightSearchParams':
         """
@@ -73,7 +66,7 @@ class FlightSearchParams(BaseModel):
         # Walidacja dat
         try:
             dep_date = datetime.strptime(self.target_departure, '%Y-%m-%d')
-            ret_date = datetime.strptime(self.return_date, '%Y-%m-%d')
+            ret_date = datetime.strptime(self.return_date, '%Y-%m-%d') if self.return_date is not None else dep_date
 
             if ret_date < dep_date:
                 raise ValueError('Data powrotu musi być późniejsza niż data wylotu')
@@ -117,40 +110,17 @@ class FlightPreferences(BaseModel):
     seat_class: SeatClassEnum = Field(default=SeatClassEnum.ECONOMY, description="Klasa miejsca")
     max_price: Optional[float] = Field(None, gt=0, description="Maksymalna cena")
     preferred_airline: Optional[str] = Field(None, description="Preferowana linia lotnicza")
+    max_stops: Optional[int] = Field(None, ge=0, le=MAX_STOPS, description="Maksymalna liczba przesiadek w każdym kierunku")
+    flex_days: int = Field(default=0, ge=0, le=MAX_FLEX_DAYS,
+                           description="Elastyczność dat: ± dni wokół daty wylotu i powrotu")
 
     @field_validator('departure_airport', 'arrival_airport')
     @classmethod
     def validate_airport_code(cls, v):
         """
-        Waliduje kod IATA lotniska używając biblioteki airports-py
+        Waliduje kod IATA lotniska (wspólny walidator ze zbiorem kodów ładowanym raz na proces)
         """
-        if not v:
-            raise ValueError("Kod lotniska nie może być pusty")
-
-        v = v.strip().upper()
-
-        if len(v) != 3:
-            raise ValueError("Kod IATA musi mieć dokładnie 3 znaki")
-
-        if not v.isalpha():
-            raise ValueError("Kod IATA może zawierać tylko litery")
-
-        try:
-            from airports import airport_data
-            airports_list = airport_data.get_airport_by_iata(v)
-
-            if not airports_list or len(airports_list) == 0:
-                raise ValueError(f"Nieznany kod lotniska IATA: {v}")
-
-            return v
-
-        except ImportError:
-            print("Ostrzeżenie: airports-py nie jest dostępne, pomijam walidację IATA")
-            return v
-        except ValueError:
-            raise
-        except Exception as e:
-            raise ValueError(f"Błąd podczas walidacji kodu lotniska {v}: {str(e)}")
+        return validate_airport_code(v)
 
     @model_validator(mode='after')
     def validate_dates_and_airports(self):
@@ -7,6 +7,9 @@ class AirportAutocomplete {
     this.selectedAirportCode = "";
     this.debounceTimer = null;
     this.isLoading = false;
+    // Wyniki już pobrane w tej sesji (zapytanie -> lotniska) i aktualnie trwające żądanie
+    this.resultsCache = new Map();
+    this.pendingRequest = null;
 
     this.init();
   }
@@ -71,6 +74,19 @@ class AirportAutocomplete {
       return;
     }
 
+    const cacheKey = query.trim().toLowerCase();
+    if (this.resultsCache.has(cacheKey)) {
+      this.showSuggestions(this.resultsCache.get(cacheKey));
+      return;
+    }
+
+    // Anuluj poprzednie żądanie - jego wynik i tak zostałby nadpisany
+    if (this.pendingRequest) {
+      this.pendingRequest.abort();
+    }
+    const controller = new AbortController();
+    this.pendingRequest = controller;
+
     this.isLoading = true;
     this.showLoadingState();
 
@@ -78,7 +94,7 @@ class AirportAutocomplete {
       const url = `/api/airports?q=${encodeURIComponent(query)}`;
       console.log(`📡 Wysyłam request do: ${url}`);
 
-      const response = await fetch(url);
+      const response = await fetch(url, { signal: controller.signal });
       console.log(`📨 Otrzymałem odpowiedź:`, response);
 
       if (!response.ok) {
@@ -89,12 +105,19 @@ class AirportAutocomplete {
       console.log(`✈️ Otrzymane lotniska:`, airports);
       console.log(`📊 Liczba lotnisk: ${airports.length}`);
 
+      this.resultsCache.set(cacheKey, airports);
       this.showSuggestions(airports);
     } catch (error) {
+      if (error.name === "AbortError") {
+        return;
+      }
       console.error("❌ Błąd podczas pobierania lotnisk:", error);
       this.showErrorState();
     } finally {
-      this.isLoading = false;
+      if (this.pendingRequest === controller) {
+        this.pendingRequest = null;
+        this.isLoading = false;
+      }
     }
   }
 
@@ -0,0 +1,73 @@
+"""
+Wspólne ustawienia testów: aplikacja na pliku SQLite w katalogu tymczasowym i SerpAPI w trybie odtwarzania
+(bez sieci i bez zużywania limitu). Zmienne środowiskowe i adres bazy muszą być ustawione przed importem
+app i workera - oba czytają konfigurację przy imporcie.
+"""
+from datetime import date, timedelta
+import os
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'workers'))
+
+os.environ.update(
+    SERPAPI_MODE='replay',
+    SERPAPI_CACHE_ENABLED='0',
+    # Ceny odtwarzanych odpowiedzi stałe w czasie testu - porównywane przebiegi widzą te same loty
+    SERPAPI_REPLAY_PRICE_PERIOD='1e9',
+    EMAIL_SEND_INTERVAL='0',
+)
+
+import config.config as config  # noqa: E402
+
+TEST_DATABASE = os.path.join(tempfile.mkdtemp(prefix='flight-assistant-tests-'), 'test.db')
+config.DevelopmentConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{TEST_DATABASE}"
+
+
+@pytest.fixture
+def app():
+    from app import app as flask_app
+    from services.db_instance import db
+
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def add_preferences(app):
+    """
+    Dodaje preferencje lotów jednego użytkownika; zwraca ich identyfikatory (parametry w kolejnych
+    słownikach nadpisują domyślne wyszukiwanie WAW -> LHR za tydzień)
+    """
+    from services.db_instance import db
+    from services.models import FlightPreference, User
+
+    def add(*overrides, email='user@example.com'):
+        user = db.session.query(User).filter_by(email=email).first()
+        if user is None:
+            user = User(email=email)
+            db.session.add(user)
+            db.session.flush()
+        departure = date.today() + timedelta(days=7)
+        preferences = [
+            FlightPreference(**{
+                'user_id': user.user_id, 'target_departure': departure,
+                'return_date': departure + timedelta(days=7), 'departure_airport': 'WAW',
+                'arrival_airport': 'LHR', 'currency': 'PLN', 'seat_class': 'ECONOMY', **values,
+            })
+            for values in overrides
+        ]
+        db.session.add_all(preferences)
+        db.session.commit()
+        ids = [preference.preference_id for preference in preferences]
+        db.session.expunge_all()
+        return ids
+
+    return add
@@ -0,0 +1,73 @@
+from datetime import date, datetime, timedelta
+
+from services.database import Database
+from services.db_instance import db
+from services.models import FlightPreference, PriceBaseline, PriceHistory
+from services.schemas import FlightPreferences, SeatClassEnum
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def add_price_data(preference_id):
+    db.session.add(PriceHistory(preference_id=preference_id, route='WAW-LHR', checked_at=NOW, min_price=500.0))
+    db.session.add(PriceBaseline(preference_id=preference_id, mean=500.0, samples=1, updated_at=NOW))
+    db.session.commit()
+
+
+def flight_preferences(**values):
+    departure = date.today() + timedelta(days=7)
+    return FlightPreferences(**{
+        'departure_airport': 'WAW', 'arrival_airport': 'LHR', 'target_departure': str(departure),
+        'return_date': str(departure + timedelta(days=7)), 'seat_class': SeatClassEnum.ECONOMY, **values,
+    })
+
+
+def test_delete_flight_preferences_reports_missing_rows(add_preferences):
+    first, second = add_preferences({}, {'arrival_airport': 'CDG'})
+    add_price_data(first)
+
+    result = Database().delete_flight_preferences([first, second, first, 999])
+
+    assert result.succeeded == [first, second]
+    assert result.errors == {999: "Nie znaleziono preferencji"}
+    assert db.session.query(FlightPreference).count() == 0
+    assert db.session.query(PriceHistory).count() == 0
+    assert db.session.query(PriceBaseline).count() == 0
+
+
+def test_notified_and_deleted_preference_is_not_rescheduled(add_preferences):
+    notified, watched = add_preferences({}, {'arrival_airport': 'CDG'})
+    database = Database()
+    assert database.delete_flight_preferences([notified]).ok
+
+    result = database.record_check_results({notified: NOW, watched: NOW}, {}, checked_at=NOW)
+
+    assert result.succeeded == [watched]
+    assert result.errors == {notified: "Nie znaleziono preferencji"}
+    assert db.session.get(FlightPreference, watched).next_check_at == NOW
+
+
+def test_record_check_results_only_touches_rows_of_the_worker(add_preferences):
+    own, other = add_preferences({'claimed_by': 'node-a'}, {'arrival_airport': 'CDG', 'claimed_by': 'node-b'})
+
+    result = Database().record_check_results({own: NOW, other: NOW}, {}, checked_at=NOW, claimed_by='node-a')
+
+    assert result.succeeded == [own]
+    assert result.errors == {other: "Nie znaleziono preferencji z dzierżawą workera node-a"}
+
+
+def test_add_flight_preferences_keys_errors_by_position(app):
+    user_id, _ = Database().users_query('user@example.com')
+    invalid = flight_preferences().model_copy(update={'target_departure': 'jutro'})
+
+    result = Database().add_flight_preferences([
+        (user_id, flight_preferences()),
+        (user_id, invalid),
+        (user_id, flight_preferences(arrival_airport='CDG', flex_days=2)),
+    ])
+
+    assert len(result.succeeded) == 2
+    assert list(result.errors) == [1]
+    saved = db.session.query(FlightPreference).all()
+    assert sorted((preference.arrival_airport, preference.flex_days) for preference in saved) == \
+        [('CDG', 2), ('LHR', 0)]
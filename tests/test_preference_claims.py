@@ -0,0 +1,129 @@
+from datetime import date, datetime, timedelta, timezone
+
+from services.db_instance import db
+from services.models import FlightPreference
+from services.preference_claims import PreferenceClaims
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def rows(ids):
+    db.session.expire_all()
+    return {preference.preference_id: preference
+            for preference in db.session.query(FlightPreference).filter(FlightPreference.preference_id.in_(ids))}
+
+
+def test_claim_batch_leases_due_preferences(add_preferences):
+    ids = add_preferences({}, {'arrival_airport': 'CDG'})
+    worker = PreferenceClaims('node-a', lease_seconds=600)
+
+    assert sorted(worker.claim_batch(now=NOW)) == ids
+    for preference in rows(ids).values():
+        assert preference.claimed_by == 'node-a'
+        assert preference.claimed_until == NOW + timedelta(seconds=600)
+
+
+def test_claimed_preferences_are_skipped_by_other_workers(add_preferences):
+    add_preferences({}, {'arrival_airport': 'CDG'})
+    PreferenceClaims('node-a').claim_batch(now=NOW)
+
+    assert PreferenceClaims('node-b').claim_batch(now=NOW + timedelta(seconds=60)) == []
+
+
+def test_claim_batch_skips_past_and_not_due_preferences(add_preferences):
+    due, later, past = add_preferences(
+        {},
+        {'arrival_airport': 'CDG', 'next_check_at': NOW + timedelta(hours=1)},
+        {'arrival_airport': 'BCN', 'target_departure': date.today() - timedelta(days=1)},
+    )
+
+    assert PreferenceClaims('node-a').claim_batch(now=NOW) == [due]
+
+
+def test_claim_batch_completes_search_groups(add_preferences):
+    # Druga preferencja tego samego wyszukiwania nie jest jeszcze należna, ale trafia do partii
+    due, same_search = add_preferences({}, {'next_check_at': NOW + timedelta(hours=1)})
+    add_preferences({'arrival_airport': 'CDG', 'next_check_at': NOW + timedelta(hours=1)})
+
+    assert sorted(PreferenceClaims('node-a', batch_size=1).claim_batch(now=NOW)) == [due, same_search]
+
+
+def test_claim_batch_orders_by_due_time(add_preferences):
+    recent, overdue = add_preferences(
+        {'next_check_at': NOW - timedelta(minutes=1)},
+        {'arrival_airport': 'CDG', 'next_check_at': NOW - timedelta(hours=5)},
+    )
+
+    assert PreferenceClaims('node-a', batch_size=1).claim_batch(now=NOW) == [overdue]
+
+
+def test_expired_lease_is_claimed_again(add_preferences):
+    ids = add_preferences({}, {'arrival_airport': 'CDG'})
+    PreferenceClaims('node-a', lease_seconds=600).claim_batch(now=NOW)
+    other = PreferenceClaims('node-b')
+
+    assert other.claim_batch(now=NOW + timedelta(seconds=599)) == []
+    assert sorted(other.claim_batch(now=NOW + timedelta(seconds=601))) == ids
+    assert {preference.claimed_by for preference in rows(ids).values()} == {'node-b'}
+
+
+def test_heartbeat_extends_own_leases_only(add_preferences):
+    mine, theirs = add_preferences({}, {'arrival_airport': 'CDG'})
+    # heartbeat liczy od bieżącego czasu, więc dzierżawa musi być przejęta w przeszłości
+    claimed_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+    worker = PreferenceClaims('node-a', lease_seconds=600)
+    worker.claim_batch(now=claimed_at)
+    db.session.query(FlightPreference).filter_by(preference_id=theirs).update(
+        {'claimed_by': 'node-b', 'claimed_until': claimed_at})
+    db.session.commit()
+
+    assert worker.heartbeat() == 1
+    current = rows([mine, theirs])
+    assert current[mine].claimed_until > claimed_at + timedelta(hours=1)
+    assert current[theirs].claimed_until == claimed_at
+
+
+def test_release_frees_selected_or_all_own_leases(add_preferences):
+    first, second, third = add_preferences({}, {'arrival_airport': 'CDG'}, {'arrival_airport': 'BCN'})
+    worker = PreferenceClaims('node-a')
+    worker.claim_batch(now=NOW)
+
+    assert worker.release([first]) == 1
+    assert worker.release([]) == 0
+    assert PreferenceClaims('node-b').release() == 0
+    current = rows([first, second, third])
+    assert current[first].claimed_by is None and current[first].claimed_until is None
+    assert current[second].claimed_by == 'node-a'
+
+    assert worker.release() == 2
+    assert all(preference.claimed_by is None for preference in rows([first, second, third]).values())
+
+
+def test_complete_schedules_checks_and_releases_leases(add_preferences):
+    checked, failed = add_preferences({'check_failures': 2}, {'arrival_airport': 'CDG', 'check_failures': 1})
+    worker = PreferenceClaims('node-a')
+    worker.claim_batch(now=NOW)
+    next_check, retry_at = NOW + timedelta(hours=6), NOW + timedelta(minutes=30)
+
+    result = worker.complete({checked: next_check}, {failed: retry_at}, checked_at=NOW)
+
+    assert result.ok and sorted(result.succeeded) == [checked, failed]
+    current = rows([checked, failed])
+    assert (current[checked].next_check_at, current[checked].last_checked_at,
+            current[checked].check_failures) == (next_check, NOW, 0)
+    assert (current[failed].next_check_at, current[failed].last_checked_at,
+            current[failed].check_failures) == (retry_at, None, 2)
+    assert all(preference.claimed_by is None and preference.claimed_until is None
+               for preference in current.values())
+
+
+def test_complete_ignores_preferences_leased_by_another_worker(add_preferences):
+    preference_id, = add_preferences({})
+    PreferenceClaims('node-a', lease_seconds=600).claim_batch(now=NOW)
+    PreferenceClaims('node-b').claim_batch(now=NOW + timedelta(seconds=601))
+
+    result = PreferenceClaims('node-a').complete({preference_id: NOW + timedelta(hours=6)}, {}, checked_at=NOW)
+
+    assert result.succeeded == [] and preference_id in result.errors
+    current = rows([preference_id])[preference_id]
+    assert current.claimed_by == 'node-b' and current.next_check_at is None
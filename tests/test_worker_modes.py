@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip('telepot')  # logic.email_sender (import workera)
+
+import flight_checker_scheduled as worker  # noqa: E402
+from services.db_instance import db  # noqa: E402
+from services.models import FlightPreference, PriceHistory  # noqa: E402
+
+
+def seed(add_preferences):
+    """
+    Preferencje kilku tras z limitami cen i oknami dat - część zostaje powiadomiona, część obserwowana
+    """
+    today = date.today()
+    preferences = []
+    for number in range(24):
+        departure = today + timedelta(days=5 + number % 8)
+        preferences.append({
+            'target_departure': departure,
+            'return_date': departure + timedelta(days=7),
+            'departure_airport': ('WAW', 'KRK', 'GDN')[number % 3],
+            'arrival_airport': ('LHR', 'CDG', 'BCN', 'FCO')[number % 4],
+            'max_price': (None, 1500, 3000)[number % 3],
+            'flex_days': (0, 0, 2)[number % 3],
+        })
+    add_preferences(*preferences)
+
+
+def run_worker(mode, add_preferences, monkeypatch):
+    db.drop_all()
+    db.create_all()
+    seed(add_preferences)
+    sent = []
+    monkeypatch.setattr(worker, 'WORKER_MODE', mode)
+    monkeypatch.setattr(worker.quota_scheduler, '_slot_scale', None)
+    monkeypatch.setattr(worker.email_sender, 'send_email',
+                        lambda recipient_email, subject, html_message: sent.append((recipient_email, subject)))
+
+    worker.check_flights_and_notify()
+
+    db.session.expire_all()
+    remaining = db.session.query(FlightPreference).order_by(FlightPreference.preference_id).all()
+    history = db.session.query(PriceHistory.preference_id, PriceHistory.min_price, PriceHistory.matched_price)
+    return {
+        'sent': sorted(sent),
+        'remaining': [preference.preference_id for preference in remaining],
+        'scheduled': all(preference.next_check_at is not None and preference.claimed_by is None
+                         for preference in remaining),
+        'history': sorted(history, key=lambda row: row.preference_id),
+    }
+
+
+def test_pipelined_run_matches_sequential(add_preferences, monkeypatch):
+    sequential = run_worker('sequential', add_preferences, monkeypatch)
+    pipelined = run_worker('pipelined', add_preferences, monkeypatch)
+
+    assert sequential['sent'] and sequential['remaining']
+    assert sequential['scheduled'] and pipelined['scheduled']
+    assert pipelined == sequential
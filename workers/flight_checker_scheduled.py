@@ -1,101 +1,687 @@
 import time
 import sys
+import json
+import math
 import os
-from datetime import date
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from flask.templating import render_template
+from sqlalchemy import and_, case, func, select
 from app import app, db
-from services.models import User, FlightPreference
-from services.schemas import FlightSearchParams
+from services.models import User, FlightPreference, PriceBaseline
+from services.schemas import FlightSearchParams, SeatClassEnum
 from services.database import Database
+from services.iata_validator import get_iata_validator
+from services.price_history import PriceHistoryStore, PriceObservation
+from services.preference_claims import PreferenceClaims
 from logic.date_parser import changeMonthForAbbreviation
 from logic.email_sender import EmailSender
 from logic.flight_checker import FlightChecker
+from logic.match_engine import FlightMatch, FlightTable, MatchCriteria
+from logic.flex_window import WindowLeg, WindowMatch, cheapest_combinations, flight_window
 from logic.data_grabber import DataGrabber
-from apscheduler.schedulers.blocking import BlockingScheduler
+from logic.fetch_engine import BlockingTokenBucket
+from logic.quota_scheduler import QuotaScheduler
+from logic.pipeline import Stage, run_pipeline, run_sequential
 
 flight_checker = FlightChecker()
 email_sender = EmailSender()
 data_grabber = DataGrabber()
 database = Database()
+price_history = PriceHistoryStore()
+quota_scheduler = QuotaScheduler.from_env(price_history=price_history)
+preference_claims = PreferenceClaims.from_env()
 
-def get_preferences_for_flight(preference: FlightPreference):
-    target_date = preference.target_departure.strftime('%Y-%m-%d')
 
-    if flight_checker.sprawdzanie_lotow(target_date):
-        found_flight_data = {
-            "departure_airport": preference.departure_airport,
-            "arrival_airport": preference.arrival_airport,
-            "target_departure": target_date,
-            "return_date": preference.return_date.strftime('%Y-%m-%d')
-        }
-        return found_flight_data
-    return None
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
 
-def check_flights_and_notify():
-    with app.app_context():
-        today = date.today()
-        preferences_to_check = db.session.query(
-            FlightPreference,
-            User.email
-        ).join(
-            User, FlightPreference.user_id == User.user_id
-        ).filter(
-            FlightPreference.target_departure >= today
-        ).all()
-
-        print(f"Znaleziono {len(preferences_to_check)} preferencji lotów do sprawdzenia.")
-
-        for preference, user_email in preferences_to_check:
-            print(f"Pobieranie danych dla preferencji ID: {preference.preference_id}...")
+
+# Tryb potokowy: pobieranie, dopasowanie i wysyłka powiadomień w osobnych etapach z ograniczonymi kolejkami
+WORKER_MODE = os.getenv('WORKER_MODE', 'sequential')
+WORKER_MATCH_THREADS = max(1, _env_int('WORKER_MATCH_THREADS', 2))
+WORKER_NOTIFY_THREADS = max(1, _env_int('WORKER_NOTIFY_THREADS', 4))
+WORKER_QUEUE_SIZE = max(0, _env_int('WORKER_QUEUE_SIZE', 0))
+# Minimalny odstęp między e-mailami całego workera, wspólny dla wszystkich wątków wysyłki (limit serwera SMTP)
+EMAIL_SEND_INTERVAL = max(0.0, _env_float('EMAIL_SEND_INTERVAL', 2.0))
+# Przerwa ciągłej pętli, gdy żadna preferencja nie czeka na sprawdzenie
+WORKER_POLL_SECONDS = max(1.0, _env_float('WORKER_POLL_SECONDS', 60.0))
+# Kolejne sprawdzenie preferencji, której nie udało się usunąć po powiadomieniu (bez ponownego e-maila co obieg)
+NOTIFIED_RECHECK = timedelta(days=1)
+# Co ile sekund ciągła pętla wykonuje prace porządkowe (wygasłe odpowiedzi z cache'u SerpAPI, stara historia cen)
+WORKER_MAINTENANCE_SECONDS = max(60.0, _env_float('WORKER_MAINTENANCE_SECONDS', 3600.0))
+# Ile dni przechowywać historię cen (linie bazowe i harmonogram od niej nie zależą)
+PRICE_HISTORY_RETENTION_DAYS = max(1, _env_int('PRICE_HISTORY_RETENTION_DAYS', 90))
+# Rozmiar porcji przy przeglądaniu wszystkich preferencji (raport limitu)
+WORKER_STREAM_CHUNK = max(1, _env_int('WORKER_STREAM_CHUNK', 1000))
+
+email_rate_limiter = BlockingTokenBucket(rate=1 / EMAIL_SEND_INTERVAL, capacity=1) if EMAIL_SEND_INTERVAL else None
+
+
+def send_email(**message) -> None:
+    """
+    Wysyła e-mail z zachowaniem wspólnego limitu EMAIL_SEND_INTERVAL (powiadomienia i spadki cen)
+    """
+    if email_rate_limiter is not None:
+        email_rate_limiter.acquire()
+    email_sender.send_email(**message)
+
+
+def get_preferences_for_flight(preference: FlightPreference, match: Optional[FlightMatch]):
+    if match is None:
+        return None
+
+    return {
+        "departure_airport": preference.departure_airport,
+        "arrival_airport": preference.arrival_airport,
+        "target_departure": preference.target_departure.strftime('%Y-%m-%d'),
+        "return_date": preference.return_date.strftime('%Y-%m-%d'),
+        "price": match.price,
+        "currency": preference.currency,
+        "airline": match.airline,
+        "stops": match.stops,
+    }
+
+
+def get_preferences_for_window(preference: FlightPreference, match: Optional[WindowMatch]):
+    if match is None:
+        return None
+
+    airlines = [airline for airline in dict.fromkeys((match.outbound.airline, match.inbound.airline)) if airline]
+    return {
+        "departure_airport": preference.departure_airport,
+        "arrival_airport": preference.arrival_airport,
+        "target_departure": match.target_departure.strftime('%Y-%m-%d'),
+        "return_date": match.return_date.strftime('%Y-%m-%d'),
+        "price": match.price,
+        "currency": preference.currency,
+        "airline": " / ".join(airlines),
+        "stops": match.outbound.stops + match.inbound.stops,
+        "flex_days": preference.flex_days,
+    }
+
+
+def search_params_for_leg(leg: WindowLeg) -> FlightSearchParams:
+    """
+    Parametry wyszukiwania lotu w jedną stronę (odcinek okna dat)
+    """
+    return FlightSearchParams(
+        departure_airport=leg.departure_airport,
+        arrival_airport=leg.arrival_airport,
+        target_departure=leg.day.strftime('%Y-%m-%d'),
+        currency=leg.currency,
+        seat_class=leg.seat_class,
+    )
+
+
+class FetchedSearch(NamedTuple):
+    group: object
+    response: object
+
+
+class FetchedWindow(NamedTuple):
+    group: object
+    window: object
+    responses: Dict[WindowLeg, object]
+
+
+class Notification(NamedTuple):
+    preference: FlightPreference
+    user_email: str
+    flight_info: dict
+    link: Optional[str]
+    # Okno dat: link do lotu powrotnego (link wyżej prowadzi do wylotu) - każdy kierunek to osobne wyszukiwanie
+    return_link: Optional[str] = None
+
+
+class PriceDropNotice(NamedTuple):
+    preference: FlightPreference
+    user_email: str
+    price_drop: object
+
+
+@dataclass
+class CheckRun:
+    """
+    Wyniki jednego przebiegu workera zbierane przez etap dopasowania (również z wielu wątków)
+    """
+    checked_keys: List[str] = field(default_factory=list)
+    failed_keys: List[str] = field(default_factory=list)
+    observations: List[PriceObservation] = field(default_factory=list)
+    watched: Dict[int, Tuple[FlightPreference, str]] = field(default_factory=dict)
+    notified_ids: List[int] = field(default_factory=list)
+    undeleted_ids: List[int] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def failed(self, key: str) -> None:
+        with self.lock:
+            self.failed_keys.append(key)
+
+    def notified(self, preference_id: int, deleted: bool) -> None:
+        with self.lock:
+            (self.notified_ids if deleted else self.undeleted_ids).append(preference_id)
+
+    def checked(self, key: str, observations: List[PriceObservation],
+                watched: List[Tuple[FlightPreference, str]]) -> None:
+        with self.lock:
+            self.checked_keys.append(key)
+            self.observations.extend(observations)
+            self.watched.update((preference.preference_id, (preference, user_email))
+                                for preference, user_email in watched)
+
+
+def fetch_searches(due_groups, today: date, run: CheckRun):
+    """
+    Etap pobierania: zwraca FetchedSearch dla wyszukiwań w obie strony oraz FetchedWindow dla okien dat,
+    gdy dotrze ostatni lot w jedną stronę okna. Zapytania wykonuje silnik pobierania (SERPAPI_CONCURRENCY),
+    a kolejne wyniki są pobierane dopiero, gdy etap dopasowania przyjmie poprzednie.
+
+    Grupa z niepoprawnymi parametrami wyszukiwania jest zgłaszana jako nieudana (run.failed) -
+    nie przerywa pobierania pozostałych grup partii.
+    """
+    checks = []
+    windows = []
+    for group in due_groups:
+        preference, _ = group.members[0]
+        try:
+            # W bazie zapisana jest nazwa klasy (SeatClassEnum), SerpAPI oczekuje kodu z formularza
+            seat_class = SeatClassEnum.to_form(preference.seat_class)
+            if group.flex_days:
+                windows.append((group, flight_window(
+                    preference.departure_airport, preference.arrival_airport, preference.target_departure,
+                    preference.return_date, group.flex_days, preference.currency, seat_class, today,
+                )))
+                continue
             search_params = FlightSearchParams(
                 departure_airport=preference.departure_airport,
                 arrival_airport=preference.arrival_airport,
                 target_departure=preference.target_departure.strftime('%Y-%m-%d'),
                 return_date=preference.return_date.strftime('%Y-%m-%d'),
                 currency=preference.currency,
-                seat_class=preference.seat_class,
+                seat_class=seat_class,
             )
+        except Exception as e:
+            print(f"Niepoprawne parametry wyszukiwania {group.key}: {e}")
+            run.failed(group.key)
+            continue
+        checks.append(((group, None), search_params))
+
+    # Okna dat: loty w jedną stronę na każdy dzień okna, każdy pobierany raz dla wszystkich okien
+    waiting: Dict[WindowLeg, list] = {}
+    missing: Dict[str, int] = {}
+    for group, window in windows:
+        legs = list(dict.fromkeys(window.legs))
+        if not legs:
+            yield FetchedWindow(group, window, {})
+            continue
+        missing[group.key] = len(legs)
+        for leg in legs:
+            waiting.setdefault(leg, []).append((group, window))
+    leg_params, invalid = {}, set()
+    for leg in waiting:
+        try:
+            leg_params[leg] = search_params_for_leg(leg)
+        except Exception as e:
+            print(f"Niepoprawne parametry lotu {leg.departure_airport} -> {leg.arrival_airport} ({leg.day}): {e}")
+            invalid.update(window_group.key for window_group, _ in waiting[leg])
+    # Okno z niepoprawnym odcinkiem jest nieudane w całości; pobierane są tylko odcinki pozostałych okien
+    for key in invalid:
+        missing.pop(key)
+        run.failed(key)
+    waiting = {leg: [entry for entry in entries if entry[0].key not in invalid] for leg, entries in waiting.items()}
+    checks.extend(((None, leg), leg_params[leg]) for leg, entries in waiting.items() if entries)
+
+    leg_responses = {}
+    # Pobieranie równoległe (pula połączeń + limit zapytań), wyniki przetwarzane w kolejności ukończenia
+    # Odpowiedzi w postaci kompaktowej - tylko odcinki lotów, ceny, linie i link
+    for (group, leg), flight_data_response in data_grabber.fetch_many(checks, compact=True):
+        if leg is None:
+            yield FetchedSearch(group, flight_data_response)
+            continue
+
+        if flight_data_response.error:
+            print(f"!!! Otrzymano błąd z API SerpApi dla lotu {leg.departure_airport} -> "
+                  f"{leg.arrival_airport} ({leg.day}) !!!")
+            print(flight_data_response.error)
+        leg_responses[leg] = flight_data_response
+        for window_group, window in waiting.pop(leg, []):
+            missing[window_group.key] -= 1
+            if not missing[window_group.key]:
+                yield FetchedWindow(window_group, window, {item: leg_responses[item] for item in window.legs})
+
+
+def match_search(item, run: CheckRun) -> List[Notification]:
+    """
+    Etap dopasowania: wszystkie preferencje wyszukiwania sprawdzane jednym wektorowym przebiegiem
+    """
+    if isinstance(item, FetchedWindow):
+        return match_window(item, run)
+
+    group, flight_data_response = item
+    print(f"Pobrano dane dla wyszukiwania {group.key} ({group.subscribers} preferencji).")
+    if flight_data_response.error:
+        print("!!! Otrzymano błąd z API SerpApi !!!")
+        print(flight_data_response.error)
+    # Nieudane pobranie (błąd połączenia, limit, otwarty bezpiecznik) nie jest sprawdzeniem -
+    # grupa wraca do kolejki zamiast porównywać nieaktualne dane
+    if not flight_data_response.answered:
+        run.failed(group.key)
+        return []
+
+    # Wszystkie preferencje grupy sprawdzane jednym wektorowym przebiegiem (data, cena, linia)
+    flight_table = FlightTable(flight_data_response)
+    members = [preference for preference, _ in group.members]
+    matches = flight_checker.dopasuj_preferencje(flight_table, members)
+    # Cena najlepszego lotu bez limitu max_price - do historii cen i wykrywania spadków
+    observed = flight_table.best_matches(
+        [MatchCriteria.from_preference(preference)._replace(max_price=None) for preference in members])
+
+    observations, notifications, watched = [], [], []
+    for (preference, user_email), match, seen in zip(group.members, matches, observed):
+        best = match or seen
+        observations.append(PriceObservation(
+            preference_id=preference.preference_id,
+            route=group.route,
+            min_price=flight_table.min_price,
+            observed_price=seen.price if seen else None,
+            matched_price=match.price if match else None,
+            airline=best.airline if best else None,
+            stops=best.stops if best else None,
+            options=len(flight_table),
+        ))
+        flight_info = get_preferences_for_flight(preference, match)
+
+        if flight_info:
+            notifications.append(Notification(preference, user_email, flight_info,
+                                              flight_checker.info_extractor(flight_data_response)))
+        else:
+            watched.append((preference, user_email))
+            print(f"Brak lotów pasujących do preferencji ID: {preference.preference_id} dla {user_email}.")
+
+    run.checked(group.key, observations, watched)
+    return notifications
+
 
-            flight_data_response = data_grabber.api_connector(search_params)
-            data_grabber.pobierz_dane(flight_data_response)
+def match_window(item: FetchedWindow, run: CheckRun) -> List[Notification]:
+    """
+    Okno dat: macierz cen wszystkich kombinacji (dzień wylotu x dzień powrotu) dla wszystkich
+    preferencji okna liczona jednym przebiegiem
+    """
+    group, window, responses = item
+    if not window.legs or any(not response.answered for response in responses.values()):
+        run.failed(group.key)
+        return []
+    print(f"Sprawdzono okno dat {group.key} ({len(window.legs)} lotów w jedną stronę, "
+          f"{group.subscribers} preferencji).")
 
-            flight_info = get_preferences_for_flight(preference)
+    leg_tables = {leg: FlightTable(response) for leg, response in responses.items()}
+    members = [preference for preference, _ in group.members]
+    result = cheapest_combinations(window, leg_tables, [MatchCriteria.from_preference(preference)
+                                                        for preference in members])
 
-            if flight_info:
-                link = flight_checker.info_extractor()
-                departureDate = changeMonthForAbbreviation(flight_info["target_departure"])
-                returnDate = changeMonthForAbbreviation(flight_info["return_date"])
-                print(f"Znaleziono lot dla {user_email}! Przygotowuję e-mail.")
+    observations, notifications, watched = [], [], []
+    for (preference, user_email), match, cheapest, prices in zip(
+            group.members, result.matches, result.cheapest, result.prices):
+        best = match or cheapest
+        observations.append(PriceObservation(
+            preference_id=preference.preference_id,
+            route=group.route,
+            min_price=cheapest.price if cheapest else None,
+            observed_price=cheapest.price if cheapest else None,
+            matched_price=match.price if match else None,
+            airline=best.outbound.airline if best else None,
+            stops=best.outbound.stops + best.inbound.stops if best else None,
+            options=int(np.count_nonzero(~np.isnan(prices))),
+        ))
+        flight_info = get_preferences_for_window(preference, match)
 
-                html_body = render_template('email-template.html', flight=flight_info, flight_link=link, departure_date=departureDate, return_date=returnDate)
+        if flight_info:
+            outbound_leg = next(leg for leg in window.outbound_legs if leg.day == match.target_departure)
+            inbound_leg = next(leg for leg in window.inbound_legs if leg.day == match.return_date)
+            notifications.append(Notification(preference, user_email, flight_info,
+                                              flight_checker.info_extractor(responses[outbound_leg]),
+                                              flight_checker.info_extractor(responses[inbound_leg])))
+        else:
+            watched.append((preference, user_email))
+            print(f"Brak kombinacji dat pasujących do preferencji ID: {preference.preference_id} "
+                  f"dla {user_email}.")
 
-                email_sender.send_email(
-                    recipient_email=user_email,
-                    subject=f"Znaleźliśmy dla Ciebie lot: {preference.departure_airport} -> {preference.arrival_airport}",
-                    html_message=html_body
-                    )
+    run.checked(group.key, observations, watched)
+    return notifications
 
-                print(f"Usuwanie preferencji ID: {preference.preference_id} po wysłaniu powiadomienia.")
-                if not database.delete_flight_preference(preference):
-                    print(f"Nie udało się usunąć preferencji ID: {preference.preference_id}")
 
-                time.sleep(2)
-            else:
-                print(f"Brak lotów pasujących do preferencji ID: {preference.preference_id} dla {user_email}.")
+def send_notification(notification: Notification, run: CheckRun) -> None:
+    """
+    Etap powiadomień: e-mail o znalezionym locie i usunięcie spełnionej preferencji zaraz po wysyłce
+    """
+    preference, user_email, flight_info, link, return_link = notification
+    departureDate = changeMonthForAbbreviation(flight_info["target_departure"])
+    returnDate = changeMonthForAbbreviation(flight_info["return_date"])
+    print(f"Znaleziono lot dla {user_email}! Przygotowuję e-mail.")
+
+    html_body = render_template('email-template.html', flight=flight_info, flight_link=link, return_flight_link=return_link, departure_date=departureDate, return_date=returnDate)
+
+    send_email(
+        recipient_email=user_email,
+        subject=f"Znaleźliśmy dla Ciebie lot: {preference.departure_airport} -> {preference.arrival_airport}",
+        html_message=html_body
+        )
+
+    # Usunięcie od razu po wysłaniu - przerwany przebieg ponawia najwyżej jeden e-mail, nie całą partię
+    print(f"Usuwanie preferencji ID: {preference.preference_id} po wysłaniu powiadomienia.")
+    deleted = database.delete_flight_preferences([preference.preference_id])
+    for preference_id, error in deleted.errors.items():
+        print(f"Nie udało się usunąć preferencji ID: {preference_id} ({error})")
+    run.notified(preference.preference_id, deleted.ok)
+
+
+def send_price_drop(notice: PriceDropNotice) -> None:
+    preference, user_email, price_drop = notice
+    print(f"Spadek ceny dla preferencji ID: {preference.preference_id} "
+          f"({price_drop.baseline:.0f} -> {price_drop.price:.0f} {preference.currency}).")
+    html_body = render_template(
+        'price-drop-template.html',
+        preference=preference,
+        price_drop=price_drop,
+        departure_date=changeMonthForAbbreviation(preference.target_departure.strftime('%Y-%m-%d')),
+        return_date=changeMonthForAbbreviation(preference.return_date.strftime('%Y-%m-%d')),
+    )
+    send_email(
+        recipient_email=user_email,
+        subject=f"Cena spadła: {preference.departure_airport} -> {preference.arrival_airport}",
+        html_message=html_body
+    )
+
+
+def run_stages(source, stages: List[Stage]):
+    """
+    Przebieg sekwencyjny (domyślnie) lub potokowy (WORKER_MODE=pipelined) - te same etapy, te same wyniki
+    """
+    if WORKER_MODE == 'pipelined':
+        return run_pipeline(source, stages, context=app.app_context)
+    return run_sequential(source, stages)
+
+
+def search_parameters(preference) -> Tuple:
+    return (
+        preference.departure_airport, preference.arrival_airport, preference.target_departure,
+        preference.return_date, preference.currency, preference.seat_class, preference.flex_days,
+    )
+
+
+def plan_search_groups(preferences, scale: Optional[float] = None):
+    groups = quota_scheduler.plan(
+        (((preference, user_email), preference.preference_id, search_parameters(preference))
+         for preference, user_email in preferences),
+        scale=scale,
+    )
+    # Stan sprawdzeń z bazy (kolumny preferencji) zamiast pliku licznika
+    for group in groups:
+        group.failures = max(preference.check_failures or 0 for preference, _ in group.members)
+        checked = [preference.last_checked_at for preference, _ in group.members if preference.last_checked_at]
+        group.last_checked = max(checked).replace(tzinfo=timezone.utc).timestamp() if checked else None
+    return groups
+
+
+def stream_preferences(today: date, chunk_size: int = WORKER_STREAM_CHUNK):
+    """
+    Preferencje z datą wylotu od dziś, pobierane porcjami ze stronicowaniem po kluczu
+    (preference_id > ostatni z poprzedniej porcji) - każda porcja w osobnym, krótkim połączeniu
+    i bez obiektów ORM, więc zużycie pamięci nie zależy od liczby preferencji w bazie
+    """
+    table = FlightPreference.__table__
+    last_id = 0
+    while True:
+        with db.engine.connect() as connection:
+            chunk = connection.execute(
+                select(table)
+                .where(table.c.target_departure >= today, table.c.preference_id > last_id)
+                .order_by(table.c.preference_id)
+                .limit(chunk_size)
+            ).all()
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1].preference_id
+
+
+def search_demand(today: date):
+    """
+    Liczba preferencji i zmienność cen na każdy zestaw parametrów wyszukiwania (jedno zapytanie
+    agregujące GROUP BY z liniami bazowymi cen), z których QuotaScheduler.demand_scale liczy wspólny
+    współczynnik skalowania częstotliwości
+    """
+    table = FlightPreference.__table__
+    baselines = PriceBaseline.__table__
+    columns = (
+        table.c.departure_airport, table.c.arrival_airport, table.c.target_departure,
+        table.c.return_date, table.c.currency, table.c.seat_class, func.coalesce(table.c.flex_days, 0),
+    )
+    # Kwadrat współczynnika zmienności preferencji z co najmniej dwiema obserwacjami (AVG pomija NULL)
+    squared_volatility = case(
+        (and_(baselines.c.samples >= 2, baselines.c.mean > 0),
+         baselines.c.variance / (baselines.c.mean * baselines.c.mean)),
+        else_=None,
+    )
+    # Wiersze czytane porcjami (kursor po stronie serwera) - bez listy wszystkich grup w pamięci
+    with db.engine.connect().execution_options(yield_per=WORKER_STREAM_CHUNK) as connection:
+        rows = connection.execute(
+            select(*columns, func.count(), func.avg(squared_volatility))
+            .select_from(table.outerjoin(baselines, baselines.c.preference_id == table.c.preference_id))
+            .where(table.c.target_departure >= today)
+            .group_by(*columns)
+        )
+        for row in rows:
+            squared = row[-1]
+            yield tuple(row[:-2]), row[-2], math.sqrt(max(0.0, float(squared))) if squared is not None else 0.0
+
+
+def print_quota_report():
+    with app.app_context():
+        # Członkami grup są tylko (ID, liczba nieudanych pobrań), nie całe wiersze
+        groups = quota_scheduler.plan(
+            ((row.preference_id, row.check_failures or 0), row.preference_id, search_parameters(row))
+            for row in stream_preferences(date.today())
+        )
+        for group in groups:
+            group.failures = max(failures for _, failures in group.members)
+        report = quota_scheduler.report(groups)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def load_claimed_preferences(preference_ids: List[int]):
+    return db.session.query(
+        FlightPreference,
+        User.email
+    ).join(
+        User, FlightPreference.user_id == User.user_id
+    ).filter(
+        FlightPreference.preference_id.in_(preference_ids)
+    ).order_by(
+        FlightPreference.preference_id
+    ).all()
+
+
+def check_preferences(preferences_to_check, today: date, budget: float, scale: Optional[float] = None) -> int:
+    """
+    Sprawdza jedną partię przejętych preferencji i zapisuje terminy kolejnych sprawdzeń;
+    zwraca liczbę wykorzystanych zapytań z budżetu. scale to współczynnik skalowania częstotliwości
+    policzony dla wszystkich preferencji (QuotaScheduler.demand_scale).
+    """
+    print(f"Przejęto {len(preferences_to_check)} preferencji lotów do sprawdzenia.")
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Wsadowa walidacja kodów lotnisk wszystkich preferencji (jedno sprawdzenie zamiast walidacji per rekord)
+    invalid_codes = set()
+    validator = get_iata_validator()
+    if validator is not None:
+        invalid_codes = validator.invalid_codes(
+            code for preference, _ in preferences_to_check
+            for code in (preference.departure_airport, preference.arrival_airport)
+        )
+
+    valid_preferences = []
+    skipped = {}
+    for preference, user_email in preferences_to_check:
+        if preference.departure_airport in invalid_codes or preference.arrival_airport in invalid_codes:
+            print(f"Pomijam preferencję ID: {preference.preference_id} - nieznany kod lotniska.")
+            skipped[preference.preference_id] = now + timedelta(days=1)
+            continue
+        valid_preferences.append((preference, user_email))
+
+    # Identyczne wyszukiwania są łączone; najpierw grupy po nieudanym pobraniu, potem najbardziej zaległe
+    groups = plan_search_groups(valid_preferences, scale)
+    groups.sort(key=lambda group: (not group.failures, min(
+        (preference.next_check_at or datetime.min for preference, _ in group.members), default=datetime.min)))
+    selected = quota_scheduler.within_budget(groups, budget)
+    print(f"Zaplanowano {len(selected)} z {len(groups)} wyszukiwań.")
+
+    run = CheckRun()
+    stats = run_stages(fetch_searches(selected, today, run), [
+        Stage('dopasowanie', lambda item: match_search(item, run), WORKER_MATCH_THREADS, WORKER_QUEUE_SIZE),
+        Stage('powiadomienia', lambda item: send_notification(item, run), WORKER_NOTIFY_THREADS, WORKER_QUEUE_SIZE),
+    ])
+
+    # Historia cen zapisywana jednym wsadem; spadki cen zgłaszane dla preferencji nadal obserwowanych
+    try:
+        price_drops = price_history.record(run.observations)
+    except Exception as e:
+        print(f"Błąd zapisu historii cen: {e}")
+        price_drops = []
+
+    run_stages((PriceDropNotice(*run.watched[price_drop.preference_id], price_drop)
+                for price_drop in price_drops if price_drop.preference_id in run.watched),
+               [Stage('spadki cen', send_price_drop, WORKER_NOTIFY_THREADS, WORKER_QUEUE_SIZE)])
+
+    # Kolejne terminy: sprawdzone grupy według częstotliwości (z rozrzutem), nieudane z rosnącym opóźnieniem;
+    # grupy poza budżetem wracają do puli bez zmiany terminu
+    groups_by_key = {group.key: group for group in selected}
+    checked, failed = dict(skipped), {}
+    for key in run.checked_keys:
+        next_check = now + timedelta(seconds=quota_scheduler.next_check_delay(groups_by_key[key]))
+        checked.update((preference.preference_id, next_check) for preference, _ in groups_by_key[key].members)
+    for key in run.failed_keys:
+        group = groups_by_key[key]
+        retry_at = now + timedelta(seconds=quota_scheduler.retry_delay(group.failures + 1))
+        failed.update((preference.preference_id, retry_at) for preference, _ in group.members)
+    if run.failed_keys:
+        print(f"Ponownie zakolejkowano {len(run.failed_keys)} wyszukiwań po nieudanym pobraniu.")
+    # Preferencja nieusunięta po powiadomieniu zostaje w bazie, ale z terminem za dobę - bez ponownego
+    # przejęcia (i e-maila) przy każdym obiegu pętli
+    checked.update((preference_id, now + NOTIFIED_RECHECK) for preference_id in run.undeleted_ids)
+    notified = set(run.notified_ids)
+    completed = preference_claims.complete(
+        {preference_id: next_check for preference_id, next_check in checked.items() if preference_id not in notified},
+        {preference_id: retry_at for preference_id, retry_at in failed.items() if preference_id not in notified},
+        checked_at=now,
+    )
+    for preference_id, error in completed.errors.items():
+        print(f"Nie zapisano terminu sprawdzenia preferencji ID: {preference_id} ({error})")
+    preference_claims.release([preference.preference_id for group in groups[len(selected):]
+                               for preference, _ in group.members])
+
+    print("Etapy: " + ", ".join(f"{name} {stage.processed} ({stage.busy:.1f} s, błędy: {stage.errors})"
+                                for name, stage in stats.items()))
+    return sum(group.requests for group in selected)
+
+
+def check_flights_and_notify():
+    with app.app_context():
+        today = date.today()
+        budget = quota_scheduler.slot_budget()
+        if budget <= 0:
+            print("Budżet zapytań SerpAPI na tę chwilę wykorzystany - czekam na kolejną część.")
+            return
+        # Preferencje, na które przyszła kolej, przejmowane partiami (SKIP LOCKED + dzierżawa) - kilka
+        # procesów workera, również na różnych maszynach, dzieli się pracą bez podwójnych zapytań i powiadomień
+        with preference_claims.keep_alive():
+            while budget > 0:
+                claimed = preference_claims.claim_batch(today)
+                if not claimed:
+                    break
+                # Skala częstotliwości z zapotrzebowania wszystkich preferencji (partia widzi tylko część
+                # grup dzielących dzienny budżet) - liczona dopiero, gdy coś przejęto, i raz na slot
+                scale = quota_scheduler.slot_scale(lambda: search_demand(today))
+                try:
+                    budget -= check_preferences(load_claimed_preferences(claimed), today, budget, scale)
+                finally:
+                    # Krótka sesja na partię: zamykana przed kolejną, więc w pamięci (mapie tożsamości)
+                    # są tylko obiekty bieżącej partii, a połączenie nie jest trzymane przez cały przebieg
+                    db.session.remove()
 
         print("--- Zakończono sprawdzanie lotów ---")
 
+
+def run_maintenance():
+    """
+    Prace porządkowe: usuwa z cache'u odpowiedzi SerpAPI wpisy, których nie można już zwrócić
+    nawet jako nieaktualne (bez tego tabela rośnie o każde unikalne wyszukiwanie), oraz obserwacje
+    cen starsze niż PRICE_HISTORY_RETENTION_DAYS
+    """
+    with app.app_context():
+        try:
+            purged = data_grabber.response_cache.purge_expired()
+            if purged:
+                print(f"Usunięto {purged} wygasłych odpowiedzi z cache'u SerpAPI")
+        except Exception as e:
+            print(f"Błąd czyszczenia cache'u odpowiedzi SerpAPI: {e}")
+
+        try:
+            cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=PRICE_HISTORY_RETENTION_DAYS)
+            purged = price_history.purge_history(cutoff)
+            if purged:
+                print(f"Usunięto {purged} obserwacji cen starszych niż {PRICE_HISTORY_RETENTION_DAYS} dni")
+        except Exception as e:
+            print(f"Błąd czyszczenia historii cen: {e}")
+
+
+def run_continuously():
+    """
+    Ciągła pętla zamiast jednego dużego przebiegu: w każdej iteracji sprawdzane są tylko preferencje,
+    na które przyszła kolej, a przerwa WORKER_POLL_SECONDS następuje, gdy takich nie ma
+    lub budżet na tę chwilę jest wykorzystany. Co WORKER_MAINTENANCE_SECONDS wykonywane są
+    prace porządkowe (run_maintenance).
+    """
+    print("Worker uruchomiony. Naciśnij Ctrl+C, aby zakończyć.")
+    next_maintenance = time.monotonic()
+    while True:
+        if time.monotonic() >= next_maintenance:
+            run_maintenance()
+            next_maintenance = time.monotonic() + WORKER_MAINTENANCE_SECONDS
+        try:
+            check_flights_and_notify()
+        except Exception as e:
+            print(f"Błąd przebiegu workera: {e}")
+        time.sleep(WORKER_POLL_SECONDS)
+
+
 if __name__ == '__main__':
-    check_flights_and_notify()
-    scheduler = BlockingScheduler(timezone="Europe/Warsaw")
-    scheduler.add_job(check_flights_and_notify, 'cron', hour=8, minute=0)
-    print("Harmonogram uruchomiony. Naciśnij Ctrl+C, aby zakończyć.")
+    if '--report' in sys.argv:
+        print_quota_report()
+        sys.exit(0)
+
+    if '--maintenance' in sys.argv:
+        run_maintenance()
+        sys.exit(0)
+
     try:
-        scheduler.start()
-    except (KeyboardInterrupt, SystemExit):
-        pass
\ No newline at end of file
+        run_continuously()
+    except KeyboardInterrupt:
+        pass